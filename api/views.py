@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""GraphQL views.
+
+Queries are analysed before execution and rejected if they nest deeper than
+``settings.GRAPHQL_MAX_DEPTH`` or would resolve more than ``settings.GRAPHQL_MAX_COST``
+fields in the worst case.
+
+The cost of a field is one plus the cost of its selections, multiplied by the
+number of objects it can return: ``first`` or ``last`` if given, the Relay page
+size limit for connections, and ``settings.GRAPHQL_LIST_COST`` for plain lists.
+Introspection fields are free.
+"""
+import logging
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
+from graphql.language import ast
+from graphql.language.parser import parse
+from graphql.type import GraphQLList, GraphQLNonNull
+
+logger = logging.getLogger(__name__)
+
+
+def argument_value(node, variables):
+    """Return the int value of an argument node or variable, or None."""
+    if isinstance(node, ast.Variable):
+        value = (variables or dict()).get(node.name.value)
+    elif isinstance(node, ast.IntValue):
+        value = node.value
+    else:
+        value = None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def field_multiplier(field, field_def, parent_type, variables):
+    """Return the maximum number of objects a field can resolve to."""
+    for arg in field.arguments or []:
+        if arg.name.value in ("first", "last"):
+            limit = argument_value(arg.value, variables)
+            if limit is not None:
+                return min(limit, graphene_settings.RELAY_CONNECTION_MAX_LIMIT)
+
+    field_type = field_def.type
+    if isinstance(field_type, GraphQLNonNull):
+        field_type = field_type.of_type
+    if "first" in field_def.args:
+        return graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if isinstance(field_type, GraphQLList) and not parent_type.name.endswith("Connection"):
+        return settings.GRAPHQL_LIST_COST
+    return 1
+
+
+def named_type(field_type):
+    """Unwrap NonNull and List types."""
+    while isinstance(field_type, (GraphQLList, GraphQLNonNull)):
+        field_type = field_type.of_type
+    return field_type
+
+
+def selection_cost(schema, parent_type, selection_set, fragments, variables, seen=()):
+    """Return the worst case cost and the depth of a selection set.
+
+    Arguments
+
+    schema The GraphQL schema
+    parent_type The GraphQL type the selections are made on
+    selection_set The selection set AST node
+    fragments A dict of fragment names to FragmentDefinition AST nodes
+    variables A dict of query variables
+    seen The names of fragments already being expanded, to stop cycles
+
+    Return A tuple of cost and depth.
+    """
+    cost, depth = 0, 0
+    if selection_set is None:
+        return cost, depth
+
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            name = selection.name.value
+            field_def = getattr(parent_type, "fields", dict()).get(name)
+            if name.startswith("__") or field_def is None:
+                continue
+            child_cost, child_depth = selection_cost(
+                schema, named_type(field_def.type), selection.selection_set, fragments, variables, seen)
+            multiplier = field_multiplier(selection, field_def, parent_type, variables)
+            cost += multiplier * (1 + child_cost)
+            depth = max(depth, 1 + child_depth)
+
+        elif isinstance(selection, ast.FragmentSpread):
+            name = selection.name.value
+            if name in seen or name not in fragments:
+                continue
+            fragment = fragments[name]
+            child_cost, child_depth = selection_cost(
+                schema, schema.get_type(fragment.type_condition.name.value),
+                fragment.selection_set, fragments, variables, seen + (name, ))
+            cost += child_cost
+            depth = max(depth, child_depth)
+
+        elif isinstance(selection, ast.InlineFragment):
+            fragment_type = parent_type
+            if selection.type_condition is not None:
+                fragment_type = schema.get_type(selection.type_condition.name.value)
+            child_cost, child_depth = selection_cost(
+                schema, fragment_type, selection.selection_set, fragments, variables, seen)
+            cost += child_cost
+            depth = max(depth, child_depth)
+
+    return cost, depth
+
+
+def query_cost(schema, document, variables=None, operation_name=None):
+    """Return the worst case cost and the depth of the executed operation of a query document.
+
+    Arguments
+
+    schema The GraphQL schema
+    document The parsed query document
+    variables A dict of query variables, default: None
+    operation_name The name of the operation to execute, default: None (the only operation)
+
+    Return A tuple of cost and depth.
+    """
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, ast.FragmentDefinition)}
+    cost, depth = 0, 0
+    for definition in document.definitions:
+        if not isinstance(definition, ast.OperationDefinition):
+            continue
+        if operation_name and (definition.name is None or definition.name.value != operation_name):
+            continue
+        root_type = {
+            "query": schema.get_query_type(),
+            "mutation": schema.get_mutation_type(),
+            "subscription": schema.get_subscription_type(),
+        }.get(definition.operation)
+        if root_type is None:
+            continue
+        op_cost, op_depth = selection_cost(schema, root_type, definition.selection_set, fragments, variables)
+        cost, depth = max(cost, op_cost), max(depth, op_depth)
+    return cost, depth
+
+
+class CostLimitedGraphQLView(GraphQLView):
+    """A GraphQLView which rejects queries exceeding the configured depth and cost limits."""
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, *args, **kwargs):
+        """Reject expensive queries before executing them."""
+        if query:
+            try:
+                document = parse(query)
+            except Exception:
+                # Let GraphQLView report the syntax error
+                document = None
+
+            if document is not None:
+                cost, depth = query_cost(self.schema, document, variables, operation_name)
+                if depth > settings.GRAPHQL_MAX_DEPTH:
+                    logger.info("[api.views.CostLimitedGraphQLView] Rejected query of depth {0}.".format(depth))
+                    return ExecutionResult(errors=[GraphQLError(
+                        "Query depth {0} exceeds the limit of {1}.".format(
+                            depth, settings.GRAPHQL_MAX_DEPTH))], invalid=True)
+                if cost > settings.GRAPHQL_MAX_COST:
+                    logger.info("[api.views.CostLimitedGraphQLView] Rejected query of cost {0}.".format(cost))
+                    return ExecutionResult(errors=[GraphQLError(
+                        "Query cost {0} exceeds the limit of {1}. Request fewer objects with "
+                        "first or last, or fewer nested fields.".format(
+                            cost, settings.GRAPHQL_MAX_COST))], invalid=True)
+
+        return super(CostLimitedGraphQLView, self).execute_graphql_request(
+            request, data, query, variables, operation_name, *args, **kwargs)
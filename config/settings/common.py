@@ -159,51 +159,103 @@ MIGRATION_MODULES = {
 
 # CACHES
 # ------------------------------------------------------------------------------
+# Caches live on Redis if REDIS_URL is set, else on memcached if MEMCACHED_URL
+# (comma separated host:port) is set, else in the database cache table shared by all processes,
+# or for lookups in files shared by all processes on the host.
+# All backends count hits and misses, see shared.cache.get_cache_metrics.
+REDIS_URL = env('REDIS_URL', default=None)
+MEMCACHED_URL = env('MEMCACHED_URL', default=None)
+CACHE_KEY_PREFIX = env('CACHE_KEY_PREFIX', default='wastd')
+# Increment to orphan all cached entries, e.g. after changing cached models
+CACHE_VERSION = int(env('CACHE_VERSION', default=1))
+# Reads counted per process before adding them to the metrics totals in the cache
+CACHE_METRICS_FLUSH_EVERY = int(env('CACHE_METRICS_FLUSH_EVERY', default=1000))
+
+
+def cache_tier(name, db, fallback=None, memcached=True):
+    """Return the configuration of the cache ``name`` on the configured cache tier.
+
+    Arguments
+
+    name The cache alias, used as key prefix
+    db The Redis database number
+    fallback The configuration without Redis or memcached, default: the database cache table
+    memcached Whether the cache may use memcached, which limits values to 1 MB
+    """
+    if REDIS_URL:
+        config = {
+            "BACKEND": "shared.cache.RedisCache",
+            "LOCATION": "{0}/{1}".format(REDIS_URL, db),
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "IGNORE_EXCEPTIONS": True,
+            }
+        }
+    elif MEMCACHED_URL and memcached:
+        config = {
+            "BACKEND": "shared.cache.MemcachedCache",
+            "LOCATION": MEMCACHED_URL.split(","),
+        }
+    else:
+        config = fallback or {
+            "BACKEND": "shared.cache.DatabaseCache",
+            "LOCATION": "django_cache_table",
+        }
+    config.update({"KEY_PREFIX": "{0}:{1}".format(CACHE_KEY_PREFIX, name), "VERSION": CACHE_VERSION})
+    return config
 
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         'LOCATION': '{0}/{1}'.format(env('REDIS_URL', default='redis://redis:6379'), 0),
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#             'IGNORE_EXCEPTIONS': True,
-#         }
-#     },
-#     "select2": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         'LOCATION': '{0}/{1}'.format(env('REDIS_URL', default='redis://redis:6379'), 1),
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#             'IGNORE_EXCEPTIONS': True,
-#         }
-#     }
-# }
-
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
-#         'LOCATION': env('MEMCACHED_URL', default='127.0.0.1:11211'),
-#     },
-#      'select2': {
-#         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
-#         'LOCATION': env('MEMCACHED_URL', default='127.0.0.1:11211'),
-#     }
-# }
 
 CACHES = {
-    "default": {
-        # 'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        'LOCATION': 'django_cache_table'
-    },
-    "select2": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+    "default": cache_tier("default", 0),
+    "select2": cache_tier("select2", 1, fallback={
+        "BACKEND": "shared.cache.DatabaseCache",
         'LOCATION': 'select2_cache_table'
-    }
+    }),
+    "sessions": cache_tier("sessions", 2),
+    # Lookups are read on every save: keep them off the database,
+    # and off memcached, as cached site polygons can exceed its 1 MB limit
+    "lookups": cache_tier("lookups", 3, memcached=False, fallback={
+        "BACKEND": env('LOOKUP_CACHE_BACKEND', default="shared.cache.FileBasedCache"),
+        'LOCATION': env('LOOKUP_CACHE_LOCATION', default='/tmp/wastd-lookups'),
+    }),
+    "tiles": cache_tier("tiles", 4, memcached=False, fallback={
+        "BACKEND": env('TILE_CACHE_BACKEND', default="shared.cache.FileBasedCache"),
+        'LOCATION': env('TILE_CACHE_LOCATION', default='/tmp/wastd-tiles'),
+        "OPTIONS": {
+            'MAX_ENTRIES': env('TILE_CACHE_MAX_ENTRIES', default=100000),
+        }
+    }),
+    "renders": cache_tier("renders", 5, memcached=False, fallback={
+        "BACKEND": env('RENDER_CACHE_BACKEND', default="shared.cache.FileBasedCache"),
+        'LOCATION': env('RENDER_CACHE_LOCATION', default='/tmp/wastd-renders'),
+        "OPTIONS": {
+            'MAX_ENTRIES': env('RENDER_CACHE_MAX_ENTRIES', default=200000),
+        }
+    }),
 }
 
 SELECT2_CACHE_BACKEND = "select2"
 
+# Map tiles and GeoJSON layers, see shared.tiles
+TILE_CACHE = "tiles"
+TILE_CACHE_TIMEOUT = int(env('TILE_CACHE_TIMEOUT', default=60 * 60 * 24))
+# Tiles above this zoom level are rendered on each request
+TILE_CACHE_MAX_ZOOM = int(env('TILE_CACHE_MAX_ZOOM', default=14))
+# Saves evicting more tiles than this per zoom level evict the whole zoom level
+TILE_INVALIDATION_MAX_TILES = int(env('TILE_INVALIDATION_MAX_TILES', default=16))
+# The seed_tile_cache task renders all tiles of vector and cluster layers up to this zoom level
+TILE_SEED_MAX_ZOOM = int(env('TILE_SEED_MAX_ZOOM', default=5))
+# Clustered map layers show individual features above this zoom level
+MAP_CLUSTER_MAX_ZOOM = int(env('MAP_CLUSTER_MAX_ZOOM', default=12))
+
+# Popups and Latex fragments rendered on demand, see shared.rendering
+RENDER_CACHE = "renders"
+RENDER_CACHE_TIMEOUT = int(env('RENDER_CACHE_TIMEOUT', default=60 * 60 * 24 * 7))
+
+# Lookup tables and objects looked up by unique fields, see shared.cache
+LOOKUP_CACHE = "lookups"
+LOOKUP_CACHE_TIMEOUT = int(env('LOOKUP_CACHE_TIMEOUT', default=60 * 60 * 24))
+
 # Data upload request size
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024
 DATA_UPLOAD_MAX_NUMBER_FIELDS = None
@@ -429,11 +481,11 @@ LOGIN_URL = 'account_login'
 AUTOSLUG_SLUGIFY_FUNCTION = 'slugify.slugify'
 
 # Session management
+# Sessions are read from the sessions cache and written through to the database,
+# set SESSION_ENGINE to "django.contrib.sessions.backends.cache" to keep them on Redis only.
 # http://niwinz.github.io/django-redis/latest/#_configure_as_cache_backend
-# SESSION_ENGINE = "django.contrib.sessions.backends.cache"
-SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
-SESSION_CACHE_ALIAS = "default"
-# SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+SESSION_ENGINE = env('SESSION_ENGINE', default="django.contrib.sessions.backends.cached_db")
+SESSION_CACHE_ALIAS = "sessions"
 
 # Location of root django.contrib.admin URL, use {% url 'admin:index' %}
 ADMIN_URL = "admin/"
@@ -642,9 +694,15 @@ GOOGLE_MAPS_API_KEY = env('GOOGLE_MAPS_API_KEY', default="not-set")
 
 # Graphene-django
 GRAPHENE = {
-    'SCHEMA': 'api.schema'
+    'SCHEMA': 'api.schema',
+    'RELAY_CONNECTION_MAX_LIMIT': int(env('GRAPHQL_PAGE_SIZE_MAX', default=100)),
 }
 
+# GraphQL query cost limits, see api.views.CostLimitedGraphQLView
+GRAPHQL_MAX_DEPTH = int(env('GRAPHQL_MAX_DEPTH', default=15))
+GRAPHQL_MAX_COST = int(env('GRAPHQL_MAX_COST', default=50000))
+GRAPHQL_LIST_COST = int(env('GRAPHQL_LIST_COST', default=50))
+
 
 # Guardian permissions, django-polymorphic integration
 GUARDIAN_GET_CONTENT_TYPE = 'polymorphic.contrib.guardian.get_polymorphic_base_content_type'
@@ -39,6 +39,22 @@ CACHES = {
     },
     "select2": {
         "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    },
+    "sessions": {
+        "BACKEND": "shared.cache.DatabaseCache",
+        "LOCATION": "django_cache_table",
+        "KEY_PREFIX": "sessions",
+    },
+    "lookups": {
+        "BACKEND": "shared.cache.LocMemCache",
+        "LOCATION": "lookups",
+    },
+    "tiles": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    },
+    "renders": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "renders",
     }
 }
 
@@ -54,10 +54,9 @@ if SECURE:
     CSRF_COOKIE_HTTPONLY = env('DJANGO_CSRF_COOKIE_HTTPONLY', default=True)
     X_FRAME_OPTIONS = env('DJANGO_X_FRAME_OPTIONS', default='DENY')
 
-# Session management
-# http://niwinz.github.io/django-redis/latest/#_configure_as_cache_backend
-# SESSION_ENGINE = "django.contrib.sessions.backends.cache"  # use Redis
-# SESSION_CACHE_ALIAS = "default"
+# Caches and sessions
+# Set REDIS_URL or MEMCACHED_URL to move caches off the database cache tables,
+# see CACHES in common.py.
 
 
 # SITE CONFIGURATION
@@ -30,36 +30,14 @@ EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
 # CACHING
 # ------------------------------------------------------------------------------
-# Speed advantages of in-memory caching without having to run Memcached
-# CACHES
-# ------------------------------------------------------------------------------
-
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         'LOCATION': '{0}/{1}'.format(env('REDIS_URL', default='redis://127.0.0.1:6379'), 0),
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#             'IGNORE_EXCEPTIONS': True,
-#         }
-#     },
-#     "select2": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         'LOCATION': '{0}/{1}'.format(env('REDIS_URL', default='redis://127.0.0.1:6379'), 1),
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#         }
-#     }
-# }
-
-# SELECT2_CACHE_BACKEND = "select2"
-
-{
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# Speed advantages of in-memory caching without having to run Redis or Memcached
+CACHES = {
+    alias: {
+        "BACKEND": "shared.cache.LocMemCache",
+        "LOCATION": alias,
+    } for alias in ("default", "select2", "sessions", "lookups", "tiles", "renders")
 }
-SELECT2_CACHE_BACKEND = "default"
+SELECT2_CACHE_BACKEND = "select2"
 
 # TESTING
 # ------------------------------------------------------------------------------
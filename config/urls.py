@@ -12,24 +12,24 @@ from django.views.generic.base import RedirectView
 
 from ajax_select import urls as ajax_select_urls
 from adminactions import actions
-from djgeojson.views import GeoJSONLayerView, TiledGeoJSONLayerView
 from rest_framework.authtoken import views as drf_authviews
 from rest_framework.documentation import include_docs_urls
-from graphene_django.views import GraphQLView
 
-from occurrence.models import CommunityAreaEncounter
+from occurrence.models import CommunityAreaEncounter, TaxonAreaEncounter
+from shared.tiles import CachedGeoJSONLayerView, CachedTiledGeoJSONLayerView, TilePopupView, VectorTileView
 from wastd.router import router
 from wastd.observations import models as wastd_models
 from wastd.observations import views as wastd_views
 
 from api.schema import schema
+from api.views import CostLimitedGraphQLView
 
 # register all adminactions
 actions.add_to_site(site)
 
 urlpatterns = [
     path('', cache_page(60 * 60)(TemplateView.as_view(template_name='pages/index.html')), name='home'),
-    path('map/', cache_page(60 * 60)(wastd_views.HomeView.as_view()), name='map'),
+    path('map/', wastd_views.HomeView.as_view(), name='map'),
     path('healthcheck/', TemplateView.as_view(template_name='pages/healthcheck.html'), name='healthcheck'),
 
     path(settings.ADMIN_URL, admin.site.urls),
@@ -56,30 +56,35 @@ urlpatterns = [
     path('api-auth/', include(('rest_framework.urls', 'api-auth'), namespace='rest_framework')),
     path('api-token-auth/', drf_authviews.obtain_auth_token, name="api-auth"),
 
-    path('gql', GraphQLView.as_view(graphiql=True, schema=schema), name="gql-api"),
+    path('gql', CostLimitedGraphQLView.as_view(graphiql=True, schema=schema), name="gql-api"),
 
     # Djgeojson
-    path('observations.geojson', GeoJSONLayerView.as_view(
+    path('observations.geojson', CachedGeoJSONLayerView.as_view(
+        layer_name="observations-geojson",
         model=wastd_models.Encounter, properties=('as_html',), geometry_field="where"
     ), name='observation-geojson'),
-    path('areas.geojson', GeoJSONLayerView.as_view(
+    path('areas.geojson', CachedGeoJSONLayerView.as_view(
+        layer_name="areas-geojson",
         model=wastd_models.Area, properties=('leaflet_title', 'as_html')
     ), name='areas-geojson'),
-    path('sites.geojson', GeoJSONLayerView.as_view(
+    path('sites.geojson', CachedGeoJSONLayerView.as_view(
+        layer_name="sites-geojson",
         model=wastd_models.Area,
         queryset=wastd_models.Area.objects.filter(area_type=wastd_models.Area.AREATYPE_SITE),
         properties=('leaflet_title', 'as_html')
     ), name='sites-geojson'),
 
     # Encounter as tiled GeoJSON
-    path('data/<int:z>/<int:x>/<int:y>.geojson', TiledGeoJSONLayerView.as_view(
+    path('data/<int:z>/<int:x>/<int:y>.geojson', CachedTiledGeoJSONLayerView.as_view(
+        layer_name="encounter-tiled-geojson",
         model=wastd_models.AnimalEncounter,
         properties=('as_html', 'leaflet_title', 'leaflet_icon', 'leaflet_colour'),
         geometry_field="where"
     ), name='encounter-tiled-geojson'),
 
     # CommunityAreaEncounter as tiled GeoJSON
-    path('community-encounters-poly/<int:z>/<int:x>/<int:y>.geojson', TiledGeoJSONLayerView.as_view(
+    path('community-encounters-poly/<int:z>/<int:x>/<int:y>.geojson', CachedTiledGeoJSONLayerView.as_view(
+        layer_name="community-area-encounter-tiled-geojson",
         model=CommunityAreaEncounter,
         properties=('as_html', 'label'),
         geometry_field="geom"
@@ -89,6 +94,38 @@ urlpatterns = [
     #     model=Area, properties=('name',), geometry_field="geom"
     # ), name='area-tiled-geojson'),
 
+    # Vector tiles of the layers registered in */tiles.py
+    # Filter encounters by type with ?encounter_type=stranding
+    path('tiles/encounters/<int:z>/<int:x>/<int:y>.mvt', VectorTileView.as_view(
+        layer_name="encounters"
+    ), name='encounter-tiles'),
+    path('tiles/encounters/<int:pk>/popup/', TilePopupView.as_view(
+        model=wastd_models.Encounter
+    ), name='encounter-popup'),
+    path('tiles/areas/<int:z>/<int:x>/<int:y>.mvt', VectorTileView.as_view(
+        layer_name="areas"
+    ), name='area-tiles'),
+    path('tiles/areas/<int:pk>/popup/', TilePopupView.as_view(
+        model=wastd_models.Area
+    ), name='area-popup'),
+    path('tiles/taxon-area-encounters/<int:z>/<int:x>/<int:y>.mvt', VectorTileView.as_view(
+        layer_name="taxon_area_encounters"
+    ), name='taxon-area-encounter-tiles'),
+    path('tiles/taxon-area-encounters/<int:pk>/popup/', TilePopupView.as_view(
+        model=TaxonAreaEncounter
+    ), name='taxon-area-encounter-popup'),
+    path('tiles/community-area-encounters/<int:z>/<int:x>/<int:y>.mvt', VectorTileView.as_view(
+        layer_name="community_area_encounters"
+    ), name='community-area-encounter-tiles'),
+    path('tiles/community-area-encounters/<int:pk>/popup/', TilePopupView.as_view(
+        model=CommunityAreaEncounter
+    ), name='community-area-encounter-popup'),
+
+    # Strandings as clustered GeoJSON tiles, popups from encounter-popup
+    path('tiles/stranding-clusters/<int:z>/<int:x>/<int:y>.geojson', VectorTileView.as_view(
+        layer_name="stranding-clusters"
+    ), name='stranding-cluster-tiles'),
+
     path('tasks/import-odka/', wastd_views.import_odka_view, name="import-odka"),
     path('tasks/update-names/', wastd_views.update_names_view, name="update-names"),
     path('400/', default_views.bad_request, kwargs={'exception': Exception('Bad request')}),
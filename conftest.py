@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""Fixtures shared by all tests."""
+import pytest
+from django.core.cache import caches
+
+
+@pytest.fixture(autouse=True)
+def clear_lookup_cache():
+    """Clear the lookup cache before each test.
+
+    Tests roll back their transactions without signals, which would leave
+    lookups and cached objects of rolled back records to the next test.
+    """
+    caches["lookups"].clear()
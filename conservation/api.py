@@ -1,11 +1,16 @@
 import logging
+from collections import OrderedDict, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_filters import FilterSet
 
 from shared.api import BatchUpsertViewSet, MyGeoJsonPagination
-from shared.utils import force_as_list
+from shared.utils import force_as_list, in_bulk_by_str
 from conservation.models import (
     CommunityConservationListing,
     ConservationCategory,
@@ -13,6 +18,7 @@ from conservation.models import (
     ConservationList,
     Document,
     TaxonConservationListing,
+    update_conservation_status_caches,
 )
 from conservation.serializers import (
     CommunityConservationListingSerializer,
@@ -51,6 +57,7 @@ class ConservationCategoryViewSet(BatchUpsertViewSet):
     queryset = ConservationCategory.objects.all()
     serializer_class = ConservationCategorySerializer
     filterset_class = ConservationCategoryFilter
+    save_upserted = False
 
 
 class ConservationCriterionFilter(FilterSet):
@@ -72,19 +79,19 @@ class ConservationCriterionViewSet(BatchUpsertViewSet):
     queryset = ConservationCriterion.objects.all()
     serializer_class = ConservationCriterionSerializer
     filterset_class = ConservationCriterionFilter
-    uid_fields = ("code", )
+    # Criterion codes are unique per ConservationList only
+    uid_fields = ("conservation_list", "code", )
+    save_upserted = False
 
-    def build_unique_fields(self, data):
-        """Custom unique fields."""
-        return {"conservation_list": data["conservation_list"],
-                "code": data["code"]}
+    def prefetch_fks(self, records):
+        """Fetch the ConservationLists of a batch with one query."""
+        self.conservation_lists = in_bulk_by_str(
+            ConservationList, [x.get("conservation_list") for x in records])
 
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, (status if QC mixin), and **uid_fields values from a model."""
-        return model.objects.filter(
-            conservation_list__in=list(set([x["conservation_list"] for x in new_records])),
-            code__in=list(set([x["code"] for x in new_records]))
-        ).values("pk", "code", "conservation_list")
+    def resolve_fks(self, data):
+        """Resolve the ConservationList from its PK to the prefetched object."""
+        data["conservation_list"] = self.conservation_lists.get(str(data.get("conservation_list")))
+        return data
 
 
 class ConservationListFilter(FilterSet):
@@ -188,110 +195,178 @@ class DocumentViewSet(BatchUpsertViewSet):
     serializer_class = DocumentSerializer
     filterset_class = DocumentFilter
     uid_fields = ("source", "source_id")
+    save_upserted = False
 
 
 # ----------------------------------------------------------------------------#
-# TaxonConservationListing
+# ConservationListing
 #
-class TaxonConservationListingFilter(FilterSet):
-    """TaxonConservationListing filter.
+class ConservationListingBatchUpsertViewSet(BatchUpsertViewSet):
+    """A BatchUpsert ViewSet for Taxon and Community ConservationListings.
 
-    Performance: Excluding taxon from filter speeds up
-    loading an empty TaxonConservationListing List
-    from 14 sec (with) to 5 sec (without).
+    Subjects, categories and criteria of a whole batch are resolved with one
+    ``__in`` query each. Listings are upserted in bulk, their M2M rows are
+    replaced with bulk inserts, and their cache fields as well as the
+    conservation status caches of their subjects are rebuilt once per batch.
     """
 
-    class Meta:
-        """Class opts."""
+    uid_fields = ("source", "source_id")
+    subject_field = None
+    subject_model = None
+    subject_lookup = "pk"
+
+    def get_ids(self, data, field_name):
+        """Return a list of ids from a dict or a QueryDict of form data."""
+        if hasattr(data, "getlist"):
+            return [y for x in data.getlist(field_name) for y in force_as_list(x) if y != 'NA']
+        return [x for x in force_as_list(data.get(field_name)) if x != 'NA']
+
+    def prefetch_fks(self, records):
+        """Fetch all subjects, categories and criteria of a batch with one query each."""
+        field = self.subject_model._meta.get_field(self.subject_lookup)
+        values = list()
+        for x in records:
+            try:
+                values.append(field.to_python(x.get(self.subject_field)))
+            except ValidationError:
+                logger.error("[API][prefetch_fks] Invalid {0} {1}.".format(
+                    self.subject_field, x.get(self.subject_field)))
+        self.subjects = in_bulk_by_str(self.subject_model, values, self.subject_lookup)
+        self.categories = in_bulk_by_str(
+            ConservationCategory, [y for x in records for y in self.get_ids(x, "category")])
+        self.criteria = in_bulk_by_str(
+            ConservationCriterion, [y for x in records for y in self.get_ids(x, "criteria")])
 
-        model = TaxonConservationListing
-        fields = {
-            # "taxon": "__all__",
-            # "taxon": ["exact", ],
-            "scope": ["exact", "in"],
-            "status": ["exact", "in"],
-            "category": ["exact", "in"],
-            "criteria": ["exact", "in"],
-            "proposed_on": ["exact", "year__gt"],
-            "effective_from": ["exact", "year__gt"],
-            "effective_to": ["exact", "year__gt"],
-            "last_reviewed_on": ["exact", "year__gt"],
-            "review_due": ["exact", "year__gt"],
-            "comments": ["exact", "icontains"],
-        }
+    def resolve_fks(self, data):
+        """Resolve the subject from its lookup value to the prefetched object."""
+        subject = self.subjects.get(str(data.get(self.subject_field)))
+        if subject is None:
+            logger.error("[API][resolve_fks] {0} {1} not known.".format(
+                self.subject_field, data.get(self.subject_field)))
+        data[self.subject_field] = subject
+        return data
 
+    def pop_m2m(self, data, field_name, lookup):
+        """Pop a list of M2M ids from data and return the prefetched objects."""
+        if field_name not in data:
+            return []
+        ids = self.get_ids(data, field_name)
+        data.pop(field_name)
+        logger.debug("[API][create] Found {0} {1}".format(field_name, ids))
+        return [lookup[str(x)] for x in ids if str(x) in lookup]
 
-class TaxonConservationListingViewSet(BatchUpsertViewSet):
-    """View set for TaxonConservationListing."""
+    def set_m2m(self, field_name, pks, related):
+        """Replace the M2M rows of field_name for the given listings with bulk inserts.
 
-    queryset = TaxonConservationListing.objects.all().select_related("taxon")
-    serializer_class = TaxonConservationListingSerializer
-    filterset_class = TaxonConservationListingFilter
-    uid_fields = ("source", "source_id")
-    model = TaxonConservationListing
+        Arguments:
 
-    def resolve_fks(self, data):
-        """Resolve FKs from PK to object."""
+        field_name <str> "category" or "criteria"
+        pks <list> The pks of all listings to update
+        related <dict> A lookup of listing pk to a list of related objects
+        """
+        m2m = self.model._meta.get_field(field_name)
+        through = m2m.remote_field.through
+        src = "{0}_id".format(m2m.m2m_field_name())
+        dst = "{0}_id".format(m2m.m2m_reverse_field_name())
+        through.objects.filter(**{"{0}__in".format(src): pks}).delete()
+        through.objects.bulk_create(
+            [through(**{src: pk, dst: obj.pk})
+             for pk in pks for obj in {o.pk: o for o in related[pk]}.values()],
+            batch_size=self.batch_size)
+
+    def update_listing_caches(self, pks):
+        """Rebuild category, criteria and label caches of the given listings in bulk."""
+        listing_lookup = self.model._meta.model_name
+        categories = defaultdict(list)
+        for c in ConservationCategory.objects.filter(**{
+            "{0}__in".format(listing_lookup): pks
+        }).annotate(listing_id=F(listing_lookup)).select_related("conservation_list"):
+            categories[c.listing_id].append(c.__str__())
+        criteria = defaultdict(list)
+        for c in ConservationCriterion.objects.filter(**{
+            "{0}__in".format(listing_lookup): pks
+        }).annotate(listing_id=F(listing_lookup)):
+            criteria[c.listing_id].append(c.code)
+
+        objs = list()
+        for obj in self.model.objects.filter(pk__in=pks).only("pk", "scope"):
+            obj.category_cache = ", ".join(categories[obj.pk])
+            obj.criteria_cache = ", ".join(criteria[obj.pk])
+            obj.label_cache = "{0} {1}".format(obj.get_scope_display(), obj.category_cache).strip()
+            objs.append(obj)
+        self.model.objects.bulk_update(
+            objs, ["category_cache", "criteria_cache", "label_cache"], batch_size=self.batch_size)
+
+    def bulk_upsert_listings(self, new_records):
+        """Create or update a batch of listings with a constant number of queries.
+
+        Within a batch, the last record with the same unique fields wins.
+        Categories and criteria are only replaced if a record provides any.
+
+        Return A list of dicts of id, msg, and status, one per record.
+        """
+        self.prefetch_fks(new_records)
+        existing_index = {
+            self.uid_key(rec): rec["pk"]
+            for rec in self.fetch_existing_records(new_records, self.model)
+        }
 
-        try:
-            data["taxon"] = Taxon.objects.get(name_id=data["taxon"])
-        except Exception as e:
-            logger.error("Exception {0}: taxon {1} not known,".format(e, data["taxon"]))
-        return data
+        results, records = list(), OrderedDict()
+        for data in new_records:
+            key = self.uid_key(data)
+            categories = self.pop_m2m(data, "category", self.categories)
+            criteria = self.pop_m2m(data, "criteria", self.criteria)
+            unique_data, update_data = self.split_data(data)
+
+            # Early exit: None value in unique data or unknown subject
+            if None in unique_data.values() or update_data[self.subject_field] is None:
+                msg = "[API][create] Skipping invalid data: {0} {1}".format(
+                    str(update_data), str(unique_data))
+                logger.warning(msg)
+                results.append({"msg": msg, "status": status.HTTP_406_NOT_ACCEPTABLE})
+                continue
+
+            records[key] = (unique_data, update_data, categories, criteria)
+            results.append(key)
+
+        with transaction.atomic():
+            updates = [(existing_index[k], r[1]) for k, r in records.items() if k in existing_index]
+            creates = [(k, r[0], r[1]) for k, r in records.items() if k not in existing_index]
+            self.bulk_update_records(updates)
+            created = self.bulk_create_records([(u, d) for k, u, d in creates])
+            pks = dict(existing_index)
+            pks.update({k: obj.pk for (k, u, d), obj in zip(creates, created)})
+
+            all_pks = [pks[k] for k in records]
+            for field_name, pos in (("category", 2), ("criteria", 3)):
+                related = {pks[k]: r[pos] for k, r in records.items() if r[pos]}
+                if related:
+                    self.set_m2m(field_name, list(related.keys()), related)
+
+            self.update_listing_caches(all_pks)
+            update_conservation_status_caches(
+                self.model, self.subject_field,
+                {r[1][self.subject_field].pk for r in records.values()})
+
+        logger.info("[API][create] Updated {0}, created {1} {2}.".format(
+            len(updates), len(creates), self.model._meta.verbose_name_plural))
+
+        return [
+            r if not isinstance(r, tuple) else {
+                "id": pks[r],
+                "msg": "[API][create] {0} {1} {2}".format(
+                    "Updated" if r in existing_index else "Created",
+                    self.model._meta.verbose_name, " ".join(r)),
+                "status": status.HTTP_200_OK if r in existing_index else status.HTTP_201_CREATED
+            } for r in results
+        ]
 
     def create_one(self, data):
         """POST: Create or update exactly one model instance.
 
-        The ViewSet must have a method ``split_data`` returning a dict
-        of the unique, mandatory fields to get_or_create,
-        and a dict of the other optional values to update.
-
-        Return Response(content, status)
+        Return A dict of id, msg, and status
         """
-        unique_data, update_data = self.split_data(data)
-
-        # Pop category and criterion out update_data
-        if 'category' in update_data:
-            cat_ids = force_as_list(update_data.pop("category"))
-            logger.debug("[API][create_one] Found categories {}".format(cat_ids))
-            categories = [ConservationCategory.objects.get(id=x) for x in cat_ids if x != 'NA']
-        else:
-            categories = []
-
-        if 'criteria' in update_data:
-            crit_ids = force_as_list(update_data.pop("criteria"))
-            logger.debug("[API][create_one] Found criteria {}".format(crit_ids))
-            criteria = [ConservationCriterion.objects.get(id=x) for x in crit_ids if x != 'NA']
-        else:
-            criteria = []
-
-        # Early exit 1: None value in unique data
-        if None in unique_data.values():
-            msg = "[API][create_one] Skipping invalid data: {0} {1}".format(
-                str(update_data), str(unique_data))
-            logger.warning(msg)
-            content = {"msg": msg}
-            return Response(content, status=status.HTTP_406_NOT_ACCEPTABLE)
-
-        logger.debug("[API][create_one] Received "
-                     "{0} with unique fields {1}".format(
-                         self.model._meta.verbose_name, str(unique_data)))
-
-        # Without the QA status deciding whether to update existing data:
-        obj, created = self.model.objects.update_or_create(defaults=update_data, **unique_data)
-        if categories:
-            obj.category.set(categories)  # TODO: must do individually or can do as list?
-        if criteria:
-            obj.criteria.set(criteria)
-        obj.save()  # better save() than sorry
-        obj.refresh_from_db()
-        obj.save()  # to update cached fields
-
-        verb = "Created" if created else "Updated"
-        st = status.HTTP_201_CREATED if created else status.HTTP_200_OK
-        msg = "[API][create_one] {0} {1}".format(verb, obj.__str__())
-        logger.info(msg)
-        return {"id": obj.pk, "msg": msg, "status": st}
+        return self.bulk_upsert_listings([data])[0]
 
     def create(self, request):
         """POST: Create or update one or many model instances.
@@ -318,19 +393,61 @@ class TaxonConservationListingViewSet(BatchUpsertViewSet):
               self.uid_fields[0] in request.data[0]):
             logger.info('[API][create] found batch of {0} records,'
                         ' creating/updating...'.format(len(request.data)))
-
-            # The slow way:
-            res = [self.create_one(data) for data in request.data]
+            res = self.bulk_upsert_listings(request.data)
             return Response(res, status=status.HTTP_201_CREATED)
 
         else:
-            logger.error("[API][tcl create] failed with data {}".format(request.data))
+            logger.error("[API][create] failed with data {}".format(request.data))
             return Response(
                 request.data,
                 status=status.HTTP_406_NOT_ACCEPTABLE
             )
 
 
+# ----------------------------------------------------------------------------#
+# TaxonConservationListing
+#
+class TaxonConservationListingFilter(FilterSet):
+    """TaxonConservationListing filter.
+
+    Performance: Excluding taxon from filter speeds up
+    loading an empty TaxonConservationListing List
+    from 14 sec (with) to 5 sec (without).
+    """
+
+    class Meta:
+        """Class opts."""
+
+        model = TaxonConservationListing
+        fields = {
+            # "taxon": "__all__",
+            # "taxon": ["exact", ],
+            "scope": ["exact", "in"],
+            "status": ["exact", "in"],
+            "category": ["exact", "in"],
+            "criteria": ["exact", "in"],
+            "proposed_on": ["exact", "year__gt"],
+            "effective_from": ["exact", "year__gt"],
+            "effective_to": ["exact", "year__gt"],
+            "last_reviewed_on": ["exact", "year__gt"],
+            "review_due": ["exact", "year__gt"],
+            "comments": ["exact", "icontains"],
+        }
+
+
+class TaxonConservationListingViewSet(ConservationListingBatchUpsertViewSet):
+    """View set for TaxonConservationListing."""
+
+    queryset = TaxonConservationListing.objects.all().select_related("taxon")
+    serializer_class = TaxonConservationListingSerializer
+    filterset_class = TaxonConservationListingFilter
+    uid_fields = ("source", "source_id")
+    model = TaxonConservationListing
+    subject_field = "taxon"
+    subject_model = Taxon
+    subject_lookup = "name_id"
+
+
 # ----------------------------------------------------------------------------#
 # CommunityConservationListing
 #
@@ -354,7 +471,7 @@ class CommunityConservationListingFilter(FilterSet):
         }
 
 
-class CommunityConservationListingViewSet(BatchUpsertViewSet):
+class CommunityConservationListingViewSet(ConservationListingBatchUpsertViewSet):
     """View set for CommunityConservationListing.
     """
     model = CommunityConservationListing
@@ -362,100 +479,6 @@ class CommunityConservationListingViewSet(BatchUpsertViewSet):
     serializer_class = CommunityConservationListingSerializer
     filterset_class = CommunityConservationListingFilter
     uid_fields = ("source", "source_id")
-
-    def resolve_fks(self, data):
-        """Resolve FKs from PK to object."""
-        try:
-            data["community"] = Community.objects.get(code=data["community"])
-        except Exception as e:
-            print("Exception '{0}': community '{1}' not known.".format(e, data["community"]))
-        return data
-
-    def create_one(self, data):
-        """POST: Create or update exactly one model instance.
-
-        The ViewSet must have a method ``split_data`` returning a dict
-        of the unique, mandatory fields to get_or_create,
-        and a dict of the other optional values to update.
-
-        Return Response(content, status)
-        """
-        unique_data, update_data = self.split_data(data)
-
-        # Pop category and criterion out update_data
-        if 'category' in update_data:
-            cat_ids = force_as_list(update_data.pop("category"))
-            logger.debug("[API][create_one] Found categories {}".format(cat_ids))
-            categories = [ConservationCategory.objects.get(id=x) for x in cat_ids if x != 'NA']
-        else:
-            categories = []
-
-        if 'criteria' in update_data:
-            crit_ids = force_as_list(update_data.pop("criteria"))
-            logger.debug("[API][create_one] Found criteria {}".format(crit_ids))
-            criteria = [ConservationCriterion.objects.get(id=x) for x in crit_ids if x != 'NA']
-        else:
-            criteria = []
-
-        # Early exit 1: None value in unique data
-        if None in unique_data.values():
-            msg = "[API][create_one] Skipping invalid data: {0} {1}".format(
-                str(update_data), str(unique_data))
-            logger.warning(msg)
-            content = {"msg": msg}
-            return Response(content, status=status.HTTP_406_NOT_ACCEPTABLE)
-
-        logger.debug("[API][create_one] Received "
-                     "{0} with unique fields {1}".format(
-                         self.model._meta.verbose_name, str(unique_data)))
-
-        # Without the QA status deciding whether to update existing data:
-        obj, created = self.model.objects.update_or_create(defaults=update_data, **unique_data)
-        if categories:
-            obj.category.set(categories)
-        if criteria:
-            obj.criteria.set(criteria)
-        obj.save()  # better save() than sorry
-        obj.refresh_from_db()
-        obj.save()  # to update cached fields
-
-        verb = "Created" if created else "Updated"
-        st = status.HTTP_201_CREATED if created else status.HTTP_200_OK
-        msg = "[API][create_one] {0} {1}".format(verb, obj.__str__())
-        logger.info(msg)
-        return {"id": obj.pk, "msg": msg, "status": st}
-
-    def create(self, request):
-        """POST: Create or update one or many model instances.
-
-        request.data must be a dict or a list of dicts.
-
-        Return Response(result, status)
-
-        result:
-
-        * Warning message if invalid data (status 406 not acceptable)
-        * Dict of object_id and message if one record
-        * List of one-record dicts if several records
-        """
-
-        # Create one ---------------------------------------------------------#
-        if self.uid_fields[0] in request.data:
-            logger.info('[API][create] found one record, creating/updating...')
-            res = self.create_one(request.data)
-            return Response(res, status=res["status"])
-
-        # Create many --------------------------------------------------------#
-        elif (isinstance(request.data, list) and
-              len(request.data) > 0 and
-              self.uid_fields[0] in request.data[0]):
-            logger.info('[API][create] found batch of {0} records,'
-                        ' creating/updating...'.format(len(request.data)))
-            res = [self.create_one(data) for data in request.data]
-            return Response(res, status=status.HTTP_201_CREATED)
-
-        else:
-            return Response(
-                request.data,
-                status=status.HTTP_406_NOT_ACCEPTABLE
-            )
+    subject_field = "community"
+    subject_model = Community
+    subject_lookup = "code"
@@ -0,0 +1,78 @@
+# Generated by Django 2.2.13 on 2026-10-18 10:00
+
+from django.db import migrations
+from django.db.models import F
+
+# ConservationListing.STATUS_EFFECTIVE, SCOPE_WESTERN_AUSTRALIA, SCOPE_COMMONWEALTH
+STATUS_EFFECTIVE = 80
+SCOPE_WESTERN_AUSTRALIA = 0
+SCOPE_COMMONWEALTH = 1
+
+
+def build_status_caches(apps, listing_model_name, subject_field):
+    """Populate the conservation status caches of all subjects of a listing model.
+
+    A copy of conservation.models.update_conservation_status_caches as of this migration,
+    working on historical models.
+    """
+    listing_model = apps.get_model('conservation', listing_model_name)
+    subject_model = listing_model._meta.get_field(subject_field).related_model
+    category_model = apps.get_model('conservation', 'ConservationCategory')
+
+    listed = set()
+    primary = dict()
+    for x in listing_model.objects.filter(status=STATUS_EFFECTIVE).order_by("effective_from", "pk").values(
+            "pk", "scope", "category_cache", "criteria_cache", "{0}_id".format(subject_field)):
+        subject_pk = x["{0}_id".format(subject_field)]
+        listed.add(subject_pk)
+        primary.setdefault((subject_pk, x["scope"]), x)
+
+    listing_lookup = listing_model._meta.model_name
+    first_category = dict()
+    for c in category_model.objects.filter(**{
+        "{0}__in".format(listing_lookup): [x["pk"] for x in primary.values()]
+    }).annotate(listing_id=F(listing_lookup)).select_related("conservation_list"):
+        first_category.setdefault(c.listing_id, c)
+
+    changed = list()
+    for subject in subject_model.objects.only("pk"):
+        state = primary.get((subject.pk, SCOPE_WESTERN_AUSTRALIA))
+        national = primary.get((subject.pk, SCOPE_COMMONWEALTH))
+        state_cat = first_category.get(state["pk"]) if state else None
+        national_cat = first_category.get(national["pk"]) if national else None
+        subject.is_currently_listed = subject.pk in listed
+        subject.conservation_code_state = state_cat.short_code if state_cat else None
+        subject.conservation_list_state = state_cat.conservation_list.code if state_cat else None
+        subject.conservation_category_state = state_cat.code if state_cat else None
+        subject.conservation_categories_state = state["category_cache"] if state else None
+        subject.conservation_criteria_state = state["criteria_cache"] if state else None
+        subject.conservation_category_national = national_cat.code if national_cat else None
+        changed.append(subject)
+
+    subject_model.objects.bulk_update(changed, [
+        "is_currently_listed",
+        "conservation_code_state",
+        "conservation_list_state",
+        "conservation_category_state",
+        "conservation_categories_state",
+        "conservation_criteria_state",
+        "conservation_category_national",
+    ], batch_size=1000)
+
+
+def build_conservation_status_caches(apps, schema_editor):
+    """Populate the Taxon and Community conservation status caches."""
+    build_status_caches(apps, 'TaxonConservationListing', 'taxon')
+    build_status_caches(apps, 'CommunityConservationListing', 'community')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conservation', '0032_auto_20200702_1455'),
+        ('taxonomy', '0033_conservation_status_cache'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_conservation_status_caches, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
+from functools import partial
 import logging
 import uuid
 
@@ -7,7 +8,8 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.gis.db import models as geo_models
 from django.db import models
-from django.db.models.signals import pre_save, post_save
+from django.db.models import F
+from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -16,6 +18,7 @@ from django_fsm import FSMIntegerField, transition
 from django_fsm_log.decorators import fsm_log_by
 
 from wastd.users.models import User
+from shared.cache import get_lookup, register_lookup
 from shared.models import (
     RenderMixin,
     UrlsMixin,
@@ -736,6 +739,27 @@ class ConservationCategory(models.Model):
             self._meta.app_label, self._meta.model_name), args=[self.pk])
 
 
+def build_category_choices(scope):
+    """Return choices of ConservationCategories on lists with the given scope, e.g. "scope_species"."""
+    return [(str(c.pk), str(c)) for c in ConservationCategory.objects.filter(
+        **{"conservation_list__{0}".format(scope): True}
+    ).order_by(
+        "conservation_list__code", "rank"
+    ).select_related(
+        "conservation_list"
+    )]
+
+
+for scope in ("scope_species", "scope_communities"):
+    register_lookup("category-choices:{0}".format(scope), partial(build_category_choices, scope),
+                    [ConservationList, ConservationCategory])
+
+
+def category_choices(scope):
+    """Return cached choices of ConservationCategories on lists with the given scope for filters."""
+    return get_lookup("category-choices:{0}".format(scope))
+
+
 class ConservationCriterion(models.Model):
     """A Conservation Criterion like A4a."""
 
@@ -1425,11 +1449,12 @@ class TaxonConservationListing(ConservationListing):
         logger.info("[Taxon ConservationListing] mark_gazetted should now mark older "
                     "ConservationListings as de-listed.")
         # TODO fsm_log_by request.user if coming from request
-        [x.mark_delisted() for x in
-         self.taxon.conservation_listings.filter(
+        for x in self.taxon.conservation_listings.filter(
             scope=self.scope,
             status=ConservationListing.STATUS_EFFECTIVE
-        ).exclude(pk=self.pk)]
+        ).exclude(pk=self.pk):
+            x.mark_delisted()
+            x.save()
 
 
 class CommunityConservationListing(ConservationListing):
@@ -1500,11 +1525,12 @@ class CommunityConservationListing(ConservationListing):
         """
         logger.info("[Community ConservationListing] De-list previous "
                     "ConservationListings in same scope.")
-        [x.mark_delisted() for x in
-         self.community.conservation_listings.filter(
+        for x in self.community.conservation_listings.filter(
             scope=self.scope,
             status=ConservationListing.STATUS_EFFECTIVE
-        ).exclude(pk=self.pk)]
+        ).exclude(pk=self.pk):
+            x.mark_delisted()
+            x.save()
 
 
 @receiver(pre_save, sender=TaxonConservationListing)
@@ -1520,6 +1546,102 @@ def conservationlisting_caches(sender, instance, *args, **kwargs):
         logger.info("[ConservationListing_caches] New ConservationListing, re-save to populate caches.")
 
 
+CONSERVATION_STATUS_CACHE_FIELDS = [
+    "is_currently_listed",
+    "conservation_code_state",
+    "conservation_list_state",
+    "conservation_category_state",
+    "conservation_categories_state",
+    "conservation_criteria_state",
+    "conservation_category_national",
+]
+
+
+def update_conservation_status_caches(listing_model, subject_field, subject_pks=None, batch_size=1000):
+    """Update the conservation status cache fields of Taxa or Communities in bulk.
+
+    For each subject, the first (by ``effective_from``) listing in effect in state
+    and national scope provides the cached codes. The primary category is the first
+    category in the default category order (conservation list, rank).
+    The work takes one query each for listings, their categories and the subjects,
+    and only subjects with changed caches are written.
+
+    Arguments
+
+    listing_model TaxonConservationListing or CommunityConservationListing
+    subject_field The name of the listing's FK to the subject, "taxon" or "community"
+    subject_pks An iterable of subject pks to update, default: None (all subjects)
+    batch_size The number of rows per UPDATE statement, default: 1000
+
+    Return The number of updated subjects.
+    """
+    subject_model = listing_model._meta.get_field(subject_field).related_model
+    category_model = listing_model._meta.get_field("category").related_model
+    subjects = subject_model.objects.all()
+    listings = listing_model.objects.filter(status=ConservationListing.STATUS_EFFECTIVE)
+    if subject_pks is not None:
+        subjects = subjects.filter(pk__in=subject_pks)
+        listings = listings.filter(**{"{0}__in".format(subject_field): subject_pks})
+
+    # Currently listed subjects, and their first listing per scope
+    listed = set()
+    primary = dict()
+    for x in listings.order_by("effective_from", "pk").values(
+            "pk", "scope", "category_cache", "criteria_cache", "{0}_id".format(subject_field)):
+        subject_pk = x["{0}_id".format(subject_field)]
+        listed.add(subject_pk)
+        primary.setdefault((subject_pk, x["scope"]), x)
+
+    # The primary category of each of those listings
+    listing_lookup = listing_model._meta.model_name
+    first_category = dict()
+    for c in category_model.objects.filter(**{
+        "{0}__in".format(listing_lookup): [x["pk"] for x in primary.values()]
+    }).annotate(listing_id=F(listing_lookup)).select_related("conservation_list"):
+        first_category.setdefault(c.listing_id, c)
+
+    changed = list()
+    for subject in subjects.only("pk", *CONSERVATION_STATUS_CACHE_FIELDS):
+        state = primary.get((subject.pk, ConservationListing.SCOPE_WESTERN_AUSTRALIA))
+        national = primary.get((subject.pk, ConservationListing.SCOPE_COMMONWEALTH))
+        state_cat = first_category.get(state["pk"]) if state else None
+        national_cat = first_category.get(national["pk"]) if national else None
+        cache = dict(
+            is_currently_listed=subject.pk in listed,
+            conservation_code_state=state_cat.short_code if state_cat else None,
+            conservation_list_state=state_cat.conservation_list.code if state_cat else None,
+            conservation_category_state=state_cat.code if state_cat else None,
+            conservation_categories_state=state["category_cache"] if state else None,
+            conservation_criteria_state=state["criteria_cache"] if state else None,
+            conservation_category_national=national_cat.code if national_cat else None,
+        )
+        if any(getattr(subject, k) != v for k, v in cache.items()):
+            for k, v in cache.items():
+                setattr(subject, k, v)
+            changed.append(subject)
+
+    subject_model.objects.bulk_update(changed, CONSERVATION_STATUS_CACHE_FIELDS, batch_size=batch_size)
+    logger.info("[update_conservation_status_caches] Updated conservation status of "
+                "{0} {1}.".format(len(changed), subject_model._meta.verbose_name_plural))
+    return len(changed)
+
+
+@receiver(post_save, sender=TaxonConservationListing)
+@receiver(post_delete, sender=TaxonConservationListing)
+def taxonconservationlisting_status_caches(sender, instance, raw=False, *args, **kwargs):
+    """TaxonConservationListing: Update the Taxon's conservation status caches."""
+    if not raw:
+        update_conservation_status_caches(sender, "taxon", [instance.taxon_id])
+
+
+@receiver(post_save, sender=CommunityConservationListing)
+@receiver(post_delete, sender=CommunityConservationListing)
+def communityconservationlisting_status_caches(sender, instance, raw=False, *args, **kwargs):
+    """CommunityConservationListing: Update the Community's conservation status caches."""
+    if not raw:
+        update_conservation_status_caches(sender, "community", [instance.community_id])
+
+
 # -----------------------------------------------------------------------------
 # Documents
 class Document(RenderMixin, UrlsMixin, models.Model):
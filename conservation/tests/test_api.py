@@ -78,6 +78,28 @@ class ObservationGroupSerializerTests(TestCase):
         resp = self.client.get(url, {'format': 'json'})
         self.assertEqual(resp.status_code, 200)
 
+    def test_post_conservationcriterion_batch(self):
+        """Test that criteria are upserted by ConservationList and code."""
+        url = reverse('api:conservationcriterion-list')
+        clist = ConservationList.objects.create(code='other-list', label='Other conservation list')
+        data = [{'conservation_list': clist.pk, 'code': 'test-criterion', 'label': 'Other criterion'}]
+        resp = self.client.post(url, data=data, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(ConservationCriterion.objects.filter(code='test-criterion').count(), 2)
+        self.ccriterion.refresh_from_db()
+        self.assertIsNone(self.ccriterion.label)
+
+        # Re-sending updates the criterion of the other list only
+        data[0]['label'] = 'Updated criterion'
+        resp = self.client.post(url, data=data, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(ConservationCriterion.objects.filter(code='test-criterion').count(), 2)
+        self.assertEqual(
+            ConservationCriterion.objects.get(conservation_list=clist, code='test-criterion').label,
+            'Updated criterion')
+        self.ccriterion.refresh_from_db()
+        self.assertIsNone(self.ccriterion.label)
+
     def test_post_taxonconservationlisting(self):
         """Test the TaxonConservationListing POST endpoint behaves correctly
         """
@@ -105,6 +127,50 @@ class ObservationGroupSerializerTests(TestCase):
         resp = self.client.post(url, data=data)
         self.assertEqual(resp.status_code, 201)
 
+    def test_post_taxonconservationlisting_batch(self):
+        """Test that a batch of TaxonConservationListings is upserted with M2M and caches."""
+        url = reverse('api:taxonconservationlisting-list')
+        data = [
+            {
+                'source': 0,
+                'source_id': str(uuid.uuid4()),
+                'taxon': self.taxon.name_id,
+                'status': TaxonConservationListing.STATUS_EFFECTIVE,
+                'category': [self.ccategory.pk],
+                'criteria': [self.ccriterion.pk]
+            },
+            {
+                'source': 0,
+                'source_id': str(uuid.uuid4()),
+                'taxon': self.taxon.name_id,
+                'category': 'NA',
+            },
+            {
+                'source': 0,
+                'source_id': str(uuid.uuid4()),
+                'taxon': 'unknown',
+            },
+        ]
+        resp = self.client.post(url, data=data, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual([x['status'] for x in resp.json()], [201, 201, 406])
+
+        tcl = TaxonConservationListing.objects.get(source_id=data[0]['source_id'])
+        self.assertEqual(list(tcl.category.all()), [self.ccategory])
+        self.assertEqual(list(tcl.criteria.all()), [self.ccriterion])
+        self.assertEqual(tcl.category_cache, tcl.build_category_cache)
+        self.assertEqual(tcl.criteria_cache, 'test-criterion')
+        self.taxon.refresh_from_db()
+        self.assertTrue(self.taxon.is_currently_listed)
+        self.assertEqual(self.taxon.conservation_category_state, 'test-category')
+
+        # Re-sending the batch updates instead of creating.
+        data[0]['comments'] = 'Updated'
+        resp = self.client.post(url, data=data[:1], format='json')
+        self.assertEqual(resp.json()[0]['status'], 200)
+        tcl.refresh_from_db()
+        self.assertEqual(tcl.comments, 'Updated')
+
     def test_post_communityconservationlisting(self):
         """Test the CommunityConservationListing POST endpoint behaves correctly
         """
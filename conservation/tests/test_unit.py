@@ -189,6 +189,37 @@ class TaxonConservationListingModelTests(TestCase):
         ).strip()
         self.assertEqual(self.gaz.__str__(), x)
 
+    def test_conservation_status_caches(self):
+        """Test that gazetting and de-listing update the Taxon's conservation status caches."""
+        self.taxon.refresh_from_db()
+        self.assertFalse(self.taxon.is_currently_listed)
+        self.assertIsNone(self.taxon.conservation_category_state)
+
+        cl = cons_models.ConservationList.objects.create(
+            code='WAWCA',
+            label='test list',
+            approval_level=cons_models.ConservationList.APPROVAL_IMMEDIATE)
+        cat = cons_models.ConservationCategory.objects.create(
+            conservation_list=cl, code="VU", rank=1,
+            short_code=cons_models.ConservationCategory.SHORTCODE_THREATENED)
+        self.gaz.category.set([cat])
+        self.gaz.mark_gazetted()
+        self.gaz.save()
+
+        self.taxon.refresh_from_db()
+        self.assertTrue(self.taxon.is_currently_listed)
+        self.assertEqual(self.taxon.conservation_category_state, "VU")
+        self.assertEqual(self.taxon.conservation_list_state, "WAWCA")
+        self.assertEqual(self.taxon.conservation_code_state, "T")
+        self.assertEqual(self.taxon.conservation_categories_state, self.gaz.category_cache)
+        self.assertIsNone(self.taxon.conservation_category_national)
+
+        self.gaz.mark_delisted()
+        self.gaz.save()
+        self.taxon.refresh_from_db()
+        self.assertFalse(self.taxon.is_currently_listed)
+        self.assertIsNone(self.taxon.conservation_category_state)
+
 
 class CommunityConservationListingModelTests(TestCase):
     """Unit tests for CommunityConservationListing."""
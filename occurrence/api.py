@@ -9,6 +9,7 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework_filters import FilterSet
 
 from shared.api import BatchUpsertViewSet, MyGeoJsonPagination
+from shared.utils import in_bulk_by_str
 from wastd.users.models import User
 
 from taxonomy.models import Community, Taxon
@@ -16,6 +17,11 @@ from occurrence import serializers
 from occurrence.models import (
     AreaEncounter,
     TaxonAreaEncounter,
+    TaxonAreaOccurrence,
+    CommunityAreaOccurrence,
+    update_area_occurrences,
+    AREA_CACHE_FIELDS,
+    area_caches,
     EncounterType,
     CommunityAreaEncounter,
     Landform,
@@ -115,6 +121,14 @@ class OccurrenceTaxonAreaEncounterPolyViewSet(BatchUpsertViewSet):
     filter_class = OccurrenceTaxonAreaEncounterFilter
     pagination_class = MyGeoJsonPagination
     uid_fields = ("source", "source_id")
+    cached_fields = AREA_CACHE_FIELDS
+    cached_fields_related = ("encountered_by", "taxon")
+
+    def prefetch_fks(self, records):
+        """Fetch all taxa, users and encounter types of a batch with one query each."""
+        self.taxa = in_bulk_by_str(Taxon, [x.get("taxon") for x in records], "name_id")
+        self.users = in_bulk_by_str(User, [x.get("encountered_by") for x in records])
+        self.encounter_types = in_bulk_by_str(EncounterType, [x.get("encounter_type") for x in records])
 
     def resolve_fks(self, data):
         """Resolve FKs from PK to object.
@@ -122,21 +136,34 @@ class OccurrenceTaxonAreaEncounterPolyViewSet(BatchUpsertViewSet):
         # Undertake validation for required request params.
         if 'taxon' not in data:
             raise ValidationError('taxon is required')
-        elif not Taxon.objects.filter(name_id=data['taxon']).exists():
+        elif str(data['taxon']) not in self.taxa:
             raise ValidationError('Unknown taxon {}'.format(data['taxon']))
-        data['taxon'] = Taxon.objects.get(name_id=data['taxon'])
+        data['taxon'] = self.taxa[str(data['taxon'])]
         if 'encountered_by' not in data:
             raise ValidationError('encountered_by is required')
-        elif not User.objects.filter(pk=data['encountered_by']).exists():
+        elif str(data['encountered_by']) not in self.users:
             raise ValidationError('Unknown user {}'.format(data['encountered_by']))
-        data["encountered_by"] = User.objects.get(pk=data["encountered_by"])
+        data["encountered_by"] = self.users[str(data["encountered_by"])]
         if 'encounter_type' not in data:
             raise ValidationError('encounter_type is required')
-        elif not EncounterType.objects.filter(pk=data['encounter_type']).exists():
+        elif str(data['encounter_type']) not in self.encounter_types:
             raise ValidationError('Unknown encounter type {}'.format(data['encounter_type']))
-        data["encounter_type"] = EncounterType.objects.get(pk=data["encounter_type"])
+        data["encounter_type"] = self.encounter_types[str(data["encounter_type"])]
         return data
 
+    def set_cached_fields(self, obj):
+        """Calculate code, name, point, northern extent and label as on save."""
+        area_caches(self.model, obj)
+
+    def update_cached_fields(self, pks, created=True):
+        """Recalculate cached fields in bulk, and update the occurrence index of the records' taxa."""
+        super().update_cached_fields(pks, created=created)
+        if pks:
+            update_area_occurrences(
+                TaxonAreaOccurrence, TaxonAreaEncounter, "taxon",
+                subject_pks=set(TaxonAreaEncounter.objects.filter(
+                    pk__in=pks).values_list("taxon_id", flat=True)))
+
 
 class OccurrenceTaxonAreaEncounterPointViewSet(OccurrenceTaxonAreaEncounterPolyViewSet):
     """TaxonEncounter point view set.
@@ -171,27 +198,48 @@ class OccurrenceCommunityAreaEncounterPolyViewSet(BatchUpsertViewSet):
     filter_class = OccurrenceCommunityAreaEncounterFilter
     pagination_class = MyGeoJsonPagination
     uid_fields = ("source", "source_id")
+    cached_fields = AREA_CACHE_FIELDS
+    cached_fields_related = ("encountered_by", "community")
+
+    def prefetch_fks(self, records):
+        """Fetch all communities, users and encounter types of a batch with one query each."""
+        self.communities = in_bulk_by_str(Community, [x.get("community") for x in records], "code")
+        self.users = in_bulk_by_str(User, [x.get("encountered_by") for x in records])
+        self.encounter_types = in_bulk_by_str(EncounterType, [x.get("encounter_type") for x in records])
 
     def resolve_fks(self, data):
         """Resolve FKs from PK to object."""
         # Undertake validation for required request params.
         if 'community' not in data:
             raise ValidationError('community is required')
-        elif not Community.objects.filter(code=data["community"]).exists():
+        elif str(data["community"]) not in self.communities:
             raise ValidationError('Unknown community {}'.format(data['community']))
-        data['community'] = Community.objects.get(code=data["community"])
+        data['community'] = self.communities[str(data["community"])]
         if 'encountered_by' not in data:
             raise ValidationError('encountered_by is required')
-        elif not User.objects.filter(pk=data['encountered_by']).exists():
+        elif str(data['encountered_by']) not in self.users:
             raise ValidationError('Unknown user {}'.format(data['encountered_by']))
-        data["encountered_by"] = User.objects.get(pk=data["encountered_by"])
+        data["encountered_by"] = self.users[str(data["encountered_by"])]
         if 'encounter_type' not in data:
             raise ValidationError('encounter_type is required')
-        elif not EncounterType.objects.filter(pk=data['encounter_type']).exists():
+        elif str(data['encounter_type']) not in self.encounter_types:
             raise ValidationError('Unknown encounter type {}'.format(data['encounter_type']))
-        data["encounter_type"] = EncounterType.objects.get(pk=data["encounter_type"])
+        data["encounter_type"] = self.encounter_types[str(data["encounter_type"])]
         return data
 
+    def set_cached_fields(self, obj):
+        """Calculate code, name, point, northern extent and label as on save."""
+        area_caches(self.model, obj)
+
+    def update_cached_fields(self, pks, created=True):
+        """Recalculate cached fields in bulk, and update the occurrence index of the records' communities."""
+        super().update_cached_fields(pks, created=created)
+        if pks:
+            update_area_occurrences(
+                CommunityAreaOccurrence, CommunityAreaEncounter, "community",
+                subject_pks=set(CommunityAreaEncounter.objects.filter(
+                    pk__in=pks).values_list("community_id", flat=True)))
+
 
 class OccurrenceCommunityAreaEncounterPointViewSet(OccurrenceCommunityAreaEncounterPolyViewSet):
     """Occurrence CommunityAreaEncounter view set."""
@@ -206,6 +254,7 @@ class LandformViewSet(BatchUpsertViewSet):
     queryset = Landform.objects.all()
     serializer_class = serializers.LandformSerializer
     uid_fields = ("pk",)
+    save_upserted = False
 
 
 class RockTypeViewSet(BatchUpsertViewSet):
@@ -214,6 +263,7 @@ class RockTypeViewSet(BatchUpsertViewSet):
     queryset = RockType.objects.all()
     serializer_class = serializers.RockTypeSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = RockType
 
 
@@ -223,6 +273,7 @@ class SoilTypeViewSet(BatchUpsertViewSet):
     queryset = SoilType.objects.all()
     serializer_class = serializers.SoilTypeSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SoilType
 
 
@@ -232,6 +283,7 @@ class SoilColourViewSet(BatchUpsertViewSet):
     queryset = SoilColour.objects.all()
     serializer_class = serializers.SoilColourSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SoilColour
 
 
@@ -241,6 +293,7 @@ class DrainageViewSet(BatchUpsertViewSet):
     queryset = Drainage.objects.all()
     serializer_class = serializers.DrainageSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = Drainage
 
 
@@ -250,6 +303,7 @@ class SurveyMethodViewSet(BatchUpsertViewSet):
     queryset = SurveyMethod.objects.all()
     serializer_class = serializers.SurveyMethodSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SurveyMethod
 
 
@@ -259,6 +313,7 @@ class SoilConditionViewSet(BatchUpsertViewSet):
     queryset = SoilCondition.objects.all()
     serializer_class = serializers.SoilConditionSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SoilCondition
 
 
@@ -268,6 +323,7 @@ class CountAccuracyViewSet(BatchUpsertViewSet):
     queryset = CountAccuracy.objects.all()
     serializer_class = serializers.CountAccuracySerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = CountAccuracy
 
 
@@ -277,6 +333,7 @@ class CountMethodViewSet(BatchUpsertViewSet):
     queryset = CountMethod.objects.all()
     serializer_class = serializers.CountMethodSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = CountMethod
 
 
@@ -286,6 +343,7 @@ class CountSubjectViewSet(BatchUpsertViewSet):
     queryset = CountSubject.objects.all()
     serializer_class = serializers.CountSubjectSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = CountSubject
 
 
@@ -295,6 +353,7 @@ class PlantConditionViewSet(BatchUpsertViewSet):
     queryset = PlantCondition.objects.all()
     serializer_class = serializers.PlantConditionSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = PlantCondition
 
 
@@ -304,6 +363,7 @@ class DetectionMethodViewSet(BatchUpsertViewSet):
     queryset = DetectionMethod.objects.all()
     serializer_class = serializers.DetectionMethodSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = DetectionMethod
 
 
@@ -313,6 +373,7 @@ class ConfidenceViewSet(BatchUpsertViewSet):
     queryset = Confidence.objects.all()
     serializer_class = serializers.ConfidenceSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = Confidence
 
 
@@ -322,6 +383,7 @@ class ReproductiveMaturityViewSet(BatchUpsertViewSet):
     queryset = ReproductiveMaturity.objects.all()
     serializer_class = serializers.ReproductiveMaturitySerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = ReproductiveMaturity
 
 
@@ -331,6 +393,7 @@ class AnimalHealthViewSet(BatchUpsertViewSet):
     queryset = AnimalHealth.objects.all()
     serializer_class = serializers.AnimalHealthSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = AnimalHealth
 
 
@@ -340,6 +403,7 @@ class AnimalSexViewSet(BatchUpsertViewSet):
     queryset = AnimalSex.objects.all()
     serializer_class = serializers.AnimalSexSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = AnimalSex
 
 
@@ -349,6 +413,7 @@ class CauseOfDeathViewSet(BatchUpsertViewSet):
     queryset = CauseOfDeath.objects.all()
     serializer_class = serializers.CauseOfDeathSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = CauseOfDeath
 
 
@@ -358,6 +423,7 @@ class SecondarySignsViewSet(BatchUpsertViewSet):
     queryset = SecondarySigns.objects.all()
     serializer_class = serializers.SecondarySignsSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SecondarySigns
 
 
@@ -367,6 +433,7 @@ class SampleTypeViewSet(BatchUpsertViewSet):
     queryset = SampleType.objects.all()
     serializer_class = serializers.SampleTypeSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SampleType
 
 
@@ -376,6 +443,7 @@ class SampleDestinationViewSet(BatchUpsertViewSet):
     queryset = SampleDestination.objects.all()
     serializer_class = serializers.SampleDestinationSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = SampleDestination
 
 
@@ -385,6 +453,7 @@ class PermitTypeViewSet(BatchUpsertViewSet):
     queryset = PermitType.objects.all()
     serializer_class = serializers.PermitTypeSerializer
     uid_fields = ("pk",)
+    save_upserted = False
     model = PermitType
 
 
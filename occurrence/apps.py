@@ -6,3 +6,7 @@ from django.apps import AppConfig
 
 class OccurrenceConfig(AppConfig):
     name = 'occurrence'
+
+    def ready(self):
+        """Register map layers."""
+        import occurrence.tiles  # noqa
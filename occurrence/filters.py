@@ -11,7 +11,7 @@ from occurrence import models as occ_models
 from taxonomy import models as tax_models
 from taxonomy import widgets as tax_widgets
 from shared.filters import FILTER_OVERRIDES
-from wastd.observations.models import Area
+from wastd.observations.models import Area, admin_area_choices
 from wastd.users import widgets as usr_widgets
 
 
@@ -26,12 +26,9 @@ class TaxonAreaEncounterFilter(django_filters.FilterSet):
         queryset=get_user_model().objects.all(),
         widget=usr_widgets.UserWidget()
     )
-    admin_areas = django_filters.ModelMultipleChoiceFilter(
+    admin_areas = django_filters.MultipleChoiceFilter(
         label="DBCA Regions and Districts",
-        queryset=Area.objects.filter(
-            area_type__in=[
-                Area.AREATYPE_DBCA_REGION,
-                Area.AREATYPE_DBCA_DISTRICT]),
+        choices=admin_area_choices,
         method='occurring_in_area'
     )
 
@@ -61,15 +58,13 @@ class TaxonAreaEncounterFilter(django_filters.FilterSet):
     def occurring_in_area(self, queryset, name, value):
         """Return Taxa occurring in the given Area.
 
-        * The filter returns a list of Area objects as ``value``
-        * We need to extract their PKs to create a queryset equivalent to
-          the list of objects ``value``. Only querysets allow agggregation, not lists.
+        * The filter returns a list of Area PKs as ``value``, its choices are cached
         * A search_area Multipolygon is collected from the geoms of Areas in ``value``
         * The queryset is filtered by intersection of its point or geom with the search area
         """
         if value:
             search_area = Area.objects.filter(
-                pk__in=[area.pk for area in value]
+                pk__in=value
             ).aggregate(Collect('geom'))["geom__collect"]
             return queryset.filter(
                 Q(point__intersects=search_area) |
@@ -92,12 +87,9 @@ class CommunityAreaEncounterFilter(django_filters.FilterSet):
         queryset=get_user_model().objects.all(),
         widget=usr_widgets.UserWidget()
     )
-    admin_areas = django_filters.ModelMultipleChoiceFilter(
+    admin_areas = django_filters.MultipleChoiceFilter(
         label="DBCA Regions and Districts",
-        queryset=Area.objects.filter(
-            area_type__in=[
-                Area.AREATYPE_DBCA_REGION,
-                Area.AREATYPE_DBCA_DISTRICT]),
+        choices=admin_area_choices,
         method='occurring_in_area'
     )
 
@@ -126,15 +118,13 @@ class CommunityAreaEncounterFilter(django_filters.FilterSet):
     def occurring_in_area(self, queryset, name, value):
         """Return occurrences in the given Area.
 
-        * The filter returns a list of Area objects as ``value``
-        * We need to extract their PKs to create a queryset equivalent to
-          the list of objects ``value``. Only querysets allow agggregation, not lists.
+        * The filter returns a list of Area PKs as ``value``, its choices are cached
         * A search_area Multipolygon is collected from the geoms of Areas in ``value``
         * The queryset is filtered by intersection of its point or geom with the search area
         """
         if value:
             search_area = Area.objects.filter(
-                pk__in=[area.pk for area in value]
+                pk__in=value
             ).aggregate(Collect('geom'))["geom__collect"]
             return queryset.filter(
                 Q(point__intersects=search_area) |
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_area_occurrences(apps, schema_editor):
+    """Build the Taxon and Community occurrence indexes."""
+    from occurrence.models import update_area_occurrences
+    update_area_occurrences(
+        apps.get_model('occurrence', 'TaxonAreaOccurrence'),
+        apps.get_model('occurrence', 'TaxonAreaEncounter'),
+        'taxon')
+    update_area_occurrences(
+        apps.get_model('occurrence', 'CommunityAreaOccurrence'),
+        apps.get_model('occurrence', 'CommunityAreaEncounter'),
+        'community')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('observations', '0027_encounter_name_dirty'),
+        ('taxonomy', '0033_conservation_status_cache'),
+        ('occurrence', '0047_auto_20200702_1455'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxonAreaOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', models.ForeignKey(help_text='The DBCA Region or District.', on_delete=django.db.models.deletion.CASCADE, related_name='taxon_occurrences', to='observations.Area', verbose_name='Area')),
+                ('taxon', models.ForeignKey(help_text='The Taxon occurring in the Area.', on_delete=django.db.models.deletion.CASCADE, related_name='occurrence_areas', to='taxonomy.Taxon', verbose_name='Taxon')),
+            ],
+            options={
+                'verbose_name': 'Taxon Area Occurrence',
+                'verbose_name_plural': 'Taxon Area Occurrences',
+                'unique_together': {('taxon', 'area')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CommunityAreaOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', models.ForeignKey(help_text='The DBCA Region or District.', on_delete=django.db.models.deletion.CASCADE, related_name='community_occurrences', to='observations.Area', verbose_name='Area')),
+                ('community', models.ForeignKey(help_text='The Community occurring in the Area.', on_delete=django.db.models.deletion.CASCADE, related_name='occurrence_areas', to='taxonomy.Community', verbose_name='Community')),
+            ],
+            options={
+                'verbose_name': 'Community Area Occurrence',
+                'verbose_name_plural': 'Community Area Occurrences',
+                'unique_together': {('community', 'area')},
+            },
+        ),
+        migrations.RunPython(build_area_occurrences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occurrence', '0048_area_occurrence_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='areaencounter',
+            name='as_html',
+        ),
+    ]
@@ -13,7 +13,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.gis.db import models as geo_models
 from django.urls import reverse
 from django.db import models
-from django.db.models.signals import post_save, pre_delete, pre_save  # noqa
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save  # noqa
 from django.dispatch import receiver
 
 from django.template import loader
@@ -32,7 +33,9 @@ from shared.models import (
     QualityControlMixin,
     UrlsMixin
 )
+from shared.rendering import rendered
 from taxonomy.models import Community, Taxon
+from wastd.observations.models import Area
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -226,13 +229,6 @@ class AreaEncounter(PolymorphicModel,
         help_text=_("The exact extent of the area occupied by the encountered "
                     "subject as polygon in WGS84, if available."))
 
-    # -------------------------------------------------------------------------
-    # Cached fields
-    as_html = models.TextField(
-        verbose_name=_("HTML representation"),
-        blank=True, null=True, editable=False,
-        help_text=_("The cached HTML representation for display purposes."),)
-
     class Meta:
         """Class options."""
 
@@ -302,6 +298,15 @@ class AreaEncounter(PolymorphicModel,
         t = loader.get_template(self.html_template)
         return mark_safe(t.render({"object": self}))
 
+    render_templates = {"as_html": "occurrence/popup/areaencounter.html"}
+    render_context_name = "object"
+    render_depends = ("encountered_by", )
+
+    @property
+    def as_html(self):
+        """The HTML popup, rendered on demand and cached, see shared.rendering."""
+        return rendered(self, "as_html")
+
     @property
     def subject(self):
         """Return the subject of the encounter."""
@@ -340,6 +345,8 @@ class TaxonAreaEncounter(AreaEncounter):
         card_template = "occurrence/cards/areaencounter.html"
         ordering = ["id", ]
 
+    render_depends = ("encountered_by", "taxon")
+
     def __str__(self):
         """The unicode representation."""
         return "Encounter of {5} at [{0}] ({1}) {2} on {3} by {4}".format(
@@ -392,6 +399,8 @@ class CommunityAreaEncounter(AreaEncounter):
         card_template = "occurrence/cards/areaencounter.html"
         ordering = ["id", ]
 
+    render_depends = ("encountered_by", "community")
+
     def __str__(self):
         """The unicode representation."""
         return "Encounter of {5} at [{0}] ({1}) {2} on {3} by {4}".format(
@@ -427,6 +436,10 @@ class CommunityAreaEncounter(AreaEncounter):
         )
 
 
+# The fields set by area_caches
+AREA_CACHE_FIELDS = ("code", "name", "point", "northern_extent", "label")
+
+
 @receiver(pre_save, sender=TaxonAreaEncounter)
 @receiver(pre_save, sender=CommunityAreaEncounter)
 def area_caches(sender, instance, *args, **kwargs):
@@ -446,11 +459,203 @@ def area_caches(sender, instance, *args, **kwargs):
     instance.northern_extent = instance.derived_northern_extent
     instance.label = instance.__str__()[0:1000]
 
-    if instance.pk:
-        logger.info("[areaencounter_caches] Updating cache fields.")
-        instance.as_html = instance.derived_html
+
+
+# Occurrence index -----------------------------------------------------------#
+OCCURRENCE_INDEX_AREA_TYPES = [Area.AREATYPE_DBCA_REGION, Area.AREATYPE_DBCA_DISTRICT]
+
+
+class TaxonAreaOccurrence(models.Model):
+    """A Taxon with at least one TaxonAreaEncounter in a DBCA Region or District.
+
+    Maintained by ``update_area_occurrences``.
+    """
+
+    taxon = models.ForeignKey(
+        Taxon,
+        on_delete=models.CASCADE,
+        related_name="occurrence_areas",
+        verbose_name=_("Taxon"),
+        help_text=_("The Taxon occurring in the Area."),
+    )
+
+    area = models.ForeignKey(
+        Area,
+        on_delete=models.CASCADE,
+        related_name="taxon_occurrences",
+        verbose_name=_("Area"),
+        help_text=_("The DBCA Region or District."),
+    )
+
+    class Meta:
+        """Class options."""
+
+        unique_together = ("taxon", "area")
+        verbose_name = "Taxon Area Occurrence"
+        verbose_name_plural = "Taxon Area Occurrences"
+
+    def __str__(self):
+        """The unicode representation."""
+        return "{0} in {1}".format(self.taxon_id, self.area_id)
+
+
+class CommunityAreaOccurrence(models.Model):
+    """A Community with at least one CommunityAreaEncounter in a DBCA Region or District.
+
+    Maintained by ``update_area_occurrences``.
+    """
+
+    community = models.ForeignKey(
+        Community,
+        on_delete=models.CASCADE,
+        related_name="occurrence_areas",
+        verbose_name=_("Community"),
+        help_text=_("The Community occurring in the Area."),
+    )
+
+    area = models.ForeignKey(
+        Area,
+        on_delete=models.CASCADE,
+        related_name="community_occurrences",
+        verbose_name=_("Area"),
+        help_text=_("The DBCA Region or District."),
+    )
+
+    class Meta:
+        """Class options."""
+
+        unique_together = ("community", "area")
+        verbose_name = "Community Area Occurrence"
+        verbose_name_plural = "Community Area Occurrences"
+
+    def __str__(self):
+        """The unicode representation."""
+        return "{0} in {1}".format(self.community_id, self.area_id)
+
+
+def occurrence_indexes():
+    """Return which occurrences are indexed by Area.
+
+    Returns:
+    A tuple of (index model, encounter model, subject field).
+    """
+    return (
+        (TaxonAreaOccurrence, TaxonAreaEncounter, "taxon"),
+        (CommunityAreaOccurrence, CommunityAreaEncounter, "community"),
+    )
+
+
+def intersecting(geom):
+    """Return a Q object for AreaEncounters whose point or geom intersect a geometry or OuterRef."""
+    return Q(point__intersects=geom) | Q(geom__intersects=geom)
+
+
+def update_area_occurrences(index_model, encounter_model, subject_field,
+                            subject_pks=None, area_pks=None, batch_size=1000):
+    """Synchronise an occurrence index with the encounters for some or all subjects and Areas.
+
+    Without ``subject_pks``, each indexed Area finds the distinct subjects of all
+    intersecting encounters with one spatial query.
+    With ``subject_pks``, each subject finds all indexed Areas intersecting any
+    of its encounters with one spatial query.
+    Missing index rows are bulk-created, stale ones deleted.
+
+    Arguments:
+
+    index_model <Model> TaxonAreaOccurrence or CommunityAreaOccurrence.
+    encounter_model <Model> TaxonAreaEncounter or CommunityAreaEncounter.
+    subject_field <str> The name of the encounter's subject FK, "taxon" or "community".
+    subject_pks <iterable> Only update these subjects, default: None (all).
+    area_pks <iterable> Only update these Areas, default: None (all indexed Areas).
+    batch_size <int> The maximum number of rows per INSERT statement. Default: 1000.
+
+    Returns:
+    A tuple of (created, deleted) index rows.
+    """
+    fk = "{0}_id".format(subject_field)
+    area_model = index_model._meta.get_field("area").related_model
+    areas = area_model.objects.filter(area_type__in=OCCURRENCE_INDEX_AREA_TYPES)
+    index = index_model.objects.all()
+    if area_pks is not None:
+        areas = areas.filter(pk__in=area_pks)
+        index = index.filter(area_id__in=area_pks)
+    if subject_pks is not None:
+        subject_pks = [x for x in subject_pks if x is not None]
+        index = index.filter(**{"{0}__in".format(fk): subject_pks})
+
+    pairs = set()
+    if subject_pks is None:
+        for area in areas.only("pk", "geom"):
+            pairs.update(
+                (subject_pk, area.pk) for subject_pk in
+                encounter_model.objects.filter(intersecting(area.geom)).order_by(
+                ).values_list(fk, flat=True).distinct())
     else:
-        logger.info("[area_caches] New Area, re-save to populate caches.")
+        for subject_pk in subject_pks:
+            pairs.update(
+                (subject_pk, area_pk) for area_pk in
+                areas.annotate(occurs=Exists(encounter_model.objects.filter(
+                    intersecting(OuterRef("geom")), **{fk: subject_pk}))
+                ).filter(occurs=True).values_list("pk", flat=True))
+
+    existing = set(index.values_list(fk, "area_id"))
+    stale = existing - pairs
+    for area_pk in {a for s, a in stale}:
+        index_model.objects.filter(
+            area_id=area_pk,
+            **{"{0}__in".format(fk): [s for s, a in stale if a == area_pk]}).delete()
+    index_model.objects.bulk_create(
+        [index_model(**{fk: s, "area_id": a}) for s, a in pairs - existing],
+        batch_size=batch_size, ignore_conflicts=True)
+    return (len(pairs - existing), len(stale))
+
+
+def update_all_area_occurrences():
+    """Rebuild all occurrence indexes from scratch."""
+    for index_model, encounter_model, subject_field in occurrence_indexes():
+        created, deleted = update_area_occurrences(index_model, encounter_model, subject_field)
+        logger.info("[update_all_area_occurrences] {0}: created {1}, deleted {2}.".format(
+            index_model._meta.verbose_name_plural, created, deleted))
+
+
+@receiver(pre_save, sender=TaxonAreaEncounter)
+@receiver(pre_save, sender=CommunityAreaEncounter)
+def areaencounter_remember_subject(sender, instance, *args, **kwargs):
+    """AreaEncounter: Remember the saved subject, whose index entries may become stale."""
+    fk = "{0}_id".format("taxon" if sender is TaxonAreaEncounter else "community")
+    instance._indexed_subject_pks = set(
+        sender.objects.filter(pk=instance.pk).values_list(fk, flat=True)) if instance.pk else set()
+
+
+@receiver(post_save, sender=TaxonAreaEncounter)
+@receiver(post_save, sender=CommunityAreaEncounter)
+@receiver(post_delete, sender=TaxonAreaEncounter)
+@receiver(post_delete, sender=CommunityAreaEncounter)
+def areaencounter_area_occurrences(sender, instance, raw=False, *args, **kwargs):
+    """AreaEncounter: Update the occurrence index of the encounter's old and new subject."""
+    if raw:
+        return
+    for index_model, encounter_model, subject_field in occurrence_indexes():
+        if sender is encounter_model:
+            subject_pks = getattr(instance, "_indexed_subject_pks", set())
+            subject_pks.add(getattr(instance, "{0}_id".format(subject_field)))
+            update_area_occurrences(index_model, encounter_model, subject_field, subject_pks=subject_pks)
+
+
+@receiver(post_save, sender=Area)
+def area_area_occurrences(sender, instance, raw=False, *args, **kwargs):
+    """Area: Update the occurrence indexes of a saved DBCA Region or District.
+
+    Areas of other types drop out of the indexes.
+    Saves which change neither the geom nor the area type, see ``Area.save``, keep the indexes.
+    """
+    if raw or not (getattr(instance, "_geom_changed", True) or getattr(instance, "_area_type_changed", True)):
+        return
+    for index_model, encounter_model, subject_field in occurrence_indexes():
+        if instance.area_type in OCCURRENCE_INDEX_AREA_TYPES:
+            update_area_occurrences(index_model, encounter_model, subject_field, area_pks=[instance.pk])
+        else:
+            index_model.objects.filter(area=instance).delete()
 
 
 # Observation models ---------------------------------------------------------#
@@ -1,4 +1,5 @@
 from django.apps import apps
+from django.utils.encoding import smart_text
 from rest_framework.serializers import SlugRelatedField, ModelSerializer, ValidationError
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 from rest_polymorphic.serializers import PolymorphicSerializer
@@ -43,6 +44,24 @@ from occurrence.models import (
 )
 
 
+class CodeRelatedField(SlugRelatedField):
+    """A SlugRelatedField resolving the codes of a lookup table from the lookup cache.
+
+    Lookup tables are models with a CodeLabelDescriptionMixin.
+    """
+
+    def __init__(self, model, **kwargs):
+        """Resolve codes of the given model."""
+        super(CodeRelatedField, self).__init__(queryset=model.objects.all(), slug_field="code", **kwargs)
+
+    def to_internal_value(self, data):
+        """Return the instance with the code ``data``."""
+        obj = self.get_queryset().model.from_code(smart_text(data))
+        if obj is None:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=smart_text(data))
+        return obj
+
+
 class OccurrenceAreaEncounterPolySerializer(GeoFeatureModelSerializer):
     """Serializer for Occurrence AreaEncounter.
     """
@@ -383,10 +402,8 @@ class VegetationClassificationSerializer(ObservationGroupSerializer):
 
 class PlantCountSerializer(ObservationGroupSerializer):
 
-    count_method = SlugRelatedField(
-        queryset=CountMethod.objects.all(), slug_field='code', required=False)
-    count_accuracy = SlugRelatedField(
-        queryset=CountAccuracy.objects.all(), slug_field='code', required=False)
+    count_method = CodeRelatedField(CountMethod, required=False)
+    count_accuracy = CodeRelatedField(CountAccuracy, required=False)
 
     class Meta:
         model = PlantCount
@@ -452,12 +469,9 @@ class AnimalObservationSerializer(ObservationGroupSerializer):
 
 
 class PhysicalSampleSerializer(ObservationGroupSerializer):
-    sample_type = SlugRelatedField(
-        queryset=SampleType.objects.all(), slug_field="code", required=False, allow_null=True)
-    sample_destination = SlugRelatedField(
-        queryset=SampleDestination.objects.all(), slug_field="code", required=False, allow_null=True)
-    permit_type = SlugRelatedField(
-        queryset=PermitType.objects.all(), slug_field='code', required=False, allow_null=True)
+    sample_type = CodeRelatedField(SampleType, required=False, allow_null=True)
+    sample_destination = CodeRelatedField(SampleDestination, required=False, allow_null=True)
+    permit_type = CodeRelatedField(PermitType, required=False, allow_null=True)
 
     class Meta:
         model = PhysicalSample
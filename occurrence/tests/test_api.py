@@ -145,6 +145,41 @@ class AreaEncounterSerializerTests(TestCase):
         )
         self.assertEqual(resp.status_code, 201)
 
+    def test_occ_taxonpoints_batch_post(self):
+        url = reverse('api:occurrence_taxonarea_points-list') + '?format=json'
+        source_ids = [str(uuid.uuid4()) for i in range(3)]
+        records = [
+            {
+                'source': 0,
+                'source_id': source_id,
+                'code': 'code',
+                'name': 'Name',
+                'taxon': self.taxon.name_id,
+                'encountered_by': self.user.pk,
+                'encounter_type': self.enc_type.pk,
+                'point': 'POINT (115 -32)',
+            } for source_id in source_ids
+        ]
+        resp = self.client.post(url, records, format='json')
+        self.assertEqual(resp.status_code, 200)
+        tae = TaxonAreaEncounter.objects.filter(source_id__in=source_ids)
+        self.assertEqual(tae.count(), 3)
+        # Multi-table inherited rows exist in both tables and have cached fields
+        self.assertEqual(AreaEncounter.objects.filter(source_id__in=source_ids).count(), 3)
+        self.assertTrue(all([t.as_html for t in tae]))
+        self.assertTrue(all([t.northern_extent == -32 and 'Name' in t.label for t in tae]))
+
+        # Posting the same records again updates them and their cached fields
+        for rec in records:
+            rec['name'] = 'New name'
+            rec['point'] = 'POINT (115 -31)'
+        resp = self.client.post(url, records, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(TaxonAreaEncounter.objects.filter(source_id__in=source_ids).count(), 3)
+        self.assertEqual(TaxonAreaEncounter.objects.filter(
+            source_id__in=source_ids, name='New name', northern_extent=-31,
+            label__contains='New name').count(), 3)
+
     def test_occ_communityareas_post(self):
         Community.objects.create(code='comm1', name='Test community')
         url = reverse('api:occurrence_communityarea_polys-list')
@@ -76,6 +76,7 @@ Test TAE and CAE geom. Create, validate, view, export.
 """
 from __future__ import unicode_literals
 import uuid
+from unittest import mock
 
 from django.utils import timezone
 
@@ -88,7 +89,9 @@ from django.test import TestCase
 from model_mommy import mommy
 from mommy_spatial_generators import MOMMY_SPATIAL_FIELDS  # noqa
 from occurrence import models as occ_models
+from taxonomy.filters import TaxonFilter
 from taxonomy.models import Community, Taxon  # noqa
+from wastd.observations.models import Area
 # from django.contrib.contenttypes.models import ContentType
 
 MOMMY_CUSTOM_FIELDS_GEN = MOMMY_SPATIAL_FIELDS
@@ -432,6 +435,35 @@ class TaxonAreaEncounterTests(TestCase):
         self.assertTrue(self.ae.areaencounter_ptr.get_nearby_encounters(dist_dd=1).count() > 0)
         self.assertTrue(self.tae.nearby_same(dist_dd=1).count() > 0)
 
+    def test_area_occurrence_index(self):
+        """Test that the occurrence index follows encounters and Areas."""
+        region = Area.objects.create(
+            area_type=Area.AREATYPE_DBCA_REGION,
+            name="Region",
+            geom=GEOSGeometry('MULTIPOLYGON (((114 -33, 116 -33, 116 -31, 114 -31, 114 -33)))', srid=4326)
+        )
+        self.assertTrue(occ_models.TaxonAreaOccurrence.objects.filter(taxon=self.taxon0, area=region).exists())
+        self.assertIn(self.taxon0, TaxonFilter({"admin_areas": [region.pk]}, queryset=Taxon.objects.all()).qs)
+        self.assertNotIn(self.taxon1, TaxonFilter({"admin_areas": [region.pk]}, queryset=Taxon.objects.all()).qs)
+
+        # Moving the taxon's encounters elsewhere drops the taxon from the index
+        for tae in [self.tae, self.tae1]:
+            tae.taxon = self.taxon1
+            tae.save()
+        self.assertFalse(occ_models.TaxonAreaOccurrence.objects.filter(taxon=self.taxon0).exists())
+        self.assertTrue(occ_models.TaxonAreaOccurrence.objects.filter(taxon=self.taxon1, area=region).exists())
+
+        # Renaming the Area keeps the index
+        with mock.patch("occurrence.models.update_area_occurrences") as update:
+            region.name = "Renamed region"
+            region.save()
+        update.assert_not_called()
+
+        # Shrinking the Area drops the taxon from the index
+        region.geom = GEOSGeometry('MULTIPOLYGON (((120 -33, 121 -33, 121 -32, 120 -32, 120 -33)))', srid=4326)
+        region.save()
+        self.assertFalse(occ_models.TaxonAreaOccurrence.objects.filter(area=region).exists())
+
     # ------------------------------------------------------------------------#
     # ObsGroup
     def test_obsgroup_str(self):
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Map layers of Occurrences, see shared.tiles."""
+from occurrence.models import CommunityAreaEncounter, TaxonAreaEncounter
+from shared.tiles import TileLayer, register_layer
+
+# Vector tiles
+register_layer(TileLayer(
+    "taxon_area_encounters", TaxonAreaEncounter,
+    geometry_fields=("geom", "point"),
+    properties=("id", "taxon", "area_type", "code", "label"),
+    filter_fields=("taxon", "area_type"),
+    simplify=True))
+register_layer(TileLayer(
+    "community_area_encounters", CommunityAreaEncounter,
+    geometry_fields=("geom", "point"),
+    properties=("id", "community", "area_type", "code", "label"),
+    filter_fields=("community", "area_type"),
+    simplify=True))
+
+# Tiled GeoJSON layers
+register_layer(TileLayer(
+    "community-area-encounter-tiled-geojson", CommunityAreaEncounter, vector=False))
@@ -2,6 +2,7 @@
 """Shared admin."""
 from __future__ import unicode_literals
 
+from django.contrib import admin
 from django.contrib.gis.db import models as geo_models
 from django.utils.translation import ugettext_lazy as _
 
@@ -9,6 +10,8 @@ from django_fsm_log.admin import StateLogInline
 from leaflet.forms.widgets import LeafletWidget
 from reversion.admin import VersionAdmin
 
+from shared.models import BatchUpsertJob
+
 
 # Fix collapsing widget width
 # https://github.com/applegrew/django-select2/issues/252
@@ -55,3 +58,16 @@ class CodeLabelDescriptionAdmin(VersionAdmin):
             'fields': ("label", "description", "code")}
          ),
     )
+
+
+@admin.register(BatchUpsertJob)
+class BatchUpsertJobAdmin(admin.ModelAdmin):
+    """Read-only admin for the progress of streamed batch upserts."""
+
+    date_hierarchy = "started_on"
+    list_display = ["job_id", "model_name", "windows", "records",
+                    "retained", "updated", "created", "finished", "updated_on"]
+    list_filter = ["model_name", "finished"]
+    search_fields = ("job_id", "last_error")
+    readonly_fields = ["job_id", "model_name", "windows", "records", "retained",
+                       "updated", "created", "finished", "last_error", "started_on", "updated_on"]
@@ -1,16 +1,37 @@
 # -*- coding: utf-8 -*-
 """Shared API utilities."""
+import base64
+import binascii
+import csv
+import io
+import itertools
+import json
 import logging
+import operator
+import uuid
 from collections import OrderedDict
+from functools import reduce
 
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
+from django.http import StreamingHttpResponse
 
 from rest_framework import pagination, status, viewsets  # , serializers, routers
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response as RestResponse
 from rest_framework_csv.renderers import CSVRenderer
+from rest_framework_gis.serializers import GeoFeatureModelSerializer
 from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from shared.models import QualityControlMixin
+from shared.cache import invalidate_lookups
+from shared.models import BatchUpsertJob, QualityControlMixin
+from shared.rendering import invalidate_renders
+from shared.tiles import invalidate_model_tiles
+from shared.utils import bulk_create_inherited, chunks, iter_ndjson
 
 logger = logging.getLogger(__name__)
 
@@ -33,18 +54,107 @@ class CustomCSVRenderer(CSVRenderer):
             writer_opts=writer_opts)
 
 
+def keyset_filter(fields, values):
+    """Return a Q object selecting the rows after the given values of the ordering fields.
+
+    Arguments
+
+    fields A list of field names, descending fields prefixed with "-", e.g. ["when", "pk"]
+    values A list of values of these fields, e.g. the values of the last row of a page
+
+    Return A Q object, e.g. ``Q(when__gt=v0) | Q(when=v0, pk__gt=v1)``.
+    """
+    conditions = list()
+    for i, field in enumerate(fields):
+        lookups = {f.lstrip("-"): v for f, v in zip(fields[:i], values[:i])}
+        lookups["{0}__{1}".format(field.lstrip("-"), "lt" if field.startswith("-") else "gt")] = values[i]
+        conditions.append(Q(**lookups))
+    return reduce(operator.or_, conditions)
+
+
 class CustomLimitOffsetPagination(pagination.LimitOffsetPagination):
-    """Opt-out LimitOffset pagination.
+    """Opt-out LimitOffset pagination with opt-in keyset pagination.
 
     Include GET parameter ``no_page`` to deactivate pagination.
+
+    Include GET parameter ``cursor`` (empty for the first page) to paginate by keyset:
+    pages are ordered by the view's ``keyset_fields`` (default: ``("pk", )``),
+    and each page is selected by the values of the last row of the previous page,
+    which are encoded in the ``next`` link.
+    Deep pages are as fast as the first one, as no rows are skipped with OFFSET.
+    Keyset fields must be non-null and their combination unique.
+    The count is only calculated if GET parameter ``count`` is given.
     """
 
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = "Invalid cursor"
+    keyset = False
+
     def paginate_queryset(self, queryset, request, view=None):
-        """Turn off pagination based on query param ``no_page``."""
+        """Turn off pagination based on query param ``no_page``, paginate by keyset if ``cursor`` is given."""
         if 'no_page' in request.query_params:
             return None
+        if self.cursor_query_param in request.query_params:
+            return self.paginate_queryset_by_keyset(queryset, request, view)
         return super().paginate_queryset(queryset, request, view)
 
+    def paginate_queryset_by_keyset(self, queryset, request, view=None):
+        """Return the page of rows after the request's cursor."""
+        self.keyset = True
+        self.request = request
+        self.keyset_fields = list(getattr(view, "keyset_fields", ("pk", )))
+        self.limit = self.get_limit(request)
+        self.count = self.get_count(queryset) if self.count_query_param in request.query_params else None
+        self.display_page_controls = False
+
+        values = self.decode_cursor(request.query_params[self.cursor_query_param], queryset.model)
+        queryset = queryset.order_by(*self.keyset_fields)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(self.keyset_fields, values))
+
+        page = list(queryset[:self.limit + 1])
+        self.next_cursor = self.encode_cursor(page[self.limit - 1]) if len(page) > self.limit else None
+        return page[:self.limit]
+
+    def encode_cursor(self, obj):
+        """Return the keyset values of an object as URL-safe string."""
+        values = [getattr(obj, field.lstrip("-")) for field in self.keyset_fields]
+        values = [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, cursor, model):
+        """Return the keyset values of a cursor as Python values, or None for an empty cursor."""
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            fields = [
+                model._meta.pk if f.lstrip("-") == "pk" else model._meta.get_field(f.lstrip("-"))
+                for f in self.keyset_fields
+            ]
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [f.to_python(v) for f, v in zip(fields, values)]
+        except (TypeError, ValueError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        """Return the link to the next page."""
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_previous_link(self):
+        """Return the link to the previous page, keyset pages only link forward."""
+        if self.keyset:
+            return None
+        return super().get_previous_link()
+
 
 class MyGeoJsonPagination(CustomLimitOffsetPagination):
     """
@@ -83,7 +193,94 @@ class FastLimitOffsetPagination(pagination.LimitOffsetPagination):
     page_size = 10
 
 
-class BatchUpsertViewSet(viewsets.ModelViewSet):
+class Echo(object):
+    """A file-like object which returns what is written to it, for use with csv.writer."""
+
+    def write(self, value):
+        """Return the value instead of writing it."""
+        return value
+
+
+class StreamingExportMixin(object):
+    """A ViewSet mixin to stream unpaginated lists as GeoJSON, JSON or CSV.
+
+    Include GET parameter ``export`` to stream the whole filtered list in the requested
+    format (``format=csv`` or JSON), e.g. ``/api/1/encounters/?export&format=csv``.
+
+    Records are read through a server-side cursor in chunks of ``export_chunk_size``
+    records (GET parameter ``chunk``). Each chunk is serialized, encoded and sent
+    before the next is read, so memory use does not grow with the number of records.
+    The lookups of the queryset's ``prefetch_related`` are prefetched per chunk.
+    """
+
+    export_query_param = "export"
+    export_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        """List records, stream all records if GET parameter ``export`` is given."""
+        if self.export_query_param in request.query_params:
+            return self.export(request)
+        return super().list(request, *args, **kwargs)
+
+    def get_export_chunk_size(self, request):
+        """Return the GET parameter ``chunk`` as positive int, default: ``export_chunk_size``."""
+        try:
+            return max(int(request.query_params.get("chunk", self.export_chunk_size)), 1)
+        except (TypeError, ValueError):
+            return self.export_chunk_size
+
+    def export(self, request):
+        """Return a StreamingHttpResponse of all filtered records."""
+        queryset = self.filter_queryset(self.get_queryset())
+        chunk_size = self.get_export_chunk_size(request)
+
+        if getattr(request.accepted_renderer, "format", None) == "csv":
+            response = StreamingHttpResponse(self.export_csv(queryset, chunk_size), content_type="text/csv")
+            response["Content-Disposition"] = 'attachment; filename="{0}.csv"'.format(
+                queryset.model._meta.model_name)
+        else:
+            response = StreamingHttpResponse(self.export_json(queryset, chunk_size), content_type="application/json")
+        return response
+
+    def export_records(self, queryset, chunk_size):
+        """Yield lists of serialized records, one list per chunk of the queryset."""
+        lookups = queryset._prefetch_related_lookups
+        for chunk in chunks(queryset.iterator(chunk_size=chunk_size), chunk_size):
+            if lookups:
+                prefetch_related_objects(chunk, *lookups)
+            data = self.get_serializer(chunk, many=True).data
+            yield data["features"] if "features" in data else data
+
+    def export_json(self, queryset, chunk_size):
+        """Yield a GeoJSON FeatureCollection or a JSON list piece by piece."""
+        is_geojson = issubclass(self.get_serializer_class(), GeoFeatureModelSerializer)
+        yield '{"type": "FeatureCollection", "features": [' if is_geojson else "["
+        separator = ""
+        for records in self.export_records(queryset, chunk_size):
+            for record in records:
+                yield separator + json.dumps(record, cls=JSONEncoder)
+                separator = ","
+        yield "]}" if is_geojson else "]"
+
+    def export_csv(self, queryset, chunk_size):
+        """Yield CSV lines, the header is taken from the first chunk of records."""
+        renderer = CustomCSVRenderer()
+        writer = csv.writer(Echo())
+        header = None
+        for records in self.export_records(queryset, chunk_size):
+            rows = renderer.tablize(records, header=header)
+            if header is None:
+                header = next(rows, None)
+                if header is None:
+                    continue
+                yield writer.writerow(header)
+            else:
+                next(rows, None)
+            for row in rows:
+                yield writer.writerow(row)
+
+
+class BatchUpsertViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     """A BatchUpsert ViewSet.
 
     Override split_data for nested serializers, e.g. TaxonAreaEncounters.taxon.
@@ -93,6 +290,34 @@ class BatchUpsertViewSet(viewsets.ModelViewSet):
     renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (CustomCSVRenderer, )
     model = None
     uid_fields = ("source", "source_id", )
+    batch_size = 500
+    stream_window_size = 1000
+    save_upserted = True
+    # Fields calculated by set_cached_fields, written in bulk by update_cached_fields,
+    # and the FKs set_cached_fields reads, fetched with select_related
+    cached_fields = ()
+    cached_fields_related = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        """Let the ``stream`` action commit once per window.
+
+        ATOMIC_REQUESTS wraps each request in one transaction,
+        which would hold back all windows of a stream until the end.
+        """
+        view = super().as_view(actions, **initkwargs)
+        if actions and "stream" in actions.values():
+            view = transaction.non_atomic_requests(view)
+        return view
+
+    def prefetch_fks(self, records):
+        """Fetch related objects for a whole batch of records ahead of resolve_fks.
+
+        Override in viewsets whose ``resolve_fks`` looks up related objects,
+        and let ``resolve_fks`` read from the prefetched lookups
+        to avoid queries per record.
+        """
+        pass
 
     def resolve_fks(self, data):
         """Resolve FKs from PK to object.
@@ -119,26 +344,41 @@ class BatchUpsertViewSet(viewsets.ModelViewSet):
 
         return (unique_fields, data)
 
+    def uid_key(self, record):
+        """Return the values of ``uid_fields`` of a record as ordered tuple of strings.
+
+        The order of ``uid_fields`` is preserved, so ("odk", "1") and ("1", "odk")
+        are different keys. Values are compared as strings, as API clients send
+        e.g. name_id or source as either numbers or strings.
+        """
+        return tuple(str(record.get(uid_field)) for uid_field in self.uid_fields)
+
     def fetch_existing_records(self, new_records, model):
         """Fetch pk, (status if QC mixin), and **uid_fields values from a model.
 
-        The UID fields are hard-coded here, as it seems impossible to
-        programmatically filter (with an ``__in``) clause using ``uid_fields``.
+        Existing records are matched on the combination of all ``uid_fields``,
+        e.g. ``(source = a AND source_id = b) OR (source = c AND source_id = d)``,
+        rather than on independent ``__in`` lists per field, which would
+        over-fetch the cross product of all values.
+        A single uid field is matched with one ``__in`` clause.
 
-        Overwrite this method in your queryset if your uid_fields are not
-        "source" and "source_id".
-
-        A better way is show in Django admin filters:
-        https://github.com/django/django/blob/master/django/contrib/admin/filters.py
+        Records are fetched in chunks of ``batch_size`` keys to bound query size.
         """
-        qs = model.objects.filter(
-            source__in=list(set([x["source"] for x in new_records])),
-            source_id__in=list(set([x["source_id"] for x in new_records]))
-        )
+        fields = ["pk", ] + [x for x in self.uid_fields if x != "pk"]
         if issubclass(model, QualityControlMixin):
-            return qs.values("pk", "source", "source_id", "status")
-        else:
-            return qs.values("pk", "source", "source_id")
+            fields.append("status")
+
+        keys = {tuple(x.get(uid_field) for uid_field in self.uid_fields) for x in new_records}
+        keys = [k for k in keys if None not in k]
+
+        existing_records = []
+        for batch in chunks(keys, self.batch_size):
+            if len(self.uid_fields) == 1:
+                q = Q(**{"{0}__in".format(self.uid_fields[0]): [k[0] for k in batch]})
+            else:
+                q = reduce(operator.or_, [Q(**dict(zip(self.uid_fields, k))) for k in batch])
+            existing_records.extend(model.objects.filter(q).values(*fields))
+        return existing_records
 
     def create_one(self, data):
         """POST: Create or update exactly one model instance.
@@ -149,6 +389,7 @@ class BatchUpsertViewSet(viewsets.ModelViewSet):
 
         Return RestResponse(content, status)
         """
+        self.prefetch_fks([data, ])
         unique_data, update_data = self.split_data(data)
 
         # Early exit 1: None value in unique data
@@ -190,6 +431,250 @@ class BatchUpsertViewSet(viewsets.ModelViewSet):
         logger.info(msg)
         return RestResponse(content, status=st)
 
+    def build_instances(self, records):
+        """Return unsaved model instances from a list of (unique_data, update_data) tuples."""
+        return [self.model(**unique_data, **update_data) for unique_data, update_data in records]
+
+    def bulk_update_records(self, records):
+        """Update existing records in bulk.
+
+        Records are grouped by the set of fields they provide, each group is
+        written with one ``bulk_update`` (one UPDATE per batch and table).
+
+        Arguments:
+
+        records <list> A list of (pk, update_data) tuples.
+        """
+        groups = OrderedDict()
+        for pk, update_data in records:
+            groups.setdefault(tuple(sorted(update_data.keys())), []).append((pk, update_data))
+
+        for fields, group in groups.items():
+            if not fields:
+                continue
+            objs = [self.model(pk=pk, **update_data) for pk, update_data in group]
+            self.model.objects.bulk_update(objs, fields, batch_size=self.batch_size)
+
+    def bulk_create_records(self, records):
+        """Create new records in bulk, including multi-table inherited models.
+
+        Arguments:
+
+        records <list> A list of (unique_data, update_data) tuples.
+
+        Returns:
+        The list of created model instances.
+        """
+        return bulk_create_inherited(
+            self.model, self.build_instances(records), batch_size=self.batch_size)
+
+    def set_cached_fields(self, obj):
+        """Calculate the ``cached_fields`` of a record in memory.
+
+        Called by ``update_cached_fields`` only for viewsets with ``cached_fields``,
+        which override this hook. Does nothing by default.
+        """
+        pass
+
+    def update_cached_fields(self, pks, created=True):
+        """Recalculate the cached fields of the given created or updated records.
+
+        With ``cached_fields``, the records are fetched with one query, their cached
+        fields are calculated by ``set_cached_fields`` and written with ``bulk_update``.
+        Without, each record is re-saved, which costs queries per record but runs
+        the model's save signals, e.g. for Surveys claiming their Encounters.
+
+        Skipped if ``save_upserted`` is False, e.g. for lookups without cached fields.
+        Override to defer the calculation of cached fields.
+        """
+        if not self.save_upserted or not pks:
+            return
+        objs = self.model.objects.filter(pk__in=pks)
+        if not self.cached_fields:
+            for obj in objs:
+                obj.save()
+            return
+        objs = list(objs.select_related(*self.cached_fields_related))
+        for obj in objs:
+            self.set_cached_fields(obj)
+        self.model.objects.bulk_update(objs, self.cached_fields, batch_size=self.batch_size)
+
+    def bulk_upsert(self, new_records):
+        """Create, update or retain a batch of records in bulk.
+
+        Existing records are fetched with one keyed lookup and bucketed through
+        a dict keyed by ``uid_key`` in linear time. Records to update are written
+        with ``bulk_update``, new records with ``bulk_create_inherited``.
+        Locally changed records (QA status other than "new") are retained.
+        The cached fields of updated and created records are recalculated by
+        ``update_cached_fields``, in bulk only for viewsets with ``cached_fields``.
+
+        Returns:
+        A tuple of lists: (records to retain, records to update, records to create),
+        records to update and create deduplicated by their unique fields
+        """
+        logger.info("[API][create] Fetching existing records...")
+        existing_records = self.fetch_existing_records(new_records, self.model)
+        logger.info("[API][create] Done fetching existing records.")
+
+        # Keyed index over ordered uid_fields values: one dict lookup per new record
+        existing_index = {self.uid_key(rec): rec for rec in existing_records}
+        has_qa = issubclass(self.model, QualityControlMixin)
+
+        # Having QA status or not decides what to update or retain
+        logger.info("[API][create] Sorting records into retain/update/create...")
+        # Within a batch, the last record with the same unique fields wins.
+        to_retain, updates_by_pk, creates_by_key = [], OrderedDict(), OrderedDict()
+        for new_record in new_records:
+            if None in [new_record.get(uid_field) for uid_field in self.uid_fields]:
+                logger.warning("[API][create] Skipping invalid data: {0}".format(str(new_record)))
+                continue
+            key = self.uid_key(new_record)
+            existing = existing_index.get(key)
+            if existing is None:
+                # Bucket "bulk_create": new records without match in existing records
+                creates_by_key[key] = new_record
+            elif has_qa and existing["status"] != QualityControlMixin.STATUS_NEW:
+                # Bucket "retain": locally changed records (QA status other than "new")
+                to_retain.append(new_record)
+            else:
+                # Bucket "bulk_update": with QA existing but unchanged, without QA existing
+                updates_by_pk[existing["pk"]] = new_record
+        records_to_update = list(updates_by_pk.items())
+        records_to_create = list(creates_by_key.values())
+
+        logger.info("[API][create] Done sorting records: {0} to retain, {1} to update, {2} to create.".format(
+            len(to_retain), len(records_to_update), len(records_to_create)
+        ))
+        logger.debug("[API][create] Skipping locally changed records: {0}".format(str(to_retain)))
+
+        # Resolve FKs and split off unique fields once per record.
+        self.prefetch_fks([x[1] for x in records_to_update] + records_to_create)
+        updates = OrderedDict()
+        for pk, data in records_to_update:
+            unique_data, update_data = self.split_data(data)
+            updates[pk] = update_data
+
+        creates = [self.split_data(data) for data in records_to_create]
+
+        # Hammertime
+        with transaction.atomic():
+            if updates:
+                logger.info("[API][create] Updating {0} records...".format(len(updates)))
+                # Bulk writes bypass signals: evict map tiles at the previous and new locations,
+                # orphan cached popups and lookups
+                invalidate_model_tiles(self.model, list(updates.keys()))
+                self.bulk_update_records(list(updates.items()))
+                invalidate_model_tiles(self.model, list(updates.keys()))
+                invalidate_renders(self.model, list(updates.keys()))
+                invalidate_lookups(self.model)
+                self.update_cached_fields(list(updates.keys()), created=False)
+
+            if creates:
+                logger.info("[API][create] Creating {0} records...".format(len(creates)))
+                created = self.bulk_create_records(creates)
+                invalidate_model_tiles(self.model, [obj.pk for obj in created])
+                invalidate_lookups(self.model)
+
+                # to update cached fields
+                self.update_cached_fields([obj.pk for obj in created])
+
+        return (to_retain, records_to_update, records_to_create)
+
+    def get_request_stream(self, request):
+        """Return the request body as readable stream without parsing it.
+
+        Chunked uploads carry no Content-Length, for which the request stream
+        would be empty. Those are read from the WSGI input directly.
+        """
+        meta = request._request.META
+        if meta.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked" and "wsgi.input" in meta:
+            return meta["wsgi.input"]
+        return request.stream or io.BytesIO()
+
+    def job_summary(self, job):
+        """Return a dict summarising the progress of a BatchUpsertJob."""
+        return OrderedDict([
+            ("job", job.job_id),
+            ("model", job.model_name),
+            ("windows", job.windows),
+            ("records", job.records),
+            ("retained", job.retained),
+            ("updated", job.updated),
+            ("created", job.created),
+            ("finished", job.finished),
+            ("error", job.last_error),
+        ])
+
+    @action(detail=False, methods=["post"])
+    def stream(self, request):
+        """POST: Create or update records streamed as newline-delimited JSON.
+
+        The request body contains one record per line, each a dict as accepted by ``create``.
+        Records are read lazily and upserted in windows of ``stream_window_size`` records
+        (GET parameter ``window``). Each window is committed together with the progress
+        of a ``BatchUpsertJob``.
+
+        GET parameter ``job`` names the job, otherwise a new job ID is generated.
+        Re-sending the same stream with the ID of an unfinished job skips
+        the records of all committed windows and resumes after the last one.
+
+        Return RestResponse(job summary, status), status 400 for an invalid window size,
+        status 409 for the ID of a job streaming another model
+        """
+        try:
+            window_size = int(request.query_params.get("window", self.stream_window_size))
+            if window_size < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            msg = "[API][stream] Invalid window size {0}, must be a positive integer.".format(
+                request.query_params.get("window"))
+            logger.warning(msg)
+            return RestResponse({"msg": msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        job, created = BatchUpsertJob.objects.get_or_create(
+            job_id=request.query_params.get("job", str(uuid.uuid4())),
+            defaults=dict(model_name=self.model._meta.label))
+
+        if job.model_name != self.model._meta.label:
+            msg = "[API][stream] Job {0} streams {1}, not {2}.".format(
+                job.job_id, job.model_name, self.model._meta.label)
+            logger.warning(msg)
+            return RestResponse({"msg": msg}, status=status.HTTP_409_CONFLICT)
+
+        if job.finished:
+            logger.info("[API][stream] Job {0} already finished.".format(job.job_id))
+            return RestResponse(self.job_summary(job), status=status.HTTP_200_OK)
+
+        if not created:
+            logger.info("[API][stream] Resuming job {0} after {1} committed records.".format(
+                job.job_id, job.records))
+        records = itertools.islice(iter_ndjson(self.get_request_stream(request)), job.records, None)
+
+        try:
+            for window in chunks(records, window_size):
+                with transaction.atomic():
+                    to_retain, records_to_update, records_to_create = self.bulk_upsert(window)
+                    job.windows += 1
+                    job.records += len(window)
+                    job.retained += len(to_retain)
+                    job.updated += len(records_to_update)
+                    job.created += len(records_to_create)
+                    job.last_error = None
+                    job.save()
+                logger.info("[API][stream] {0}".format(job))
+        except Exception as e:
+            job.last_error = "{0}: {1}".format(e.__class__.__name__, e)
+            job.save(update_fields=["last_error", "updated_on"])
+            logger.warning("[API][stream] Job {0} interrupted after {1} records: {2}".format(
+                job.job_id, job.records, job.last_error))
+            return RestResponse(self.job_summary(job), status=status.HTTP_400_BAD_REQUEST)
+
+        job.finished = True
+        job.save(update_fields=["finished", "updated_on"])
+        logger.info("[API][stream] Finished {0}".format(job))
+        return RestResponse(self.job_summary(job), status=status.HTTP_200_OK)
+
     def create(self, request):
         """POST: Create or update one or many model instances.
 
@@ -220,86 +705,7 @@ class BatchUpsertViewSet(viewsets.ModelViewSet):
 
             # A new hope: bulk update/create
             # https://github.com/dbca-wa/wastd/issues/205
-
-            # Existing vs new
-            new_records = request.data
-            logger.info("[API][create] Fetching existing records...")
-            existing_records = self.fetch_existing_records(new_records, self.model)
-            logger.info("[API][create] Done fetching existing records.")
-
-            # Having QA status or not decides what to update or retain
-            logger.info("[API][create] Sorting records into retain/update/create...")
-            if issubclass(self.model, QualityControlMixin):
-                # Bucket "retain": existing_objects with status > STATUS_NEW
-                to_retain = [t for t in existing_records if t["status"] > QualityControlMixin.STATUS_NEW]
-                # TODO Log PKs (debug) or total number (info) of skipped records
-                logger.info("[API][create] Skipping {0} locally changed records".format(len(to_retain)))
-                logger.debug("[API][create] Skipping locally changed records: {0}".format(str(to_retain)))
-
-                # With QA: update if existing but unchanged (QA status "NEW")
-                to_update = [t for t in existing_records if t["status"] == QualityControlMixin.STATUS_NEW]
-            else:
-                # Without QA: update if existing
-                to_update = existing_records
-                to_retain = []
-
-            # Only UID fields of new records (request.data)
-            # new_records_uid_only = [{rec[uid_field] for uid_field in self.uid_fields} for rec in new_records]
-
-            existing_records_uid_only = [{rec[uid_field] for uid_field in self.uid_fields} for rec in existing_records]
-
-            # Bucket "bulk_update": List of new_records where uid_fields match existing_objects
-            records_to_update = [new_record for new_record in new_records
-                                 if {new_record[uid_field] for uid_field in self.uid_fields}
-                                 in existing_records_uid_only]
-
-            # Bucket "bulk_create": List of new records without match in existing records
-            records_to_create = [new_record for new_record in new_records
-                                 if {new_record[uid_field] for uid_field in self.uid_fields}
-                                 not in existing_records_uid_only]
-            logger.info("[API][create] Done sorting records: {0} to retain, {1} to update, {2} to create.".format(
-                len(to_retain), len(records_to_update), len(records_to_create)
-            ))
-
-            # Hammertime
-            with transaction.atomic():
-                if records_to_update:
-                    logger.info("[API][create] Updating records...")
-                    # logger.debug("[API][create] Updating records: {0}".format(str(records_to_update)))
-                    # updated = self.model.objects.bulk_update(
-                    #     [self.model(**x) for x in records_to_update], records_to_update[0].keys())
-                    # updated = [self.create_one(x) for x in records_to_update]
-                    for data in records_to_update:
-                        unique_data, update_data = self.split_data(data)
-                        self.model.objects.filter(**unique_data).update(**update_data)
-
-                        # to update cached fields
-                        # self.model.objects.filter(**unique_data).refresh_from_db()
-                        # self.model.objects.filter(**unique_data).save()
-
-                if records_to_create:
-                    logger.info("[API][create] Creating records...")
-                    # logger.debug("[API][create] Creating records: {0}".format(str(records_to_create)))
-                    # Nice but doesn't work with multi table inherited models (TAE, CAE):
-                    # created = self.model.objects.bulk_create([self.model(**self.resolve_fks(x)) for x in records_to_create])
-
-                    # Slow:
-                    # created = [self.create_one(x) for x in records_to_create]
-
-                    # Mildly less slow but still not batch:
-                    for data in records_to_create:
-                        unique_data, update_data = self.split_data(data)
-                        obj, created = self.model.objects.get_or_create(defaults=update_data, **unique_data)
-                        # obj = self.model.objects.create(**data)
-                        logger.info("[API][create] Creating record with unique fields "
-                                    "{0}, update fields {1}, created: {2}".format(
-                                        str(unique_data), str(update_data), created
-                                    )
-                        )
-
-                        # to update cached fields
-                        obj.refresh_from_db()
-                        obj.save()
+            to_retain, records_to_update, records_to_create = self.bulk_upsert(request.data)
 
             logger.info("[API][create] Finished.")
             msg = "Retained {0}, updated {1}, created {2} records.".format(
@@ -326,32 +732,13 @@ class FastBatchUpsertViewSet(BatchUpsertViewSet):
 class NameIDBatchUpsertViewSet(BatchUpsertViewSet):
     """A BatchUpsert ViewSet for uid fields "name_id"."""
 
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, and **uid_fields values from a model."""
-
-        qs = model.objects.filter(
-            name_id__in=list(set([x["name_id"] for x in new_records]))
-        )
-        if issubclass(model, QualityControlMixin):
-            return qs.values("pk", "name_id", "status")
-        else:
-            return qs.values("pk", "name_id", )
+    uid_fields = ("name_id", )
 
 
 class OgcFidBatchUpsertViewSet(BatchUpsertViewSet):
     """A BatchUpsert ViewSet for uid fields "ogc_fid"."""
 
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, (status if QC mixin), and **uid_fields values from a model."""
-
-        qs = model.objects.filter(
-            ogc_fid__in=list(set([x["ogc_fid"] for x in new_records]))
-        )
-
-        if issubclass(model, QualityControlMixin):
-            return qs.values("pk", "ogc_fid", "status")
-        else:
-            return qs.values("pk", "ogc_fid", )
+    uid_fields = ("ogc_fid", )
 
 
 class AreaEncounterObsBatchUpsertViewSet(BatchUpsertViewSet):
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""Shared cache utilities.
+
+Cached entries are invalidated through version stamps: cache keys contain
+random stamps stored under version keys without timeout. Replacing or deleting
+a stamp orphans all entries keyed with it, which then expire from the cache.
+Missing stamps are replaced by new ones, so an evicted stamp never revives stale entries.
+
+Cache backends
+--------------
+The backends below are the Django and django-redis backends counting their
+hits and misses. Counts are kept per process and added to totals in the cache
+itself every ``settings.CACHE_METRICS_FLUSH_EVERY`` reads, see ``get_cache_metrics``.
+
+Lookups
+-------
+Small, hot lookup tables, such as choices of select fields, are registered with
+``register_lookup`` and read with ``get_lookup``. A lookup table and its version
+stamp are read with one ``get_many``, saving or deleting any object of the models
+it is built from replaces its stamp.
+
+Single objects looked up by a unique field, such as users by username, are read
+with ``cached_object`` from models registered with ``cache_objects_by``.
+Saving or deleting an object evicts it under its previous and current field values.
+
+Bulk writes bypass signals: call ``invalidate_lookups`` after bulk creates and updates.
+Receivers which only invalidate caches are marked with ``cache_receiver``,
+so that bulk writers can tell them apart from receivers with other side effects.
+"""
+import hashlib
+import logging
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import db, filebased, locmem, memcached
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.encoding import force_bytes
+from django_redis.cache import RedisCache as BaseRedisCache
+
+logger = logging.getLogger(__name__)
+
+# Distinguishes cache misses from cached None values
+MISSING = object()
+
+METRICS_KEY_PREFIX = "cache-metrics:"
+
+# Lookups by name, lookups by the models they are built from,
+# unique fields by model for cached_object
+LOOKUPS = dict()
+LOOKUP_MODELS = dict()
+OBJECT_FIELDS = dict()
+
+# Signal receivers which only invalidate caches
+CACHE_RECEIVERS = set()
+
+
+def get_cache(alias):
+    """Return the cache ``alias``, or the default cache if ``alias`` is not configured."""
+    return caches[alias if alias in settings.CACHES else "default"]
+
+
+def new_version_stamp():
+    """Return a new random version stamp."""
+    return uuid.uuid4().hex
+
+
+def get_version_stamps(cache, keys):
+    """Return the version stamps stored at the given keys, creating missing stamps."""
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            stamp = new_version_stamp()
+            if not cache.add(key, stamp, None):
+                stamp = cache.get(key, stamp)
+            stamps[key] = stamp
+    return [stamps[key] for key in keys]
+
+
+def cache_receiver(func):
+    """Mark a signal receiver as only invalidating caches.
+
+    Code writing in bulk, which bypasses signals, must invalidate these caches explicitly.
+    """
+    CACHE_RECEIVERS.add(func)
+    return func
+
+
+def has_side_effects(signal, sender):
+    """Whether a signal has receivers for sender other than cache receivers."""
+    return any(r not in CACHE_RECEIVERS for r in signal._live_receivers(sender))
+
+
+# ----------------------------------------------------------------------------#
+# Metered cache backends
+# ----------------------------------------------------------------------------#
+class MeteredCacheMixin(object):
+    """Count the hits and misses of a cache backend.
+
+    Backends implementing ``get`` with ``get_many`` or vice versa count each read once.
+    """
+
+    def __init__(self, location, params):
+        """Start counting from zero."""
+        super(MeteredCacheMixin, self).__init__(location, params)
+        self.metrics = Counter()
+        self.reading = False
+
+    def get(self, key, default=None, version=None):
+        """Return a cached value or default, counting a hit or a miss."""
+        if self.reading or key.startswith(METRICS_KEY_PREFIX):
+            return super(MeteredCacheMixin, self).get(key, default, version=version)
+        self.reading = True
+        try:
+            value = super(MeteredCacheMixin, self).get(key, MISSING, version=version)
+        finally:
+            self.reading = False
+        self.count_reads(int(value is not MISSING), int(value is MISSING))
+        return default if value is MISSING else value
+
+    def get_many(self, keys, version=None):
+        """Return a dict of the cached values of the given keys, counting hits and misses."""
+        if self.reading:
+            return super(MeteredCacheMixin, self).get_many(keys, version=version)
+        keys = list(keys)
+        self.reading = True
+        try:
+            values = super(MeteredCacheMixin, self).get_many(keys, version=version)
+        finally:
+            self.reading = False
+        self.count_reads(len(values), len(keys) - len(values))
+        return values
+
+    def count_reads(self, hits, misses):
+        """Count hits and misses, flushing the counts every ``settings.CACHE_METRICS_FLUSH_EVERY`` reads."""
+        self.metrics["hits"] += hits
+        self.metrics["misses"] += misses
+        if self.metrics["hits"] + self.metrics["misses"] >= getattr(settings, "CACHE_METRICS_FLUSH_EVERY", 1000):
+            self.flush_metrics()
+
+    def flush_metrics(self):
+        """Add the counts of this process to the totals kept in the cache."""
+        counts, self.metrics = self.metrics, Counter()
+        for name, count in counts.items():
+            key = METRICS_KEY_PREFIX + name
+            if not count or self.add(key, count, None):
+                continue
+            try:
+                self.incr(key, count)
+            except ValueError:
+                # Evicted since add
+                self.set(key, count, None)
+
+
+class LocMemCache(MeteredCacheMixin, locmem.LocMemCache):
+    """A metered local memory cache, private to each process."""
+
+
+class FileBasedCache(MeteredCacheMixin, filebased.FileBasedCache):
+    """A metered file based cache."""
+
+
+class DatabaseCache(MeteredCacheMixin, db.DatabaseCache):
+    """A metered database cache."""
+
+
+class MemcachedCache(MeteredCacheMixin, memcached.MemcachedCache):
+    """A metered memcached cache using python-memcached."""
+
+
+class RedisCache(MeteredCacheMixin, BaseRedisCache):
+    """A metered django-redis cache."""
+
+
+def get_cache_metrics(alias):
+    """Return the hits and misses of a cache.
+
+    Totals flushed by all processes sharing the cache are added to the
+    unflushed counts of this process. Unmetered caches report no reads.
+
+    Arguments
+
+    alias The cache alias
+
+    Return A dict of hits, misses, and the hit ratio, which is None if the cache has no reads.
+    """
+    cache = caches[alias]
+    counts = Counter(getattr(cache, "metrics", dict()))
+    if hasattr(cache, "metrics"):
+        for name in ("hits", "misses"):
+            counts[name] += cache.get(METRICS_KEY_PREFIX + name, 0)
+    reads = counts["hits"] + counts["misses"]
+    return {
+        "hits": counts["hits"],
+        "misses": counts["misses"],
+        "ratio": counts["hits"] / float(reads) if reads else None
+    }
+
+
+def reset_cache_metrics(alias):
+    """Reset the hits and misses of a cache to zero."""
+    cache = caches[alias]
+    if hasattr(cache, "metrics"):
+        cache.metrics = Counter()
+        cache.delete_many([METRICS_KEY_PREFIX + name for name in ("hits", "misses")])
+
+
+# ----------------------------------------------------------------------------#
+# Lookups
+# ----------------------------------------------------------------------------#
+def get_lookup_cache():
+    """Return the lookup cache ``settings.LOOKUP_CACHE``, default: the default cache."""
+    return get_cache(getattr(settings, "LOOKUP_CACHE", "default"))
+
+
+def lookup_timeout():
+    """Return the timeout of lookup tables and cached objects ``settings.LOOKUP_CACHE_TIMEOUT``, default: one day."""
+    return getattr(settings, "LOOKUP_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+class Lookup(object):
+    """A lookup table built from the database and kept in the lookup cache."""
+
+    def __init__(self, name, build, models):
+        """A lookup table ``name``, returned by ``build`` from the given models."""
+        self.name = name
+        self.build = build
+        self.models = models
+        self.key = "lookup:{0}".format(name)
+        self.version_key = "lookup:v:{0}".format(name)
+
+    def get(self):
+        """Return the lookup table, building it if it is missing or outdated."""
+        cache = get_lookup_cache()
+        found = cache.get_many([self.key, self.version_key])
+        stamp = found.get(self.version_key)
+        if stamp is None:
+            stamp = get_version_stamps(cache, [self.version_key])[0]
+        elif self.key in found and found[self.key][0] == stamp:
+            return found[self.key][1]
+
+        table = self.build()
+        cache.set(self.key, (stamp, table), lookup_timeout())
+        logger.debug("[shared.cache.Lookup] Built lookup {0}.".format(self.name))
+        return table
+
+    def invalidate(self):
+        """Orphan the cached lookup table."""
+        get_lookup_cache().delete(self.version_key)
+
+
+def register_lookup(name, build, models):
+    """Register a cached lookup table.
+
+    Arguments
+
+    name A unique name
+    build A callable returning the lookup table, which must be picklable
+    models The models the table is built from, saving or deleting any of them rebuilds the table
+
+    Return The Lookup.
+    """
+    lookup = Lookup(name, build, models)
+    LOOKUPS[name] = lookup
+    for model in models:
+        LOOKUP_MODELS.setdefault(model, []).append(lookup)
+    return lookup
+
+
+def get_lookup(name):
+    """Return the lookup table ``name``."""
+    return LOOKUPS[name].get()
+
+
+def invalidate_lookups(model):
+    """Orphan the cached lookup tables built from a model."""
+    for lookup in LOOKUP_MODELS.get(model, []):
+        lookup.invalidate()
+
+
+# ----------------------------------------------------------------------------#
+# Cached objects
+# ----------------------------------------------------------------------------#
+def cache_objects_by(model, *fields):
+    """Allow ``cached_object`` to look up instances of a model by the given unique fields."""
+    OBJECT_FIELDS.setdefault(model, set()).update(fields)
+
+
+def object_cache_key(model, field, value):
+    """Return the cache key of a model instance by the value of a unique field."""
+    return "object:{0}:{1}:{2}".format(
+        model._meta.label_lower, field, hashlib.md5(force_bytes(value)).hexdigest())
+
+
+def cached_object(model, field, value):
+    """Return the instance of a model with a unique field value from the lookup cache or the database.
+
+    Arguments
+
+    model A model registered with ``cache_objects_by``
+    field The name of a registered unique field
+    value The field value
+
+    Return The instance, or None if none exists. Missing instances are not cached.
+    """
+    cache = get_lookup_cache()
+    key = object_cache_key(model, field, value)
+    obj = cache.get(key)
+    if obj is None:
+        obj = model.objects.filter(**{field: value}).first()
+        if obj is not None:
+            cache.set(key, obj, lookup_timeout())
+    return obj
+
+
+def invalidate_objects(model, values):
+    """Evict cached instances of a model by a dict of field names to lists of values."""
+    get_lookup_cache().delete_many([
+        object_cache_key(model, field, value) for field in values for value in values[field]])
+
+
+@receiver(pre_save)
+@cache_receiver
+def objects_remember_values(sender, instance, raw=False, **kwargs):
+    """Remember the cached field values of an object before it is saved, to evict it by its previous values."""
+    fields = OBJECT_FIELDS.get(sender)
+    if raw or not fields or instance.pk is None:
+        return
+    instance._cached_field_values = sender._base_manager.filter(
+        pk=instance.pk).values(*fields).first() or dict()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@cache_receiver
+def cache_invalidate(sender, instance, raw=False, **kwargs):
+    """Orphan the lookup tables built from and evict the cached instance of a saved or deleted object."""
+    if raw:
+        return
+    invalidate_lookups(sender)
+    fields = OBJECT_FIELDS.get(sender)
+    if fields:
+        previous = getattr(instance, "_cached_field_values", dict())
+        instance._cached_field_values = dict()
+        invalidate_objects(sender, {
+            f: set(v for v in (instance.__dict__.get(f), previous.get(f)) if v is not None) for f in fields})
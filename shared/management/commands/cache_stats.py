@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Report or reset the hits and misses of the configured caches."""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shared.cache import get_cache_metrics, reset_cache_metrics
+
+
+class Command(BaseCommand):
+    """Report or reset cache hits and misses.
+
+    Totals are shared by all processes using a cache on Redis, memcached, files or the database.
+    Local memory caches are private to each process, this command only sees its own.
+    """
+
+    help = "Report or reset the hits and misses of the configured caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cache", action="append", dest="aliases", metavar="ALIAS",
+            help="Report only the given cache, can be repeated. Default: all caches.")
+        parser.add_argument("--reset", action="store_true", help="Reset hits and misses to zero.")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or list(settings.CACHES)
+        invalid = [a for a in aliases if a not in settings.CACHES]
+        if invalid:
+            raise CommandError("Unknown cache: {0}. Choose from {1}.".format(
+                ", ".join(invalid), ", ".join(settings.CACHES)))
+
+        for alias in aliases:
+            if options["reset"]:
+                reset_cache_metrics(alias)
+                self.stdout.write("Reset {0}.".format(alias))
+                continue
+            metrics = get_cache_metrics(alias)
+            self.stdout.write("{0}: {1} hits, {2} misses, hit ratio {3}".format(
+                alias, metrics["hits"], metrics["misses"],
+                "n/a" if metrics["ratio"] is None else "{0:.1%}".format(metrics["ratio"])))
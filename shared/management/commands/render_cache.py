@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Warm or purge the cache of popups and Latex fragments after a template deploy."""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from shared.rendering import purge_renders, renderable_models, warm_renders
+
+
+class Command(BaseCommand):
+    """Warm or purge the render cache.
+
+    Run ``./manage.py render_cache --purge --warm`` after deploying changed templates.
+    Changes to the top-level popup and Latex templates invalidate their cached renders anyway,
+    changes to included templates only after a purge.
+    """
+
+    help = "Warm or purge the cache of popups and Latex fragments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purge", action="store_true", help="Orphan all cached renders.")
+        parser.add_argument("--warm", action="store_true", help="Render and cache all renders.")
+        parser.add_argument(
+            "--model", action="append", dest="models", metavar="APP_LABEL.MODEL",
+            help="Warm only the given model, can be repeated. Default: all renderable models.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=500, help="The number of objects rendered together.")
+
+    def handle(self, *args, **options):
+        if not options["purge"] and not options["warm"]:
+            raise CommandError("Use --purge, --warm, or both.")
+
+        if options["purge"]:
+            purge_renders()
+            self.stdout.write("Purged all cached renders.")
+
+        if options["warm"]:
+            models = None
+            if options["models"]:
+                try:
+                    models = [apps.get_model(label) for label in options["models"]]
+                except (LookupError, ValueError) as e:
+                    raise CommandError(str(e))
+                invalid = [m._meta.label for m in models if not getattr(m, "render_templates", None)]
+                if invalid:
+                    raise CommandError("Not renderable: {0}. Choose from {1}.".format(
+                        ", ".join(invalid), ", ".join(m._meta.label for m in renderable_models())))
+            num = warm_renders(models=models, chunk_size=options["chunk_size"])
+            self.stdout.write("Rendered {0} objects.".format(num))
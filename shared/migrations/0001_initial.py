@@ -0,0 +1,36 @@
+# Generated by Django 2.2.13 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchUpsertJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(help_text='A unique ID for the upload, supplied by the client or generated.', max_length=500, unique=True, verbose_name='Job ID')),
+                ('model_name', models.CharField(help_text='The app label and model name of the uploaded records.', max_length=500, verbose_name='Model')),
+                ('windows', models.PositiveIntegerField(default=0, help_text='The number of committed windows.', verbose_name='Committed windows')),
+                ('records', models.PositiveIntegerField(default=0, help_text='The number of processed and committed records.', verbose_name='Committed records')),
+                ('retained', models.PositiveIntegerField(default=0, help_text='The number of locally changed records retained.', verbose_name='Retained records')),
+                ('updated', models.PositiveIntegerField(default=0, help_text='The number of existing records updated.', verbose_name='Updated records')),
+                ('created', models.PositiveIntegerField(default=0, help_text='The number of new records created.', verbose_name='Created records')),
+                ('finished', models.BooleanField(default=False, help_text='Whether the entire stream has been processed.', verbose_name='Finished')),
+                ('last_error', models.TextField(blank=True, help_text='The error which interrupted the last attempt, if any.', null=True, verbose_name='Last error')),
+                ('started_on', models.DateTimeField(auto_now_add=True, verbose_name='Started on')),
+                ('updated_on', models.DateTimeField(auto_now=True, verbose_name='Updated on')),
+            ],
+            options={
+                'verbose_name': 'Batch upsert job',
+                'verbose_name_plural': 'Batch upsert jobs',
+                'ordering': ['-started_on'],
+            },
+        ),
+    ]
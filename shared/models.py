@@ -5,9 +5,12 @@ from __future__ import absolute_import, unicode_literals
 # import itertools
 import logging
 import uuid
+from functools import partial
 
 from django.db import models
 from django.db.models import options
+from django.db.models.signals import class_prepared
+from django.dispatch import receiver
 # from django.template import loader, TemplateDoesNotExist
 from django.urls import reverse
 from django.utils.safestring import mark_safe  # noqa
@@ -17,6 +20,7 @@ from django.utils.translation import ugettext_lazy as _
 from django_fsm import FSMField, transition
 from django_fsm_log.decorators import fsm_log_by
 
+from shared.cache import get_lookup, register_lookup
 from wastd.users.models import User
 
 # import urllib
@@ -33,6 +37,93 @@ from wastd.users.models import User
 logger = logging.getLogger(__name__)
 
 # Instantiated models --------------------------------------------------------#
+class BatchUpsertJob(models.Model):
+    """The progress of a streamed batch upsert.
+
+    Streamed uploads to a ``BatchUpsertViewSet`` are processed in windows of
+    records. Each window is committed together with the updated progress of
+    its job, so that a failed upload can be resumed after the last committed
+    window by re-sending the same stream with the same ``job_id``.
+    """
+
+    job_id = models.CharField(
+        max_length=500,
+        unique=True,
+        verbose_name=_("Job ID"),
+        help_text=_("A unique ID for the upload, supplied by the client or generated."),
+    )
+
+    model_name = models.CharField(
+        max_length=500,
+        verbose_name=_("Model"),
+        help_text=_("The app label and model name of the uploaded records."),
+    )
+
+    windows = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Committed windows"),
+        help_text=_("The number of committed windows."),
+    )
+
+    records = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Committed records"),
+        help_text=_("The number of processed and committed records."),
+    )
+
+    retained = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Retained records"),
+        help_text=_("The number of locally changed records retained."),
+    )
+
+    updated = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Updated records"),
+        help_text=_("The number of existing records updated."),
+    )
+
+    created = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Created records"),
+        help_text=_("The number of new records created."),
+    )
+
+    finished = models.BooleanField(
+        default=False,
+        verbose_name=_("Finished"),
+        help_text=_("Whether the entire stream has been processed."),
+    )
+
+    last_error = models.TextField(
+        blank=True, null=True,
+        verbose_name=_("Last error"),
+        help_text=_("The error which interrupted the last attempt, if any."),
+    )
+
+    started_on = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Started on"),
+    )
+
+    updated_on = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_("Updated on"),
+    )
+
+    class Meta:
+        """Class opts."""
+
+        ordering = ["-started_on", ]
+        verbose_name = "Batch upsert job"
+        verbose_name_plural = "Batch upsert jobs"
+
+    def __str__(self):
+        """The unicode representation."""
+        return "Job {0} ({1}): {2} records in {3} windows{4}".format(
+            self.job_id, self.model_name, self.records, self.windows,
+            ", finished" if self.finished else "")
+
 
 
 # Abstract models ------------------------------------------------------------#
@@ -69,6 +160,11 @@ class CodeLabelDescriptionMixin(models.Model):
         """The full name."""
         return self.label
 
+    @classmethod
+    def from_code(cls, code):
+        """Return the instance with the given code from the cached lookup table, or None."""
+        return get_lookup(code_lookup_name(cls)).get(code)
+
     # -------------------------------------------------------------------------
     # URLs
     @property
@@ -78,6 +174,22 @@ class CodeLabelDescriptionMixin(models.Model):
             self._meta.app_label, self._meta.model_name), args=[self.pk])
 
 
+def code_lookup_name(model):
+    return "codes:{0}".format(model._meta.label_lower)
+
+
+def build_code_lookup(model):
+    """Return a dict of codes to instances of a lookup table."""
+    return {obj.code: obj for obj in model.objects.all()}
+
+
+@receiver(class_prepared)
+def register_code_lookup(sender, **kwargs):
+    """Cache the lookup tables of all models with a CodeLabelDescriptionMixin."""
+    if issubclass(sender, CodeLabelDescriptionMixin) and not sender._meta.abstract:
+        register_lookup(code_lookup_name(sender), partial(build_code_lookup, sender), [sender])
+
+
 # For RenderMixin: add Meta fields
 options.DEFAULT_NAMES = options.DEFAULT_NAMES + ('card_template', 'latex_template')
 
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""On-demand rendering of HTML popups and Latex fragments.
+
+Models declare their renders in ``render_templates``, a dict of render names,
+such as ``as_html``, to template names. Template names can contain ``{model_name}``
+to pick a template per polymorphic subclass, e.g. ``"popup/{model_name}.html"``.
+The object is passed to the template as ``render_context_name``, default "original".
+Related objects listed in ``render_prefetch`` are prefetched for all objects rendered together.
+Models list the foreign keys shown in their renders, such as the observer's name, in ``render_depends``.
+
+Renders are cached in ``settings.RENDER_CACHE`` under content-addressed keys,
+built from the object, the digest of the template source, and version stamps
+of the object, of its ``render_depends`` related objects, and of the whole render cache:
+
+* saving or deleting an object replaces its stamp,
+* saving or deleting a related object listed in ``render_depends`` replaces the related object's stamp,
+* deploying a changed template changes its digest,
+* ``purge_renders`` replaces the global stamp, e.g. after changing an included template.
+
+Outdated renders are never served and expire from the cache.
+"""
+import hashlib
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+from shared.cache import cache_receiver, get_cache, get_version_stamps
+from shared.utils import chunks
+
+logger = logging.getLogger(__name__)
+
+RENDER_VERSION_KEY = "render:v"
+
+# Compiled templates and digests of their source by template name
+TEMPLATES = dict()
+
+# Render labels of the models listed in render_depends, see render_dependencies
+DEPENDENCIES = None
+
+
+def get_render_cache():
+    """Return the render cache ``settings.RENDER_CACHE``, default: the default cache."""
+    return get_cache(getattr(settings, "RENDER_CACHE", "renders"))
+
+
+def get_template(template_name):
+    """Return a compiled template and the digest of its source.
+
+    Both are kept for the lifetime of the process, unless ``settings.DEBUG`` is set.
+    """
+    if template_name in TEMPLATES:
+        return TEMPLATES[template_name]
+    template = loader.get_template(template_name)
+    source = getattr(getattr(template, "template", None), "source", template_name)
+    result = (template, hashlib.md5(source.encode("utf-8")).hexdigest())
+    if not settings.DEBUG:
+        TEMPLATES[template_name] = result
+    return result
+
+
+def render_label(model):
+    """Return the label of the topmost concrete parent of a model, shared by all its subclasses."""
+    return (model._meta.get_parent_list() or [model])[-1]._meta.label_lower
+
+
+def object_version_key(model, pk):
+    """Return the key of the version stamp of an object's renders, shared by its subclasses."""
+    return "render:v:{0}:{1}".format(render_label(model), pk)
+
+
+def render_depends_keys(obj):
+    """Return the version stamp keys of the related objects listed in an object's ``render_depends``.
+
+    Only the foreign key values are read, related objects are not fetched.
+    """
+    keys = []
+    for field_name in getattr(obj, "render_depends", ()):
+        field = obj._meta.get_field(field_name)
+        value = getattr(obj, field.attname)
+        if value is not None:
+            keys.append(object_version_key(field.related_model, value))
+    return keys
+
+
+def render_dependencies():
+    """Return the render labels of all models listed in the ``render_depends`` of renderable models."""
+    global DEPENDENCIES
+    if DEPENDENCIES is None:
+        DEPENDENCIES = set(
+            render_label(model._meta.get_field(field_name).related_model)
+            for model in apps.get_models() if getattr(model, "render_templates", None)
+            for field_name in getattr(model, "render_depends", ()))
+    return DEPENDENCIES
+
+
+def has_renders(model):
+    """Whether the version stamps of a model's objects key cached renders, of its own or of dependent objects."""
+    return bool(getattr(model, "render_templates", None)) or render_label(model) in render_dependencies()
+
+
+def render_template_name(obj, name):
+    """Return the template name of the render ``name`` of an object."""
+    return obj.render_templates[name].format(model_name=obj._meta.model_name)
+
+
+def render_many(objects, name, prefetch=None):
+    """Return the render ``name`` of many objects, rendering only the ones missing from the cache.
+
+    The cache is read and written with one ``get_many`` and one ``set_many``.
+    Related objects are prefetched only for objects which need rendering.
+    Renders are also kept on the objects, where ``rendered`` finds them.
+
+    Arguments
+
+    objects A list of model instances declaring ``render_templates``
+    name The render name, e.g. "as_html"
+    prefetch A list of related lookups to prefetch, default: the ``render_prefetch`` of the first object
+
+    Return A list of rendered safe strings in the order of the objects.
+    """
+    objects = list(objects)
+    if not objects:
+        return []
+    cache = get_render_cache()
+    object_keys = [[object_version_key(obj.__class__, obj.pk)] + render_depends_keys(obj) for obj in objects]
+    version_keys = sorted(set([RENDER_VERSION_KEY] + [k for ks in object_keys for k in ks]))
+    stamps = dict(zip(version_keys, get_version_stamps(cache, version_keys)))
+
+    keys, templates = [], []
+    for obj, version_keys in zip(objects, object_keys):
+        template, digest = get_template(render_template_name(obj, name))
+        keys.append("render:{0}:{1}:{2}:{3}".format(
+            render_label(obj.__class__), obj.pk, name, hashlib.md5(repr((
+                digest, stamps[RENDER_VERSION_KEY], [stamps[k] for k in version_keys])).encode("utf-8")).hexdigest()))
+        templates.append(template)
+
+    renders = cache.get_many(keys)
+    missing = [i for i, key in enumerate(keys) if key not in renders]
+    if missing:
+        if prefetch is None:
+            prefetch = getattr(objects[0], "render_prefetch", ())
+        if prefetch:
+            prefetch_related_objects([objects[i] for i in missing], *prefetch)
+        new_renders = dict()
+        for i in missing:
+            context_name = getattr(objects[i], "render_context_name", "original")
+            new_renders[keys[i]] = templates[i].render({context_name: objects[i]})
+        cache.set_many(new_renders, getattr(settings, "RENDER_CACHE_TIMEOUT", 60 * 60 * 24 * 7))
+        renders.update(new_renders)
+        logger.debug("[shared.rendering.render_many] Rendered {0} of {1} {2}.".format(
+            len(missing), len(objects), name))
+
+    results = []
+    for obj, key in zip(objects, keys):
+        result = mark_safe(renders[key])
+        obj.__dict__.setdefault("_renders", dict())[name] = result
+        results.append(result)
+    return results
+
+
+def rendered(obj, name):
+    """Return the render ``name`` of an object, from the object, the cache, or freshly rendered.
+
+    Use this in model properties, e.g. ``as_html``.
+    """
+    renders = obj.__dict__.get("_renders", dict())
+    if name in renders:
+        return renders[name]
+    return render_many([obj], name)[0]
+
+
+def prefetch_renders(queryset, names):
+    """Evaluate a queryset and render the given render names of its objects in batches.
+
+    Names which are not renders of the queryset's model are ignored.
+    The returned queryset is evaluated, iterating over it again does not run new queries.
+    """
+    names = [n for n in names if n in (getattr(queryset.model, "render_templates", None) or dict())]
+    if not names:
+        return queryset
+    objects = list(queryset)
+    for name in names:
+        render_many(objects, name)
+    return queryset
+
+
+def invalidate_renders(model, pks):
+    """Orphan the cached renders of the given objects of a model and its subclasses, or of objects depending on them."""
+    if not pks or not has_renders(model):
+        return
+    get_render_cache().delete_many([object_version_key(model, pk) for pk in pks])
+
+
+def purge_renders():
+    """Orphan all cached renders."""
+    get_render_cache().delete(RENDER_VERSION_KEY)
+    logger.info("[shared.rendering.purge_renders] Purged all cached renders.")
+
+
+def renderable_models():
+    """Return the topmost models declaring ``render_templates``."""
+    return [
+        model for model in apps.get_models()
+        if getattr(model, "render_templates", None) and not any(
+            getattr(parent, "render_templates", None) for parent in model._meta.get_parent_list())
+    ]
+
+
+def warm_renders(models=None, chunk_size=500):
+    """Render and cache all renders of all objects of the given models.
+
+    Arguments
+
+    models A list of models, default: all renderable models
+    chunk_size The number of objects rendered together, default: 500
+
+    Return The number of rendered objects.
+    """
+    num = 0
+    for model in models or renderable_models():
+        pks = model.objects.order_by("pk").values_list("pk", flat=True)
+        for chunk in chunks(pks.iterator(), chunk_size):
+            objects = list(model.objects.filter(pk__in=chunk))
+            for name in model.render_templates:
+                render_many(objects, name)
+            num += len(objects)
+        logger.info("[shared.rendering.warm_renders] Rendered {0}.".format(model._meta.verbose_name_plural))
+    return num
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@cache_receiver
+def renders_invalidate(sender, instance, raw=False, **kwargs):
+    """Orphan the cached renders of a saved or deleted object, or of the objects depending on it."""
+    if raw or not has_renders(sender):
+        return
+    instance.__dict__.pop("_renders", None)
+    invalidate_renders(sender, [instance.pk])
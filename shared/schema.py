@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Shared GraphQL utilities.
+
+Dataloaders batch the lookups of related objects which GraphQL resolvers would
+otherwise run once per parent object. Loaders are cached per request, so every
+object is read at most once per query.
+"""
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+class ModelLoader(DataLoader):
+    """Load model instances by primary key in one query per batch."""
+
+    def __init__(self, queryset, *args, **kwargs):
+        """Load from the given queryset."""
+        self.queryset = queryset
+        super(ModelLoader, self).__init__(*args, **kwargs)
+
+    def batch_load_fn(self, keys):
+        """Return the instances of the given pks, or None for missing pks."""
+        objects = self.queryset.in_bulk(keys)
+        return Promise.resolve([objects.get(key) for key in keys])
+
+
+class RelatedLoader(DataLoader):
+    """Load the related objects of many parents through a ForeignKey in one query per batch."""
+
+    def __init__(self, queryset, field_name, *args, **kwargs):
+        """Load from the given queryset, grouped by the ForeignKey ``field_name``."""
+        self.queryset = queryset
+        self.field_name = field_name
+        self.attname = queryset.model._meta.get_field(field_name).attname
+        super(RelatedLoader, self).__init__(*args, **kwargs)
+
+    def batch_load_fn(self, keys):
+        """Return a list of related objects for each parent pk."""
+        groups = defaultdict(list)
+        for obj in self.queryset.filter(**{"{0}__in".format(self.attname): keys}):
+            groups[getattr(obj, self.attname)].append(obj)
+        return Promise.resolve([groups[key] for key in keys])
+
+
+class ManyToManyLoader(DataLoader):
+    """Load the objects of a ManyToManyField for many parents in two queries per batch."""
+
+    def __init__(self, model, field_name, queryset=None, *args, **kwargs):
+        """Load ``model.field_name`` from the given queryset, default: all related objects."""
+        field = model._meta.get_field(field_name)
+        self.through = field.remote_field.through
+        self.source = "{0}_id".format(field.m2m_field_name())
+        self.target = "{0}_id".format(field.m2m_reverse_field_name())
+        self.queryset = field.related_model.objects.all() if queryset is None else queryset
+        super(ManyToManyLoader, self).__init__(*args, **kwargs)
+
+    def batch_load_fn(self, keys):
+        """Return a list of related objects for each parent pk."""
+        links = list(self.through.objects.filter(
+            **{"{0}__in".format(self.source): keys}).values_list(self.source, self.target))
+        objects = self.queryset.in_bulk(set(target for source, target in links))
+        groups = defaultdict(list)
+        for source, target in links:
+            if target in objects:
+                groups[source].append(objects[target])
+        return Promise.resolve([groups[key] for key in keys])
+
+
+def get_loader(info, name, factory):
+    """Return the dataloader ``name`` of the current request, created by ``factory`` on first use.
+
+    Arguments
+
+    info The GraphQL ResolveInfo, its context is the Django request
+    name A unique name for the loader
+    factory A callable returning a new DataLoader
+
+    Return The DataLoader.
+    """
+    loaders = getattr(info.context, "dataloaders", None)
+    if loaders is None:
+        loaders = dict()
+        info.context.dataloaders = loaders
+    if name not in loaders:
+        loaders[name] = factory()
+    return loaders[name]
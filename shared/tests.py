@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 """Shared test cases."""
 
-from django.test import TestCase
-from shared.utils import force_as_list, sanitize_tag_label, BigIntConverter
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from shared.cache import (
+    LOOKUP_MODELS, LOOKUPS, cached_object, get_cache_metrics, get_lookup, invalidate_lookups, register_lookup,
+    reset_cache_metrics)
+from shared.utils import connected_components, force_as_list, sanitize_tag_label, BigIntConverter
+from wastd.users.models import User
 
 
 class UtilsTests(TestCase):
@@ -28,3 +33,75 @@ class UtilsTests(TestCase):
         self.assertTrue(isinstance(con.to_url('-101'), str))
         self.assertRaises(ValueError, con.to_python, 'abc')
         self.assertRaises(ValueError, con.to_python, '-abc')
+
+    def test_connected_components(self):
+        self.assertEqual(connected_components([]), {})
+        self.assertEqual(
+            connected_components([(3, "A"), (5, "B"), (4, "A"), (5, "A"), (6, "C"), (1, "B")]),
+            {1: 1, 3: 1, 4: 1, 5: 1, 6: 6})
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "shared.cache.LocMemCache", "LOCATION": "default"},
+        "lookups": {"BACKEND": "shared.cache.LocMemCache", "LOCATION": "lookups"},
+    },
+    CACHE_METRICS_FLUSH_EVERY=2)
+class CacheTests(TestCase):
+    """Tests for shared.cache."""
+
+    def setUp(self):
+        caches["lookups"].clear()
+        reset_cache_metrics("default")
+
+    def test_cache_metrics(self):
+        cache = caches["default"]
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        cache.get_many(["a", "b", "c"])
+        self.assertEqual(get_cache_metrics("default"), {"hits": 2, "misses": 3, "ratio": 0.4})
+        reset_cache_metrics("default")
+        self.assertEqual(get_cache_metrics("default")["ratio"], None)
+
+    def test_lookup_rebuilt_on_save(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return sorted(User.objects.values_list("username", flat=True))
+
+        lookup = register_lookup("test:usernames", build, [User])
+        self.addCleanup(LOOKUPS.pop, "test:usernames")
+        self.addCleanup(LOOKUP_MODELS[User].remove, lookup)
+
+        self.assertEqual(get_lookup("test:usernames"), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_lookup("test:usernames"), [])
+        User.objects.create(username="alice")
+        self.assertEqual(get_lookup("test:usernames"), ["alice"])
+        self.assertEqual(len(builds), 2)
+
+        # Bulk writes bypass signals and invalidate lookups explicitly
+        User.objects.bulk_create([User(username="bob")])
+        self.assertEqual(get_lookup("test:usernames"), ["alice"])
+        invalidate_lookups(User)
+        self.assertEqual(get_lookup("test:usernames"), ["alice", "bob"])
+        self.assertEqual(len(builds), 3)
+
+    def test_cached_object(self):
+        user = User.objects.create(username="alice")
+        self.assertEqual(cached_object(User, "username", "alice"), user)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_object(User, "username", "alice"), user)
+
+        user.username = "bob"
+        user.save()
+        self.assertIsNone(cached_object(User, "username", "alice"))
+        self.assertEqual(cached_object(User, "username", "bob").username, "bob")
+
+    def test_cached_object_evicted_on_delete(self):
+        user = User.objects.create(username="alice")
+        self.assertEqual(cached_object(User, "username", "alice"), user)
+        user.delete()
+        self.assertIsNone(cached_object(User, "username", "alice"))
@@ -0,0 +1,653 @@
+# -*- coding: utf-8 -*-
+"""Mapbox Vector Tiles generated in PostGIS.
+
+A tile is built in one query: the features intersecting the tile are selected through
+the spatial index, transformed to Web Mercator, simplified to the tile's resolution,
+clipped and quantized with ``ST_AsMVTGeom``, and encoded with ``ST_AsMVT``.
+
+Tiles carry only a few lightweight attributes, including the feature's ``id``.
+Popups are loaded on demand from a ``TilePopupView`` when a feature is clicked.
+
+Point layers with many features can be served as GeoJSON tiles of clusters,
+aggregated on a grid in PostGIS, see ``ClusterLayer``.
+
+Tiles and GeoJSON layers are cached in ``settings.TILE_CACHE``. Saving or deleting
+a feature evicts only the cached tiles covering the feature's extent.
+"""
+import hashlib
+import json
+import logging
+import math
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Count, F, FloatField, Func, Q, Sum, Value
+from django.db.models.functions import Coalesce, Floor
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.views.generic.base import View
+from djgeojson.views import GeoJSONLayerView, TiledGeoJSONLayerView
+
+from shared.cache import cache_receiver, get_cache, get_version_stamps, new_version_stamp
+from shared.rendering import prefetch_renders
+
+logger = logging.getLogger(__name__)
+
+WEB_MERCATOR_SRID = 3857
+WEB_MERCATOR_HALF_WORLD = 20037508.342789244
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_MAX_ZOOM = 22
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+def tile_bounds(z, x, y):
+    """Return the Web Mercator bounds of a tile as (xmin, ymin, xmax, ymax).
+
+    Raise Http404 for tiles outside of the tile grid.
+    """
+    if not (0 <= z <= MVT_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise Http404("Tile {0}/{1}/{2} does not exist.".format(z, x, y))
+    size = 2 * WEB_MERCATOR_HALF_WORLD / 2 ** z
+    return (
+        -WEB_MERCATOR_HALF_WORLD + x * size,
+        WEB_MERCATOR_HALF_WORLD - (y + 1) * size,
+        -WEB_MERCATOR_HALF_WORLD + (x + 1) * size,
+        WEB_MERCATOR_HALF_WORLD - y * size,
+    )
+
+
+def tile_envelope(bounds, buffer=0):
+    """Return a Web Mercator Polygon of the bounds, grown by a buffer in tile units."""
+    margin = (bounds[2] - bounds[0]) * buffer / MVT_EXTENT
+    envelope = Polygon.from_bbox((
+        bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin))
+    envelope.srid = WEB_MERCATOR_SRID
+    return envelope
+
+
+class AsMVTGeom(Func):
+    """Transform a Web Mercator geometry into the coordinate space of a tile."""
+
+    function = "ST_AsMVTGeom"
+    output_field = GeometryField(srid=WEB_MERCATOR_SRID)
+
+
+class Simplify(Func):
+    """Simplify a geometry with the Douglas-Peucker algorithm."""
+
+    function = "ST_Simplify"
+    output_field = GeometryField(srid=WEB_MERCATOR_SRID)
+
+
+def vector_tile(queryset, geometry_fields, properties, layer_name, z, x, y, simplify=False):
+    """Return a Mapbox Vector Tile of the features of a queryset.
+
+    Arguments
+
+    queryset The queryset of features
+    geometry_fields A list of geometry field names, the first non-null geometry of each feature is used
+    properties A list of field names to include as feature attributes
+    layer_name The name of the tile layer
+    z, x, y The tile coordinates
+    simplify Whether to simplify geometries to the tile's resolution, default: False (points)
+
+    Return The tile as bytes, empty if no features intersect the tile.
+    """
+    bounds = tile_bounds(z, x, y)
+    envelope = tile_envelope(bounds, buffer=MVT_BUFFER)
+
+    # Select features through the spatial index of each geometry field
+    selected = Q()
+    for i, field in enumerate(geometry_fields):
+        selected |= Q(**{"{0}__isnull".format(f): True for f in geometry_fields[:i]},
+                      **{"{0}__intersects".format(field): envelope})
+
+    if len(geometry_fields) > 1:
+        geom = Coalesce(*geometry_fields, output_field=GeometryField())
+    else:
+        geom = F(geometry_fields[0])
+    geom = Transform(geom, WEB_MERCATOR_SRID)
+    if simplify:
+        geom = Simplify(geom, Value((bounds[2] - bounds[0]) / MVT_EXTENT))
+
+    features = queryset.filter(selected).annotate(
+        mvtgeom=AsMVTGeom(
+            geom,
+            Value(tile_envelope(bounds), output_field=GeometryField(srid=WEB_MERCATOR_SRID)),
+            Value(MVT_EXTENT),
+            Value(MVT_BUFFER),
+            Value(True),
+        )
+    ).values(*properties, "mvtgeom")
+
+    sql, params = features.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT ST_AsMVT(tile, %s, %s, 'mvtgeom') FROM (" + sql + ") AS tile WHERE tile.mvtgeom IS NOT NULL",
+            [layer_name, MVT_EXTENT] + list(params)
+        )
+        tile = cursor.fetchone()[0]
+    return bytes(tile) if tile else b""
+
+
+class X(Func):
+    """The X coordinate of a point."""
+
+    function = "ST_X"
+    output_field = FloatField()
+
+
+class Y(Func):
+    """The Y coordinate of a point."""
+
+    function = "ST_Y"
+    output_field = FloatField()
+
+
+def mercator_to_lonlat(x, y):
+    """Return the WGS84 longitude and latitude of a Web Mercator coordinate."""
+    return (
+        x / WEB_MERCATOR_HALF_WORLD * 180.0,
+        math.degrees(2.0 * math.atan(math.exp(y / WEB_MERCATOR_HALF_WORLD * math.pi)) - math.pi / 2.0),
+    )
+
+
+def point_feature(x, y, properties):
+    """Return a GeoJSON Point Feature at a Web Mercator coordinate."""
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": mercator_to_lonlat(x, y)},
+        "properties": properties,
+    }
+
+
+def cluster_tile(queryset, geometry_field, properties, group_fields, z, x, y, grid=8, max_zoom=12):
+    """Return the point features of a queryset in a tile as GeoJSON, clustered up to a zoom level.
+
+    Up to ``max_zoom``, the tile is divided into a grid of ``grid`` by ``grid`` cells, and the points
+    are counted per cell and per value of the ``group_fields`` in one query.
+    Each cluster is placed at the mean location of its points, and has the properties
+    ``cluster`` (True), ``count``, and a dict of counts by value for each of the ``group_fields``.
+
+    Beyond ``max_zoom``, each point is returned as a feature with its ``properties``.
+
+    Each point belongs to exactly one tile, so that clusters of neighbouring tiles do not overlap.
+
+    Arguments
+
+    queryset The queryset of features
+    geometry_field The name of the point geometry field
+    properties A list of field names to include as properties of individual features
+    group_fields A list of field names to count cluster members by
+    z, x, y The tile coordinates
+    grid The number of grid cells per tile side, default: 8
+    max_zoom The highest zoom level with clusters, default: 12
+
+    Return The tile as GeoJSON FeatureCollection in bytes.
+    """
+    bounds = tile_bounds(z, x, y)
+    geom = Transform(geometry_field, WEB_MERCATOR_SRID)
+    points = queryset.filter(
+        **{"{0}__intersects".format(geometry_field): tile_envelope(bounds)}
+    ).annotate(
+        px=X(geom), py=Y(geom)
+    ).filter(
+        px__gte=bounds[0], px__lt=bounds[2], py__gte=bounds[1], py__lt=bounds[3]
+    ).order_by()
+
+    features = list()
+    if z > max_zoom:
+        for row in points.values(*properties, "px", "py"):
+            px, py = row.pop("px"), row.pop("py")
+            features.append(point_feature(px, py, row))
+    else:
+        cell = (bounds[2] - bounds[0]) / grid
+        rows = points.annotate(
+            cx=Floor((F("px") - Value(bounds[0], output_field=FloatField())) / Value(cell, output_field=FloatField())),
+            cy=Floor((F("py") - Value(bounds[1], output_field=FloatField())) / Value(cell, output_field=FloatField())),
+        ).values("cx", "cy", *group_fields).annotate(
+            n=Count("pk"), sx=Sum("px"), sy=Sum("py")
+        )
+
+        clusters = OrderedDict()
+        for row in rows:
+            cluster = clusters.setdefault((row["cx"], row["cy"]), dict(
+                count=0, sx=0.0, sy=0.0, groups=OrderedDict((f, dict()) for f in group_fields)))
+            cluster["count"] += row["n"]
+            cluster["sx"] += row["sx"]
+            cluster["sy"] += row["sy"]
+            for f in group_fields:
+                cluster["groups"][f][row[f]] = cluster["groups"][f].get(row[f], 0) + row["n"]
+
+        for cluster in clusters.values():
+            props = OrderedDict([("cluster", True), ("count", cluster["count"])])
+            props.update(cluster["groups"])
+            features.append(point_feature(
+                cluster["sx"] / cluster["count"], cluster["sy"] / cluster["count"], props))
+
+    return json.dumps(
+        {"type": "FeatureCollection", "features": features}, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+# -----------------------------------------------------------------------------
+# Layers
+#
+# Apps register their map layers at startup, see e.g. wastd.observations.tiles.
+# The registry lets the tile cache find the layers affected by a saved feature.
+TILE_LAYERS = OrderedDict()
+
+
+class TileLayer(object):
+    """A map layer of a model's features.
+
+    Arguments
+
+    name A unique layer name, used in cache keys and as vector tile layer name
+    model The model of the features, saves of the model and its subclasses invalidate the layer
+    geometry_fields A list of geometry field names, the first non-null geometry of each feature is used
+    properties A list of field names to include as vector tile feature attributes, keep these lightweight
+    filter_fields A list of field names which can be filtered by exact match through GET parameters
+    simplify Whether to simplify geometries per zoom level, use for polygons
+    tiled Whether the layer is served in tiles, otherwise the layer is cached as a whole
+    vector Whether the tiles are rendered by this layer, otherwise tiles are rendered by a view
+    queryset The queryset of features, default: all objects of the model
+    """
+
+    content_type = MVT_CONTENT_TYPE
+
+    def __init__(self, name, model, geometry_fields=("geom", ), properties=("id", ),
+                 filter_fields=(), simplify=False, tiled=True, vector=True, queryset=None):
+        """Create a TileLayer."""
+        self.name = name
+        self.model = model
+        self.geometry_fields = list(geometry_fields)
+        self.properties = list(properties)
+        self.filter_fields = list(filter_fields)
+        self.simplify = simplify
+        self.tiled = tiled
+        self.vector = tiled and vector
+        self.queryset = queryset
+
+    def get_params(self, query_params):
+        """Return the filter parameters of a request as sorted list of (field, value) tuples.
+
+        Values are cleaned by the model field, so that only valid choices and existing related
+        objects reach the query and the cache keys. Raise ValidationError for invalid values.
+        """
+        return sorted(
+            (f, self.model._meta.get_field(f).clean(query_params[f], None))
+            for f in self.filter_fields if f in query_params)
+
+    def get_queryset(self, params=()):
+        """Return the features, filtered by the given (field, value) tuples."""
+        queryset = self.model.objects.all() if self.queryset is None else self.queryset.all()
+        return queryset.filter(**dict(params))
+
+    def render(self, z, x, y, params=()):
+        """Return a vector tile of the layer."""
+        return vector_tile(
+            self.get_queryset(params), self.geometry_fields, self.properties,
+            self.name, z, x, y, simplify=self.simplify)
+
+
+class ClusterLayer(TileLayer):
+    """A map layer of point features served as GeoJSON tiles, clustered up to a zoom level.
+
+    Arguments as TileLayer, and
+
+    group_fields A list of field names to count cluster members by, e.g. species
+    grid The number of grid cells per tile side, default: 8
+    max_zoom The highest zoom level with clusters, default: settings.MAP_CLUSTER_MAX_ZOOM or 12
+    """
+
+    content_type = "application/json"
+
+    def __init__(self, name, model, group_fields=(), grid=8, max_zoom=None, **kwargs):
+        """Create a ClusterLayer."""
+        super(ClusterLayer, self).__init__(name, model, **kwargs)
+        self.group_fields = list(group_fields)
+        self.grid = grid
+        self.max_zoom = max_zoom
+
+    def render(self, z, x, y, params=()):
+        """Return a GeoJSON tile of clusters or features of the layer."""
+        max_zoom = getattr(settings, "MAP_CLUSTER_MAX_ZOOM", 12) if self.max_zoom is None else self.max_zoom
+        return cluster_tile(
+            self.get_queryset(params), self.geometry_fields[0], self.properties, self.group_fields,
+            z, x, y, grid=self.grid, max_zoom=max_zoom)
+
+
+def register_layer(layer):
+    """Register a TileLayer, return the layer."""
+    TILE_LAYERS[layer.name] = layer
+    return layer
+
+
+def layers_for_model(model):
+    """Return the registered layers showing features of a model."""
+    return [
+        layer for layer in TILE_LAYERS.values()
+        if issubclass(model, layer.model) or issubclass(layer.model, model)
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Tile cache
+#
+# Cache keys contain version stamps of the layer, of the layer at a zoom level,
+# and of the tile. Replacing a stamp orphans all cached entries keyed with it.
+# A saved or deleted feature replaces the stamps of the tiles covering its extent
+# before and after the change, or of the whole zoom level if it covers too many tiles.
+# See shared.cache for how version stamps work.
+def get_tile_cache():
+    """Return the tile cache ``settings.TILE_CACHE``, default: the default cache."""
+    return get_cache(getattr(settings, "TILE_CACHE", "tiles"))
+
+
+def tile_cache_max_zoom():
+    """Return the highest zoom level of cached tiles."""
+    return getattr(settings, "TILE_CACHE_MAX_ZOOM", 14)
+
+
+def layer_version_key(layer_name):
+    """Return the key of the version stamp of a whole layer, replaced to evict all of its tiles."""
+    return "tiles:v:{0}".format(layer_name)
+
+
+def zoom_version_key(layer_name, z):
+    """Return the key of the version stamp of a layer at one zoom level."""
+    return "tiles:v:{0}:{1}".format(layer_name, z)
+
+
+def tile_version_key(layer_name, z, x, y):
+    """Return the key of the version stamp of one tile of a layer."""
+    return "tiles:v:{0}:{1}:{2}:{3}".format(layer_name, z, x, y)
+
+
+def cache_key(layer_name, version_keys, params):
+    """Return the cache key of a tile or layer from its version stamps and filter parameters."""
+    cache = get_tile_cache()
+    stamps = get_version_stamps(cache, version_keys)
+    digest = hashlib.md5(repr((stamps, list(params))).encode("utf-8")).hexdigest()
+    return "tiles:{0}:{1}".format(layer_name, digest)
+
+
+def tile_cache_key(layer_name, z, x, y, params=()):
+    """Return the cache key of a tile."""
+    return cache_key(layer_name, [
+        layer_version_key(layer_name),
+        zoom_version_key(layer_name, z),
+        tile_version_key(layer_name, z, x, y),
+    ], params)
+
+
+def layer_cache_key(layer_name, params=()):
+    """Return the cache key of a whole layer."""
+    return cache_key(layer_name, [layer_version_key(layer_name)], params)
+
+
+def cached(key, render, timeout=None):
+    """Return the cached value of a key, rendering and caching it on a miss.
+
+    Arguments
+
+    key The cache key, or None to bypass the cache
+    render A callable returning the value
+    timeout The cache timeout in seconds, default: settings.TILE_CACHE_TIMEOUT or one hour
+
+    Return The cached or rendered value.
+    """
+    if key is None:
+        return render()
+    cache = get_tile_cache()
+    value = cache.get(key)
+    if value is None:
+        value = render()
+        cache.set(key, value, getattr(settings, "TILE_CACHE_TIMEOUT", 60 * 60) if timeout is None else timeout)
+    return value
+
+
+def cached_tile(layer_name, z, x, y, params, render):
+    """Return a tile from the cache, render and cache it on a miss. Tiles beyond the max zoom are not cached."""
+    key = tile_cache_key(layer_name, z, x, y, params) if z <= tile_cache_max_zoom() else None
+    return cached(key, render)
+
+
+def tile_range(extent, z, buffer=MVT_BUFFER):
+    """Return the tiles (x0, y0, x1, y1) covering a WGS84 extent at a zoom level.
+
+    The extent is grown by the tile buffer, as features are drawn into the buffer of neighbouring tiles.
+    """
+    n = 2 ** z
+    margin = float(buffer) / MVT_EXTENT
+
+    def tile_x(lon):
+        return (lon + 180.0) / 360.0 * n
+
+    def tile_y(lat):
+        lat = math.radians(max(min(lat, 85.0511), -85.0511))
+        return (1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * n
+
+    def clamp(i):
+        return max(0, min(n - 1, int(math.floor(i))))
+
+    return (
+        clamp(tile_x(extent[0]) - margin), clamp(tile_y(extent[3]) - margin),
+        clamp(tile_x(extent[2]) + margin), clamp(tile_y(extent[1]) + margin),
+    )
+
+
+def invalidate_extents(layer, extents):
+    """Evict the cached tiles of a layer covering any of the given WGS84 extents (xmin, ymin, xmax, ymax).
+
+    Zoom levels where more than ``settings.TILE_INVALIDATION_MAX_TILES`` tiles are affected are evicted
+    as a whole. All stamps are written in one ``set_many``.
+    """
+    if not extents:
+        return
+    max_tiles = getattr(settings, "TILE_INVALIDATION_MAX_TILES", 16)
+    stamps = dict()
+    for z in range(tile_cache_max_zoom() + 1):
+        tiles = set()
+        for extent in extents:
+            x0, y0, x1, y1 = tile_range(extent, z)
+            tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+            if len(tiles) > max_tiles:
+                break
+        if len(tiles) > max_tiles:
+            stamps[zoom_version_key(layer.name, z)] = new_version_stamp()
+        else:
+            for x, y in tiles:
+                stamps[tile_version_key(layer.name, z, x, y)] = new_version_stamp()
+    get_tile_cache().set_many(stamps, None)
+
+
+def invalidate_layer(layer):
+    """Evict all cached tiles of a layer."""
+    get_tile_cache().set(layer_version_key(layer.name), new_version_stamp(), None)
+
+
+def geometry_extents(geometries):
+    """Return the extents of the given geometries, skipping empty ones."""
+    return [g.extent for g in geometries if g is not None and not g.empty]
+
+
+def invalidate_features(layers, extents):
+    """Evict the cached tiles of the given layers covering any of the given extents."""
+    for layer in layers:
+        if not layer.tiled:
+            invalidate_layer(layer)
+            continue
+        invalidate_extents(layer, extents)
+
+
+def invalidate_model_tiles(model, pks):
+    """Evict the cached tiles showing the current location of the given objects.
+
+    Use this after bulk creates and updates which bypass signals,
+    and before bulk updates which may move objects.
+    """
+    layers = layers_for_model(model)
+    if not layers or not pks:
+        return
+    fields = sorted(set(f for layer in layers for f in layer.geometry_fields))
+    extents = list()
+    for row in model.objects.filter(pk__in=pks).values_list(*fields).iterator():
+        extents += geometry_extents(row)
+    invalidate_features(layers, extents)
+
+
+def instance_extents(instance, layers):
+    """Return the extents of an instance's geometries shown in the given layers."""
+    fields = set(f for layer in layers for f in layer.geometry_fields)
+    return geometry_extents(getattr(instance, f, None) for f in fields)
+
+
+@receiver(pre_save)
+@cache_receiver
+def tiles_remember_extent(sender, instance, raw=False, **kwargs):
+    """Remember the extent of a feature before it is saved, to evict the tiles it moves away from."""
+    layers = layers_for_model(sender) if TILE_LAYERS else None
+    if raw or not layers or instance.pk is None:
+        return
+    fields = sorted(set(f for layer in layers for f in layer.geometry_fields))
+    previous = sender._base_manager.filter(pk=instance.pk).values_list(*fields).first()
+    instance._tile_extents = geometry_extents(previous or [])
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@cache_receiver
+def tiles_invalidate(sender, instance, raw=False, **kwargs):
+    """Evict the cached tiles covering a saved or deleted feature."""
+    layers = layers_for_model(sender) if TILE_LAYERS else None
+    if raw or not layers:
+        return
+    extents = instance_extents(instance, layers) + getattr(instance, "_tile_extents", [])
+    instance._tile_extents = []
+    invalidate_features(layers, extents)
+
+
+def seed_tiles(layer_names=None, max_zoom=None):
+    """Render and cache all tiles of the given layers up to a zoom level.
+
+    Arguments
+
+    layer_names A list of layer names, default: all layers rendering their own tiles
+    max_zoom The highest zoom level to seed, default: settings.TILE_SEED_MAX_ZOOM or 5
+
+    Return The number of seeded tiles.
+    """
+    if max_zoom is None:
+        max_zoom = getattr(settings, "TILE_SEED_MAX_ZOOM", 5)
+    max_zoom = min(max_zoom, tile_cache_max_zoom())
+    layers = [layer for layer in TILE_LAYERS.values()
+              if layer.vector and (layer_names is None or layer.name in layer_names)]
+    num = 0
+    for layer in layers:
+        for z in range(max_zoom + 1):
+            for x in range(2 ** z):
+                for y in range(2 ** z):
+                    cached_tile(layer.name, z, x, y, [], partial(layer.render, z, x, y))
+                    num += 1
+        logger.info("[shared.tiles.seed_tiles] Seeded layer {0} up to zoom {1}.".format(layer.name, max_zoom))
+    return num
+
+
+# -----------------------------------------------------------------------------
+# Views
+#
+class VectorTileView(View):
+    """Serve a registered TileLayer as cached tiles at ``<z>/<x>/<y>``.
+
+    TileLayers are served as Mapbox Vector Tiles, ClusterLayers as GeoJSON.
+    """
+
+    layer_name = None
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        """Return the tile in the layer's format."""
+        layer = TILE_LAYERS[self.layer_name]
+        try:
+            params = layer.get_params(request.GET)
+        except ValidationError as e:
+            return HttpResponseBadRequest("; ".join(e.messages))
+        tile = cached_tile(layer.name, z, x, y, params, partial(layer.render, z, x, y, params))
+        return HttpResponse(tile, content_type=layer.content_type)
+
+
+class CachedGeoJSONLayerView(GeoJSONLayerView):
+    """A GeoJSONLayerView cached as a whole until a feature of the registered layer ``layer_name`` changes."""
+
+    layer_name = None
+
+    def get_queryset(self):
+        """Return the features with rendered properties, such as popups, fetched in batches.
+
+        The queryset is built and evaluated once per request, although ListView and
+        the GeoJSON response both ask for it.
+        """
+        if getattr(self, "features", None) is None:
+            self.features = prefetch_renders(super(CachedGeoJSONLayerView, self).get_queryset(), self.properties)
+        return self.features
+
+    def get(self, request, *args, **kwargs):
+        """Return the cached layer, render and cache it on a miss."""
+        params = sorted(request.GET.items())
+
+        def render():
+            response = super(CachedGeoJSONLayerView, self).get(request, *args, **kwargs)
+            return (response.content, response["Content-Type"])
+
+        content, content_type = cached(layer_cache_key(self.layer_name, params), render)
+        return HttpResponse(content, content_type=content_type)
+
+
+class CachedTiledGeoJSONLayerView(TiledGeoJSONLayerView):
+    """A TiledGeoJSONLayerView with tiles cached until a feature of the registered layer ``layer_name`` changes."""
+
+    layer_name = None
+
+    def get_queryset(self):
+        """Return the features with rendered properties, such as popups, fetched in batches.
+
+        The queryset is built and evaluated once per request, although ListView and
+        the GeoJSON response both ask for it.
+        """
+        if getattr(self, "features", None) is None:
+            self.features = prefetch_renders(super(CachedTiledGeoJSONLayerView, self).get_queryset(), self.properties)
+        return self.features
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        """Return the cached tile, render and cache it on a miss."""
+        params = sorted(request.GET.items())
+
+        def render():
+            response = super(CachedTiledGeoJSONLayerView, self).get(request, *args, z=z, x=x, y=y, **kwargs)
+            return (response.content, response["Content-Type"])
+
+        content, content_type = cached_tile(self.layer_name, z, x, y, params, render)
+        return HttpResponse(content, content_type=content_type)
+
+
+class TilePopupView(View):
+    """Serve the cached HTML popup ``as_html`` of one feature of a vector tile layer, see shared.rendering."""
+
+    model = None
+    popup_field = "as_html"
+
+    def get(self, request, pk, *args, **kwargs):
+        """Return the popup HTML or 404."""
+        obj = self.model.objects.filter(pk=pk).first()
+        if obj is None:
+            raise Http404("No {0} with ID {1}.".format(self.model._meta.verbose_name, pk))
+        return HttpResponse(getattr(obj, self.popup_field) or "")
@@ -1,8 +1,11 @@
 """Shared utilities."""
+import json
 import slugify
 from collections import namedtuple
 from collections.abc import Iterable
 
+from django.db import router
+
 
 Breadcrumb = namedtuple('Breadcrumb', ['name', 'url'])
 
@@ -50,3 +53,150 @@ class BigIntConverter:
 
     def to_url(self, value):
         return '{}'.format(value)
+
+
+def chunks(iterable, size):
+    """Yield successive lists of at most ``size`` items from an iterable."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bulk_create_inherited(model, objs, batch_size=500):
+    """Bulk create model instances, including multi-table inherited models.
+
+    Django's ``bulk_create`` refuses models with concrete parents,
+    such as ``AnimalEncounter(Encounter)`` or ``TaxonAreaEncounter(AreaEncounter)``.
+    This helper inserts the root table rows with ``bulk_create``, which returns
+    the new primary keys on PostgreSQL, then inserts each child table's own columns
+    with one INSERT per batch and inheritance level.
+
+    Polymorphic models get their ``polymorphic_ctype`` set before insertion,
+    as ``save()`` is bypassed. Signals are not sent.
+
+    Arguments:
+
+    model <django.db.models.Model> The model class of ``objs``.
+    objs <list> Unsaved instances of ``model``.
+    batch_size <int> The maximum number of rows per INSERT statement. Default: 500.
+
+    Returns:
+    The list of instances with primary keys set.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    for obj in objs:
+        if hasattr(obj, "pre_save_polymorphic"):
+            obj.pre_save_polymorphic()
+
+    # Concrete ancestors, root first
+    chain = list(reversed(model._meta.get_parent_list())) + [model]
+    if len(chain) == 1:
+        return model._base_manager.bulk_create(objs, batch_size=batch_size)
+
+    root = chain[0]
+    db = router.db_for_write(model)
+    for obj in objs:
+        if obj.pk is not None:
+            setattr(obj, root._meta.pk.attname, obj.pk)
+    root._base_manager.db_manager(db).bulk_create(objs, batch_size=batch_size)
+    # bulk_create assigns the returned PK to the child's parent link, copy it upwards
+    for obj in objs:
+        setattr(obj, root._meta.pk.attname, obj.pk)
+
+    for level in chain[1:]:
+        fields = level._meta.local_concrete_fields
+        for obj in objs:
+            for parent_link in level._meta.parents.values():
+                if parent_link:
+                    setattr(obj, parent_link.attname, obj.pk)
+        for batch in chunks(objs, batch_size):
+            level._base_manager._insert(batch, fields=fields, using=db)
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = db
+    return objs
+
+
+def in_bulk_by_str(model, values, field_name="pk"):
+    """Return a dict of model instances matching ``values``, keyed by the string of ``field_name``.
+
+    Incoming API data often carries FK values as strings or numbers interchangeably.
+    Keying by string lets callers resolve either with one query for a whole batch.
+    None values are ignored.
+    """
+    values = {x for x in values if x is not None}
+    if not values:
+        return dict()
+    qs = model.objects.filter(**{"{0}__in".format(field_name): values})
+    attname = model._meta.pk.attname if field_name == "pk" else field_name
+    return {str(getattr(obj, attname)): obj for obj in qs}
+
+
+def iter_ndjson(stream):
+    """Yield one parsed record per non-empty line of a newline-delimited JSON stream.
+
+    The stream is read line by line, so only one line is held in memory at a time.
+
+    Arguments:
+
+    stream <file-like> A binary or text stream with a ``readline`` method,
+      e.g. a request body.
+    """
+    for line in iter(stream.readline, b""):
+        if not line:
+            # Text streams signal the end with an empty string
+            break
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def connected_components(pairs):
+    """Return the connected components of nodes linked by shared keys.
+
+    Nodes sharing at least one key belong to the same component, transitively.
+    Components are found with a union-find (disjoint set) in one pass over the pairs.
+
+    Arguments:
+
+    pairs <iterable> (node, key) tuples, e.g. (encounter ID, tag name).
+      Nodes must be sortable.
+
+    Returns:
+    A dict of node and component ID, the smallest node of its component.
+    """
+    parent = dict()
+    first_node_of_key = dict()
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+
+    for node, key in pairs:
+        parent.setdefault(node, node)
+        if key in first_node_of_key:
+            union(first_node_of_key[key], node)
+        else:
+            first_node_of_key[key] = node
+
+    return {node: find(node) for node in parent}
@@ -1,9 +1,9 @@
 from django_filters.rest_framework import BooleanFilter
 from rest_framework_filters import FilterSet, RelatedFilter
-from rest_framework.pagination import LimitOffsetPagination
 
 from shared.api import (
     BatchUpsertViewSet,
+    CustomLimitOffsetPagination,
     NameIDBatchUpsertViewSet,
     OgcFidBatchUpsertViewSet,
 )
@@ -356,6 +356,7 @@ class HbvNameViewSet(NameIDBatchUpsertViewSet):
     filterset_class = HbvNameFilter
     model = HbvName
     uid_fields = ("name_id",)
+    save_upserted = False
 
 
 class HbvSupraViewSet(BatchUpsertViewSet):
@@ -366,18 +367,7 @@ class HbvSupraViewSet(BatchUpsertViewSet):
     filterset_class = HbvSupraFilter
     model = HbvSupra
     uid_fields = ("supra_code", )
-
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, (status if QC mixin), and **uid_fields values from a model."""
-
-        qs = model.objects.filter(
-            supra_code__in=list(set([x["supra_code"] for x in new_records]))
-        )
-
-        # if issubclass(model, QualityControlMixin):
-        #     return qs.values("pk", "supra_code", "status")
-        # else:
-        return qs.values("pk", "supra_code", )
+    save_upserted = False
 
 
 class HbvGroupViewSet(NameIDBatchUpsertViewSet):
@@ -388,6 +378,7 @@ class HbvGroupViewSet(NameIDBatchUpsertViewSet):
     filterset_class = HbvGroupFilter
     model = HbvGroup
     uid_fields = ("name_id",)
+    save_upserted = False
 
 
 class HbvFamilyViewSet(NameIDBatchUpsertViewSet):
@@ -398,6 +389,7 @@ class HbvFamilyViewSet(NameIDBatchUpsertViewSet):
     filterset_class = HbvFamilyFilter
     model = HbvFamily
     uid_fields = ("name_id",)
+    save_upserted = False
 
 
 class HbvGenusViewSet(NameIDBatchUpsertViewSet):
@@ -408,6 +400,7 @@ class HbvGenusViewSet(NameIDBatchUpsertViewSet):
     filterset_class = HbvGenusFilter
     model = HbvGenus
     uid_fields = ("name_id",)
+    save_upserted = False
 
 
 class HbvSpeciesViewSet(NameIDBatchUpsertViewSet):
@@ -418,6 +411,7 @@ class HbvSpeciesViewSet(NameIDBatchUpsertViewSet):
     filterset_class = HbvSpeciesFilter
     model = HbvSpecies
     uid_fields = ("name_id",)
+    save_upserted = False
 
 
 class HbvVernacularViewSet(OgcFidBatchUpsertViewSet):
@@ -428,6 +422,7 @@ class HbvVernacularViewSet(OgcFidBatchUpsertViewSet):
     filterset_class = HbvVernacularFilter
     model = HbvVernacular
     uid_fields = ("ogc_fid", )
+    save_upserted = False
 
 
 class HbvXrefViewSet(BatchUpsertViewSet):
@@ -438,12 +433,7 @@ class HbvXrefViewSet(BatchUpsertViewSet):
     filterset_class = HbvXrefFilter
     model = HbvXref
     uid_fields = ("xref_id",)
-
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, (status if QC mixin), and **uid_fields values from a model."""
-        return model.objects.filter(
-            xref_id__in=list(set([x["xref_id"] for x in new_records]))
-        ).values("pk", "xref_id")
+    save_upserted = False
 
 
 class HbvParentViewSet(OgcFidBatchUpsertViewSet):
@@ -454,6 +444,7 @@ class HbvParentViewSet(OgcFidBatchUpsertViewSet):
     filterset_class = HbvParentFilter
     model = HbvParent
     uid_fields = ("ogc_fid", )
+    save_upserted = False
 
 
 class TaxonFilter(FilterSet):
@@ -545,6 +536,7 @@ class VernacularViewSet(OgcFidBatchUpsertViewSet):
     filterset_class = VernacularFilter
     model = Vernacular
     uid_fields = ("ogc_fid", )
+    save_upserted = False
 
 
 class CrossreferenceFilter(FilterSet):
@@ -609,15 +601,11 @@ class CrossreferenceViewSet(BatchUpsertViewSet):
     queryset = Crossreference.objects.all()
     serializer_class = serializers.CrossreferenceSerializer
     filterset_class = CrossreferenceFilter
-    pagination_class = LimitOffsetPagination
+    # Not GeoJSON: paginate in a "results" envelope
+    pagination_class = CustomLimitOffsetPagination
     model = Crossreference
     uid_fields = ("xref_id", )
-
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, (status if QC mixin), and **uid_fields values from a model."""
-        return model.objects.filter(
-            xref_id__in=list(set([x["xref_id"] for x in new_records]))
-        ).values("pk", "xref_id")
+    save_upserted = False
 
 
 class CommunityFilter(FilterSet):
@@ -651,9 +639,4 @@ class CommunityViewSet(BatchUpsertViewSet):
     filterset_class = CommunityFilter
     model = Community
     uid_fields = ("code",)
-
-    def fetch_existing_records(self, new_records, model):
-        """Fetch pk, (status if QC mixin), and **uid_fields values from a model."""
-        return model.objects.filter(
-            code__in=list(set([x["code"] for x in new_records]))
-        ).values("pk", "code")
+    save_upserted = False
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 """Taxonomy filters."""
+from functools import partial
+
 # from django.contrib.auth.models import User
 from django.contrib.gis.db import models as geo_models
 from django.contrib.gis.db.models import Extent, Union, Collect  # noqa
-from django.db.models import Q
 import django_filters
 from django_filters.widgets import BooleanWidget  # noqa
 from django_filters.filters import (  # noqa
@@ -18,7 +19,7 @@ from conservation import models as cons_models
 from occurrence import models as occ_models
 from taxonomy.models import Community, Taxon
 from shared.filters import FILTER_OVERRIDES
-from wastd.observations.models import Area
+from wastd.observations.models import admin_area_choices
 
 
 class TaxonFilter(django_filters.FilterSet):
@@ -33,16 +34,9 @@ class TaxonFilter(django_filters.FilterSet):
         label="Taxonomic name is current",
         widget=BooleanWidget()
     )
-    admin_areas = ModelMultipleChoiceFilter(
+    admin_areas = MultipleChoiceFilter(
         label="DBCA Regions and Districts",
-        queryset=Area.objects.filter(
-            area_type__in=[
-                Area.AREATYPE_DBCA_REGION,
-                Area.AREATYPE_DBCA_DISTRICT]
-        ).order_by(
-            "area_type",
-            "name"
-        ),
+        choices=admin_area_choices,
         method='taxa_occurring_in_area'
     )
     eoo = geo_models.PolygonField()
@@ -56,15 +50,9 @@ class TaxonFilter(django_filters.FilterSet):
         choices=cons_models.ConservationCategory.LEVEL_CHOICES,
         method='taxon_conservation_level'
     )
-    categories = ModelMultipleChoiceFilter(
+    categories = MultipleChoiceFilter(
         label="Conservation Listing Categories",
-        queryset=cons_models.ConservationCategory.objects.filter(
-            conservation_list__scope_species=True
-        ).order_by(
-            "conservation_list__code", "rank"
-        ).prefetch_related(
-            "conservation_list"
-        ),
+        choices=partial(cons_models.category_choices, "scope_species"),
         method="taxa_with_conservation_criteria"
     )
 
@@ -95,28 +83,16 @@ class TaxonFilter(django_filters.FilterSet):
         return queryset.filter(children__isnull=value)
 
     def taxa_occurring_in_area(self, queryset, name, value):
-        """Return Taxa occurring in the given list of ``Area`` instances.
+        """Return Taxa occurring in the given list of ``Area`` PKs.
 
-        * The filter returns a list of Area objects as ``value``
-        * We need to extract their PKs to create a queryset equivalent to
-          the list of objects ``value``. Only querysets allow agggregation, not lists.
-        * A search_area Multipolygon is collected from the geoms of Areas in ``value``
-        * The Taxon PKs are calculated from occurrences (TaxonAreaEncounters)
-          ``intersect``ing the search_area
-        * The queryset is filtered by the list of Taxon PKs with occurrences
+        * The filter returns a list of Area PKs as ``value``
+        * The precomputed occurrence index (TaxonAreaOccurrence) lists the Taxa
+          with occurrences (TaxonAreaEncounters) in each DBCA Region and District
+        * The queryset is filtered by a subquery of Taxon PKs indexed in these Areas
         """
         if value:
-            area_pks = [area.pk for area in value]
-            search_area = Area.objects.filter(
-                pk__in=area_pks
-            ).aggregate(Collect('geom'))["geom__collect"]
-            taxon_pks_in_area = set(
-                [x["taxon__pk"]
-                 for x in occ_models.TaxonAreaEncounter.objects.filter(
-                    Q(point__intersects=search_area) | Q(geom__intersects=search_area)
-                ).values("taxon__pk")]
-            )
-            return queryset.filter(pk__in=taxon_pks_in_area)
+            return queryset.filter(pk__in=occ_models.TaxonAreaOccurrence.objects.filter(
+                area__in=value).values("taxon_id"))
         else:
             return queryset
 
@@ -125,18 +101,13 @@ class TaxonFilter(django_filters.FilterSet):
 
         * The filter returns a ``value``
         * (magic) value becomes search area
-        * The Taxon PKs are calculated from occurrences (TaxonAreaEncounters)
+        * The Taxon PKs are selected from occurrences (TaxonAreaEncounters)
           ``intersect``ing the search_area
-        * The queryset is filtered by the list of Taxon PKs with occurrences
+        * The queryset is filtered by a subquery of Taxon PKs with occurrences
         """
         if value:
-            taxon_pks_in_area = set(
-                [x["taxon__pk"]
-                 for x in occ_models.TaxonAreaEncounter.objects.filter(
-                    Q(point__intersects=value) | Q(geom__intersects=value)
-                ).values("taxon__pk")]
-            )
-            return queryset.filter(pk__in=taxon_pks_in_area)
+            return queryset.filter(pk__in=occ_models.TaxonAreaEncounter.objects.filter(
+                occ_models.intersecting(value)).values("taxon_id"))
         else:
             return queryset
 
@@ -146,35 +117,30 @@ class TaxonFilter(django_filters.FilterSet):
         * The filter returns a list of ConservationCategory levels as ``value``
         * The Taxon PKs are calculated from active, WA CommunityConservationListings
           with categories matching the level
-        * The queryset is filtered by the list of Taxon PKs with
+        * The queryset is filtered by a subquery of Taxon PKs with
           active taxon listings in WA  matching the conservation level
         """
         if value:
-            taxon_pks = set([x["taxon__pk"] for x in
-                             cons_models.TaxonConservationListing.objects.filter(
+            return queryset.filter(pk__in=cons_models.TaxonConservationListing.objects.filter(
                 scope=cons_models.ConservationListing.SCOPE_WESTERN_AUSTRALIA,
                 status=cons_models.ConservationListing.STATUS_EFFECTIVE,
                 category__level__in=value
-            ).values("taxon__pk")])
-            return queryset.filter(pk__in=taxon_pks)
+            ).values("taxon_id"))
         else:
             return queryset
 
     def taxa_with_conservation_criteria(self, queryset, name, value):
         """Return Taxa matching a conservation level.
 
-        * The filter returns a list of ConservationCategories as ``value``
+        * The filter returns a list of ConservationCategory PKs as ``value``
         * The Taxon PKs are calculated from TaxonConservationListings
           with categories matching the list of categories in ``value``
-        * The queryset is filtered by the list of Taxon PKs
+        * The queryset is filtered by a subquery of Taxon PKs
           matching the conservation level
         """
         if value:
-            taxon_pks = set(
-                [x["taxon__pk"] for x in
-                 cons_models.TaxonConservationListing.objects.filter(
-                    category__in=value).values("taxon__pk")])
-            return queryset.filter(pk__in=taxon_pks)
+            return queryset.filter(pk__in=cons_models.TaxonConservationListing.objects.filter(
+                category__in=value).values("taxon_id"))
         else:
             return queryset
 
@@ -182,16 +148,9 @@ class TaxonFilter(django_filters.FilterSet):
 class CommunityFilter(django_filters.FilterSet):
     """Filter for Community."""
 
-    admin_areas = ModelMultipleChoiceFilter(
+    admin_areas = MultipleChoiceFilter(
         label="DBCA Regions and Districts",
-        queryset=Area.objects.filter(
-            area_type__in=[
-                Area.AREATYPE_DBCA_REGION,
-                Area.AREATYPE_DBCA_DISTRICT]
-        ).order_by(
-            "area_type",
-            "name"
-        ),
+        choices=admin_area_choices,
         method='communities_occurring_in_area'
     )
     eoo = geo_models.PolygonField()
@@ -205,15 +164,9 @@ class CommunityFilter(django_filters.FilterSet):
         choices=cons_models.ConservationCategory.LEVEL_CHOICES,
         method='community_conservation_level'
     )
-    categories = ModelMultipleChoiceFilter(
+    categories = MultipleChoiceFilter(
         label="Conservation Listing Categories",
-        queryset=cons_models.ConservationCategory.objects.filter(
-            conservation_list__scope_communities=True
-        ).order_by(
-            "conservation_list__code", "rank"
-        ).prefetch_related(
-            "conservation_list"
-        ),
+        choices=partial(cons_models.category_choices, "scope_communities"),
         method="communities_with_conservation_criteria"
     )
 
@@ -236,26 +189,15 @@ class CommunityFilter(django_filters.FilterSet):
     def communities_occurring_in_area(self, queryset, name, value):
         """Return Communities occurring in the given Area.
 
-        * The filter returns a list of Area objects as ``value``
-        * We need to extract their PKs to create a queryset equivalent to
-          the list of objects ``value``. Only querysets allow agggregation, not lists.
-        * A search_area Multipolygon is collected from the geoms of Areas in ``value``
-        * The Taxon PKs are calculated from occurrences (CommunityAreaEncounters)
-          ``intersect``ing the search_area
-        * The queryset is filtered by the list of Community PKs with occurrences
-          in the matching areas
+        * The filter returns a list of Area PKs as ``value``
+        * The precomputed occurrence index (CommunityAreaOccurrence) lists the
+          Communities with occurrences (CommunityAreaEncounters) in each DBCA Region
+          and District
+        * The queryset is filtered by a subquery of Community PKs indexed in these Areas
         """
         if value:
-            area_pks = [area.pk for area in value]
-            search_area = Area.objects.filter(
-                pk__in=area_pks
-            ).aggregate(Collect('geom'))["geom__collect"]
-            pks = set([x["community__pk"] for x in
-                       occ_models.CommunityAreaEncounter.objects.filter(
-                Q(point__intersects=search_area) | Q(geom__intersects=search_area)
-            ).values("community__pk")]
-            )
-            return queryset.filter(pk__in=pks)
+            return queryset.filter(pk__in=occ_models.CommunityAreaOccurrence.objects.filter(
+                area__in=value).values("community_id"))
         else:
             return queryset
 
@@ -266,16 +208,11 @@ class CommunityFilter(django_filters.FilterSet):
         * (magic) value becomes search area
         * The Community PKs are calculated from occurrences (CommunityAreaEncounters)
           ``intersect``ing the search_area
-        * The queryset is filtered by the list of Community PKs with occurrences
+        * The queryset is filtered by a subquery of Community PKs with occurrences
         """
         if value:
-            pks = set(
-                [x["community__pk"]
-                 for x in occ_models.CommunityAreaEncounter.objects.filter(
-                    Q(point__intersects=value) | Q(geom__intersects=value)
-                ).values("community__pk")]
-            )
-            return queryset.filter(pk__in=pks)
+            return queryset.filter(pk__in=occ_models.CommunityAreaEncounter.objects.filter(
+                occ_models.intersecting(value)).values("community_id"))
         else:
             return queryset
 
@@ -285,32 +222,28 @@ class CommunityFilter(django_filters.FilterSet):
         * The filter returns a list of ConservationCategory levels as ``value``
         * The Community PKs are calculated from active, WA CommunityConservationListings
           with categories matching the level
-        * The queryset is filtered by the list of Community PKs with
+        * The queryset is filtered by a subquery of Community PKs with
           active community listings in WA  matching the conservation level
         """
         if value:
-            pks = set([x["community__pk"] for x in
-                       cons_models.CommunityConservationListing.objects.filter(
+            return queryset.filter(pk__in=cons_models.CommunityConservationListing.objects.filter(
                 scope=cons_models.ConservationListing.SCOPE_WESTERN_AUSTRALIA,
                 status=cons_models.ConservationListing.STATUS_EFFECTIVE,
-                category__level__in=value).values("community__pk")])
-            return queryset.filter(pk__in=pks)
+                category__level__in=value).values("community_id"))
         else:
             return queryset
 
     def communities_with_conservation_criteria(self, queryset, name, value):
         """Return Communities matching a conservation level.
 
-        * The filter returns a list of ConservationCategories as ``value``
+        * The filter returns a list of ConservationCategory PKs as ``value``
         * The Taxon PKs are calculated from CommunityConservationListings
           with categories matching the list of categories in ``value``
-        * The queryset is filtered by the list of Taxon PKs
+        * The queryset is filtered by a subquery of Community PKs
           matching the conservation level
         """
         if value:
-            pks = set([x["community__pk"] for x in
-                       cons_models.CommunityConservationListing.objects.filter(
-                category__in=value).values("community__pk")])
-            return queryset.filter(pk__in=pks)
+            return queryset.filter(pk__in=cons_models.CommunityConservationListing.objects.filter(
+                category__in=value).values("community_id"))
         else:
             return queryset
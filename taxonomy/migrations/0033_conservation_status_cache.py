@@ -0,0 +1,83 @@
+# Generated by Django 2.2.13 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxonomy', '0032_auto_20200702_1455'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='conservation_categories_state',
+            field=models.TextField(blank=True, editable=False, help_text='All conservation categories of the current state listing.', null=True, verbose_name='State conservation categories'),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='conservation_category_national',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='The primary conservation category of the current national listing.', max_length=500, null=True, verbose_name='National conservation category'),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='conservation_category_state',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='The primary conservation category of the current state listing.', max_length=500, null=True, verbose_name='State conservation category'),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='conservation_code_state',
+            field=models.CharField(blank=True, editable=False, help_text='The FloraBase code of the primary category of the current state listing.', max_length=500, null=True, verbose_name='State conservation code'),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='conservation_criteria_state',
+            field=models.TextField(blank=True, editable=False, help_text='All conservation criteria of the current state listing.', null=True, verbose_name='State conservation criteria'),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='conservation_list_state',
+            field=models.CharField(blank=True, editable=False, help_text='The conservation list of the primary category of the current state listing.', max_length=500, null=True, verbose_name='State conservation list'),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='is_currently_listed',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Whether any conservation listing is currently in effect.', verbose_name='Is currently listed'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='conservation_categories_state',
+            field=models.TextField(blank=True, editable=False, help_text='All conservation categories of the current state listing.', null=True, verbose_name='State conservation categories'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='conservation_category_national',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='The primary conservation category of the current national listing.', max_length=500, null=True, verbose_name='National conservation category'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='conservation_category_state',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='The primary conservation category of the current state listing.', max_length=500, null=True, verbose_name='State conservation category'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='conservation_code_state',
+            field=models.CharField(blank=True, editable=False, help_text='The FloraBase code of the primary category of the current state listing.', max_length=500, null=True, verbose_name='State conservation code'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='conservation_criteria_state',
+            field=models.TextField(blank=True, editable=False, help_text='All conservation criteria of the current state listing.', null=True, verbose_name='State conservation criteria'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='conservation_list_state',
+            field=models.CharField(blank=True, editable=False, help_text='The conservation list of the primary category of the current state listing.', max_length=500, null=True, verbose_name='State conservation list'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='is_currently_listed',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Whether any conservation listing is currently in effect.', verbose_name='Is currently listed'),
+        ),
+    ]
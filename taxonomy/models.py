@@ -8,14 +8,16 @@ Taxon, Crossreferece, and Vernacular are populated from Hbv* through ``taxonomy.
 Community is initally populated from TEC through the API, then updated both through the admin and the API.
 """
 import logging
+from collections import defaultdict
 from django.contrib.gis.db import models as geo_models
 from django.db import models
-from django.db.models.signals import pre_save  # , post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
 
+from shared.cache import cache_receiver, get_lookup_cache, get_version_stamps
 from shared.models import LegacySourceMixin, UrlsMixin, RenderMixin
 
 logger = logging.getLogger(__name__)
@@ -1571,9 +1573,78 @@ class HbvParent(models.Model):
 
 
 # django-mptt tree models ----------------------------------------------------#
+class ConservationStatusCacheMixin(models.Model):
+    """Cached summary of the current state and national conservation listings.
 
+    The cache fields are maintained by
+    ``conservation.models.update_conservation_status_caches`` whenever a
+    conservation listing is saved or deleted, so that exports and API lists
+    need no per-row listing lookups.
+    """
+
+    is_currently_listed = models.BooleanField(
+        db_index=True,
+        default=False,
+        editable=False,
+        verbose_name=_("Is currently listed"),
+        help_text=_("Whether any conservation listing is currently in effect."),
+    )
+
+    conservation_code_state = models.CharField(
+        max_length=500,
+        blank=True, null=True,
+        editable=False,
+        verbose_name=_("State conservation code"),
+        help_text=_("The FloraBase code of the primary category of the current state listing."),
+    )
+
+    conservation_list_state = models.CharField(
+        max_length=500,
+        blank=True, null=True,
+        editable=False,
+        verbose_name=_("State conservation list"),
+        help_text=_("The conservation list of the primary category of the current state listing."),
+    )
 
-class Taxon(RenderMixin, UrlsMixin, MPTTModel, geo_models.Model):
+    conservation_category_state = models.CharField(
+        max_length=500,
+        db_index=True,
+        blank=True, null=True,
+        editable=False,
+        verbose_name=_("State conservation category"),
+        help_text=_("The primary conservation category of the current state listing."),
+    )
+
+    conservation_categories_state = models.TextField(
+        blank=True, null=True,
+        editable=False,
+        verbose_name=_("State conservation categories"),
+        help_text=_("All conservation categories of the current state listing."),
+    )
+
+    conservation_criteria_state = models.TextField(
+        blank=True, null=True,
+        editable=False,
+        verbose_name=_("State conservation criteria"),
+        help_text=_("All conservation criteria of the current state listing."),
+    )
+
+    conservation_category_national = models.CharField(
+        max_length=500,
+        db_index=True,
+        blank=True, null=True,
+        editable=False,
+        verbose_name=_("National conservation category"),
+        help_text=_("The primary conservation category of the current national listing."),
+    )
+
+    class Meta:
+        """Class options."""
+
+        abstract = True
+
+
+class Taxon(RenderMixin, UrlsMixin, ConservationStatusCacheMixin, MPTTModel, geo_models.Model):
     """A taxonomic name at any taxonomic rank.
 
     A taxonomy is a directed graph with exactly one root node (Domain) and
@@ -1827,6 +1898,15 @@ class Taxon(RenderMixin, UrlsMixin, MPTTModel, geo_models.Model):
 
     # -------------------------------------------------------------------------
     # Derived properties
+    def get_genus_species_names(self):
+        """Return the names of the closest ancestors of rank Genus and Species in one query.
+
+        Return A tuple (genus name, species name), each None if not found.
+        """
+        names = dict(self.get_ancestors().filter(
+            rank__in=[Taxon.RANK_GENUS, Taxon.RANK_SPECIES]).values_list("rank", "name"))
+        return (names.get(Taxon.RANK_GENUS), names.get(Taxon.RANK_SPECIES))
+
     @property
     def build_canonical_name(self):
         """Build the canonical name.
@@ -1835,50 +1915,42 @@ class Taxon(RenderMixin, UrlsMixin, MPTTModel, geo_models.Model):
         * Species: [NameID] RANK GENUS NAME
         * Subspecies and lower: [NameID] RANK GENUS SPECIES RANK NAME
         """
-        if self.rank == Taxon.RANK_SPECIES:
-            genus = self.get_ancestors().filter(rank=Taxon.RANK_GENUS).first()
-            return "{0} {1}".format("GENUS" if not genus else genus.name, self.name)
-
-        elif self.rank > Taxon.RANK_SPECIES:
-            genus = self.get_ancestors().filter(rank=Taxon.RANK_GENUS).first()
-            species = self.get_ancestors().filter(rank=Taxon.RANK_SPECIES).first()
-            return "{0} {1} {2} {3}".format(
-                "GENUS" if not genus else genus.name,
-                "SPECIES" if not species else species.name,
-                Taxon.RANK_ABBREVIATIONS[self.rank],
-                self.name)
-        else:
-            return self.name
+        return self.build_names[0]
 
     @property
     def build_taxonomic_name(self):
         """Build the taxonomic name."""
-        if self.author:
-            return "{0} ({1})".format(
-                self.build_canonical_name,
-                self.author.replace("(", "").replace(")", "").strip()
-            )
+        return self.build_names[1]
+
+    @property
+    def build_names(self):
+        """Build canonical and taxonomic name with at most one ancestor lookup."""
+        if self.rank is not None and self.rank >= Taxon.RANK_SPECIES:
+            genus, species = self.get_genus_species_names()
         else:
-            return self.build_canonical_name
+            genus, species = None, None
+        return derive_taxon_names(self.rank, self.name, self.author, genus, species)
+
+    def update_descendant_names(self):
+        """Rebuild canonical and taxonomic names of this Taxon and all its descendants.
+
+        Call this after renaming a Genus or Species. The subtree is updated in one
+        traversal with one ancestor lookup, without saving each descendant.
+
+        Return The number of updated Taxa.
+        """
+        genus, species = self.get_genus_species_names()
+        return update_taxon_names(self.get_descendants(include_self=True), genus=genus, species=species)
 
     @property
     def build_vernacular_name(self):
         """Return the preferred english, or the first available vernacular name."""
-        vv = self.vernacular_set.all()
-        if vv.filter(language=Vernacular.LANGUAGE_ENGLISH, preferred=True):
-            n = vv.filter(language=Vernacular.LANGUAGE_ENGLISH, preferred=True).first().name
-        elif vv.filter(language=Vernacular.LANGUAGE_ENGLISH):
-            n = vv.filter(language=Vernacular.LANGUAGE_ENGLISH).first().name
-        elif vv:
-            n = vv.first().name
-        else:
-            n = ""
-        return n
+        return derive_vernacular_names(self.vernacular_set.all())[0]
 
     @property
     def build_vernacular_names(self):
         """Return a comma-separated list of all vernacular names."""
-        return ", ".join([x.name for x in self.vernacular_set.all() if x.name])
+        return derive_vernacular_names(self.vernacular_set.all())[1]
 
     @property
     def gazettals(self):
@@ -1911,117 +1983,225 @@ class Taxon(RenderMixin, UrlsMixin, MPTTModel, geo_models.Model):
     #              'url': x.absolute_admin_url}
     #             for x in self.document_set.all()]
 
-    @property
-    def is_currently_listed(self):
-        """Whether this Taxon has a current conservation listing."""
-        from conservation import models as cons_models
-        return cons_models.TaxonConservationListing.active.filter(taxon__pk=self.pk).exists()
 
-    # Properties used in API -------------------------------------------------#
-    @property
-    def conservation_code_state(self):
-        """A shorthand conservation code for the current state listing.
+def derive_taxon_names(rank, name, author, genus=None, species=None):
+    """Return canonical and taxonomic name from a Taxon's own and its ancestors' names.
 
-        Values: T, 1,2,3,4,5
-        T: any listing with conservation category CR, EN, VU
-        1..5: Priority listings of levels P1 through P5
+    Arguments
 
-        From the current state listing, get the conservation code
-        ConservationListing.conservation_code is a property returning
-        the highest code (X,T,1..5) of all categories.
-        """
-        cl = self.active_conservation_listing_state
-        if cl:
-            # TODO return cl.category.first().conservation_shortcode
-            return cl.category.__str__()
+    rank The rank of the Taxon
+    name The name of the Taxon
+    author The taxonomic author of the Taxon
+    genus The name of the closest ancestor of rank Genus, or None
+    species The name of the closest ancestor of rank Species, or None
 
-        else:
-            return None
+    Return A tuple (canonical_name, taxonomic_name).
+    """
+    if rank is not None and rank == Taxon.RANK_SPECIES:
+        canonical = "{0} {1}".format("GENUS" if not genus else genus, name)
+    elif rank is not None and rank > Taxon.RANK_SPECIES:
+        canonical = "{0} {1} {2} {3}".format(
+            "GENUS" if not genus else genus,
+            "SPECIES" if not species else species,
+            Taxon.RANK_ABBREVIATIONS[rank],
+            name)
+    else:
+        canonical = name
+
+    if author:
+        taxonomic = "{0} ({1})".format(canonical, author.replace("(", "").replace(")", "").strip())
+    else:
+        taxonomic = canonical
+    return (canonical, taxonomic)
+
+
+def update_taxon_names(taxa, genus=None, species=None, batch_size=1000):
+    """Rebuild canonical and taxonomic names of many Taxa in one traversal.
+
+    Taxa are read in tree order, so each parent is visited before its children
+    and hands down the closest Genus and Species names.
+    Only Taxa with changed names are written, in bulk and without signals.
+
+    Arguments
+
+    taxa A queryset of complete subtrees, e.g. ``Taxon.objects.all()`` or
+      ``taxon.get_descendants(include_self=True)``
+    genus The name of the closest Genus above the subtree roots, default: None
+    species The name of the closest Species above the subtree roots, default: None
+    batch_size The number of rows per UPDATE statement, default: 1000
+
+    Return The number of updated Taxa.
+    """
+    context = dict()
+    changed = list()
+    for x in taxa.order_by("tree_id", "lft").values(
+            "pk", "parent_id", "rank", "name", "author", "canonical_name", "taxonomic_name").iterator():
+        g, s = context.get(x["parent_id"], (genus, species))
+        canonical, taxonomic = derive_taxon_names(x["rank"], x["name"], x["author"], g, s)
+        if x["rank"] == Taxon.RANK_GENUS:
+            g = x["name"]
+        elif x["rank"] == Taxon.RANK_SPECIES:
+            s = x["name"]
+        context[x["pk"]] = (g, s)
+        if (canonical, taxonomic) != (x["canonical_name"], x["taxonomic_name"]):
+            changed.append(Taxon(pk=x["pk"], canonical_name=canonical, taxonomic_name=taxonomic))
 
-    @property
-    def conservation_list_state(self):
-        """The conservation list name for the current state listing.
+    Taxon.objects.bulk_update(changed, ["canonical_name", "taxonomic_name"], batch_size=batch_size)
+    logger.info("[update_taxon_names] Updated names of {0} Taxa.".format(len(changed)))
+    return len(changed)
 
-        From the current state listing, get the name.
-        """
-        cl = self.active_conservation_listing_state
-        if cl:
-            return cl.category.first().conservation_list.code
-        else:
-            return None
 
-    @property
-    def conservation_category_state(self):
-        """The primary conservation category for the current state listing.
+def derive_vernacular_names(vernaculars):
+    """Return the preferred and all vernacular names from a Taxon's Vernaculars.
 
-        The categories are ordered by their rank.
-        The Threatened categories (CR, EN, VU) are above the
-        international agreements (MI, MA, CT).
-        The first available category is returned as the primary one.
+    The preferred name is the first preferred English name, else the first
+    English name, else the first name of any language, in order of creation.
+    Vernaculars are evaluated once, so prefetched ``vernacular_set`` is honoured.
 
-        TODO test that MI/MA/CT are returned only if no CR/EN/VU present.
-        """
-        cl = self.active_conservation_listing_state
-        if cl:
-            return cl.category.first().code
-        else:
-            return None
+    Arguments
 
-    @property
-    def conservation_categories_state(self):
-        """All conservation categories for the current state listing.
+    vernaculars An iterable of Vernacular instances of one Taxon
 
-        The categories are stored in category_cache.
-        """
-        cl = self.active_conservation_listing_state
-        if cl:
-            return cl.category_cache
-        else:
-            return None
+    Return A tuple (vernacular_name, vernacular_names).
+    """
+    vv = sorted(vernaculars, key=lambda x: x.pk)
+    english = [x for x in vv if x.language == Vernacular.LANGUAGE_ENGLISH]
+    preferred = [x for x in english if x.preferred]
+    first = (preferred or english or vv or [None])[0]
+    return (
+        first.name if first else "",
+        ", ".join([x.name for x in vv if x.name])
+    )
 
-    @property
-    def conservation_criteria_state(self):
-        """The list of conservation criteria for the current state listing.
 
-        The criteria are stored in criteria_cache.
-        """
-        cl = self.active_conservation_listing_state
-        if cl:
-            return cl.criteria_cache
-        else:
-            return None
+def update_vernacular_names(taxa=None, batch_size=1000):
+    """Rebuild vernacular_name and vernacular_names of many Taxa at once.
 
-    @property
-    def conservation_category_national(self):
-        """The primary conservation category for the current national listing.
+    All Vernaculars of the given Taxa are read in one query and grouped by Taxon.
+    Only Taxa with changed names are written, in bulk and without signals.
 
-        The categories are ordered by their rank.
-        The Threatened categories (CR, EN, VU) are above the
-        international agreements (MI, MA, CT).
-        The first available category is returned as the primary one.
+    Arguments
 
-        TODO test that MI/MA/CT are returned only if no CR/EN/VU present.
-        """
-        cl = self.active_conservation_listing_national
-        if cl:
-            return cl.category.first().code
-        else:
+    taxa A queryset of Taxa, default: all Taxa with Vernaculars
+    batch_size The number of rows per UPDATE statement, default: 1000
+
+    Return The number of updated Taxa.
+    """
+    if taxa is None:
+        taxa = Taxon.objects.filter(vernacular__isnull=False).distinct()
+
+    vernaculars = defaultdict(list)
+    for x in Vernacular.objects.filter(taxon__in=taxa).only(
+            "pk", "taxon_id", "name", "language", "preferred").iterator():
+        vernaculars[x.taxon_id].append(x)
+
+    changed = list()
+    for x in taxa.values("pk", "vernacular_name", "vernacular_names").iterator():
+        names = derive_vernacular_names(vernaculars[x["pk"]])
+        if names != (x["vernacular_name"], x["vernacular_names"]):
+            changed.append(Taxon(pk=x["pk"], vernacular_name=names[0], vernacular_names=names[1]))
+
+    Taxon.objects.bulk_update(changed, ["vernacular_name", "vernacular_names"], batch_size=batch_size)
+    logger.info("[update_vernacular_names] Updated vernacular names of {0} Taxa.".format(len(changed)))
+    return len(changed)
+
+
+# -----------------------------------------------------------------------------
+# Taxon family cache
+#
+# Cached families are kept in the lookup cache, keyed by name_id and a tree version stamp.
+# Any change to the tree replaces the stamp, which orphans all cached families at once.
+# See shared.cache for how version stamps work.
+TAXON_TREE_VERSION_KEY = "taxonomy:tree_version"
+TAXON_FAMILY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def taxon_tree_version():
+    """Return the current tree version stamp, starting a new one if none is cached."""
+    return get_version_stamps(get_lookup_cache(), [TAXON_TREE_VERSION_KEY])[0]
+
+
+def bump_taxon_tree_version():
+    """Invalidate all cached Taxon families.
+
+    Call this after any change to the Taxon tree which bypasses ``Taxon.save()``,
+    such as ``Taxon.objects.rebuild()`` or bulk writes of tree fields.
+    """
+    get_lookup_cache().delete(TAXON_TREE_VERSION_KEY)
+
+
+def get_family_pks(name_id):
+    """Return the pks of a Taxon's ancestors, itself and descendants, cached by name_id.
+
+    Arguments
+
+    name_id The WACensus NameID of the Taxon
+
+    Return A list of Taxon pks in tree order, or None if no Taxon has the given name_id.
+    """
+    cache = get_lookup_cache()
+    key = "taxonomy:family:{0}:{1}".format(taxon_tree_version(), name_id)
+    pks = cache.get(key)
+    if pks is None:
+        taxon = Taxon.objects.filter(name_id=name_id).first()
+        if taxon is None:
             return None
+        pks = list(taxon.get_family().values_list("pk", flat=True))
+        cache.set(key, pks, TAXON_FAMILY_CACHE_TIMEOUT)
+    return pks
 
 
 @receiver(pre_save, sender=Taxon)
 def taxon_pre_save(sender, instance, *args, **kwargs):
     """Taxon: Build names (expensive lookups).
 
+    A renamed Genus or Species flags its descendants for a name update.
+
     TODO: cache conservation listing lookups.
     """
     try:
-        instance.canonical_name = instance.build_canonical_name
-        instance.taxonomic_name = instance.build_taxonomic_name
+        previous_name = instance.canonical_name
+        instance.canonical_name, instance.taxonomic_name = instance.build_names
+        instance._rename_descendants = (
+            instance.pk is not None and
+            instance.rank in (Taxon.RANK_GENUS, Taxon.RANK_SPECIES) and
+            previous_name != instance.canonical_name
+        )
     except:
         logger.info("[taxon_pre_save] New Taxon, re-save to build canonical/taxonomic name.")
-    instance.vernacular_name = instance.build_vernacular_name
-    instance.vernacular_names = instance.build_vernacular_names
+    instance.vernacular_name, instance.vernacular_names = derive_vernacular_names(instance.vernacular_set.all())
+
+
+@receiver(post_save, sender=Taxon)
+def taxon_post_save(sender, instance, created, raw=False, *args, **kwargs):
+    """Taxon: Rebuild names of a renamed Genus' or Species' descendants."""
+    if not raw and not created and getattr(instance, "_rename_descendants", False):
+        instance._rename_descendants = False
+        instance.update_descendant_names()
+
+
+@receiver(pre_save, sender=Taxon)
+@cache_receiver
+def taxon_remember_parent(sender, instance, raw=False, *args, **kwargs):
+    """Taxon: Remember whether a saved Taxon is new or moves to another parent."""
+    if raw or instance.pk is None:
+        instance._tree_changed = True
+        return
+    previous = list(sender.objects.filter(pk=instance.pk).values_list("parent_id", flat=True))
+    instance._tree_changed = previous != [instance.parent_id]
+
+
+@receiver(post_save, sender=Taxon)
+@receiver(post_delete, sender=Taxon)
+@cache_receiver
+def taxon_tree_changed(sender, instance, *args, **kwargs):
+    """Taxon: Invalidate cached families after a Taxon was created, moved or deleted.
+
+    Saves which leave the parent unchanged, such as renames, keep the tree and its cached families.
+    """
+    if kwargs.get("signal") is post_delete or getattr(instance, "_tree_changed", True):
+        instance._tree_changed = False
+        bump_taxon_tree_version()
 
 
 class Vernacular(models.Model):
@@ -2190,7 +2370,7 @@ class Crossreference(models.Model):
         return list(set(pre + suc))
 
 
-class Community(RenderMixin, UrlsMixin, LegacySourceMixin, geo_models.Model):
+class Community(RenderMixin, UrlsMixin, LegacySourceMixin, ConservationStatusCacheMixin, geo_models.Model):
     """Ecological Community."""
 
     code = models.CharField(
@@ -2221,8 +2401,6 @@ class Community(RenderMixin, UrlsMixin, LegacySourceMixin, geo_models.Model):
         verbose_name=_("Extent of Occurrence"),
         help_text=_("The extent of occurrence as polygon in WGS84, if available."))
 
-    # add cache fields here
-
     class Meta:
         """Class options."""
 
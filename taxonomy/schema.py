@@ -1,33 +1,177 @@
 import graphene
-import graphql_geojson
+import graphql_geojson  # noqa: registers the GeoDjango field converters
+from graphene_django.fields import DjangoConnectionField
 from graphene_django.types import DjangoObjectType
 
+from conservation import models as cons_models
+from shared.schema import ManyToManyLoader, ModelLoader, RelatedLoader, get_loader
 from taxonomy import models as tax_models
 
+# ----------------------------------------------------------------------------#
+# Loaders
+#
+# Related objects are resolved through per-request dataloaders, which batch
+# the lookups of all parents on one level of the query into one query.
+# ----------------------------------------------------------------------------#
+
+
+def taxon_loader(info):
+    return get_loader(info, "taxon", lambda: ModelLoader(tax_models.Taxon.objects.all()))
+
+
+def community_loader(info):
+    return get_loader(info, "community", lambda: ModelLoader(tax_models.Community.objects.all()))
+
+
+def children_loader(info):
+    return get_loader(info, "children", lambda: RelatedLoader(tax_models.Taxon.objects.all(), "parent"))
+
+
+def vernacular_loader(info):
+    return get_loader(info, "vernacular", lambda: RelatedLoader(tax_models.Vernacular.objects.all(), "taxon"))
+
+
+def precedes_loader(info):
+    return get_loader(
+        info, "precedes", lambda: RelatedLoader(tax_models.Crossreference.objects.order_by("pk"), "predecessor"))
+
+
+def supercedes_loader(info):
+    return get_loader(
+        info, "supercedes", lambda: RelatedLoader(tax_models.Crossreference.objects.order_by("pk"), "successor"))
+
+
+def paraphyletic_group_loader(info):
+    return get_loader(
+        info, "paraphyletic_groups", lambda: ManyToManyLoader(tax_models.Taxon, "paraphyletic_groups"))
+
+
+def taxon_listing_loader(info):
+    return get_loader(
+        info, "taxon_listings",
+        lambda: RelatedLoader(cons_models.TaxonConservationListing.objects.all(), "taxon"))
+
+
+def community_listing_loader(info):
+    return get_loader(
+        info, "community_listings",
+        lambda: RelatedLoader(cons_models.CommunityConservationListing.objects.all(), "community"))
+
+
+def load_taxon(info, pk):
+    return None if pk is None else taxon_loader(info).load(pk)
+
+
 # ----------------------------------------------------------------------------#
 # Types
 # ----------------------------------------------------------------------------#
 
 
+class HbvSupraType(DjangoObjectType):
+    class Meta:
+        model = tax_models.HbvSupra
+        fields = ("id", "ogc_fid", "supra_code", "supra_name", "updated_on", "md5_rowhash")
+
+
+class VernacularType(DjangoObjectType):
+    taxon = graphene.Field(lambda: TaxonType)
+
+    class Meta:
+        model = tax_models.Vernacular
+        fields = ("id", "ogc_fid", "taxon", "name", "language", "preferred")
+
+    def resolve_taxon(self, info):
+        return load_taxon(info, self.taxon_id)
+
+
+class TaxonConservationListingType(DjangoObjectType):
+    taxon = graphene.Field(lambda: TaxonType)
+
+    class Meta:
+        model = cons_models.TaxonConservationListing
+
+    def resolve_taxon(self, info):
+        return load_taxon(info, self.taxon_id)
+
+
+class CommunityConservationListingType(DjangoObjectType):
+    community = graphene.Field(lambda: CommunityType)
+
+    class Meta:
+        model = cons_models.CommunityConservationListing
+
+    def resolve_community(self, info):
+        return community_loader(info).load(self.community_id)
+
+
 class CommunityType(DjangoObjectType):
+    conservation_listings = graphene.List(CommunityConservationListingType)
+
     class Meta:
         model = tax_models.Community
         geojson_field = 'eoo'
+        use_connection = True
+
+    def resolve_conservation_listings(self, info):
+        return community_listing_loader(info).load(self.pk)
 
 
 class TaxonType(DjangoObjectType):
+    parent = graphene.Field(lambda: TaxonType)
+    children = graphene.List(lambda: TaxonType)
+    paraphyletic_groups = graphene.List(HbvSupraType)
+    vernacular_set = graphene.List(VernacularType)
+    precedes = graphene.List(lambda: CrossreferenceType)
+    supercedes = graphene.List(lambda: CrossreferenceType)
+    conservation_listings = graphene.List(TaxonConservationListingType)
+
     class Meta:
         model = tax_models.Taxon
         geojson_field = 'eoo'
+        use_connection = True
+
+    def resolve_parent(self, info):
+        return load_taxon(info, self.parent_id)
+
+    def resolve_children(self, info):
+        return children_loader(info).load(self.pk)
+
+    def resolve_paraphyletic_groups(self, info):
+        return paraphyletic_group_loader(info).load(self.pk)
+
+    def resolve_vernacular_set(self, info):
+        return vernacular_loader(info).load(self.pk)
+
+    def resolve_precedes(self, info):
+        return precedes_loader(info).load(self.pk)
+
+    def resolve_supercedes(self, info):
+        return supercedes_loader(info).load(self.pk)
+
+    def resolve_conservation_listings(self, info):
+        return taxon_listing_loader(info).load(self.pk)
 
 
 class CrossreferenceType(DjangoObjectType):
+    predecessor = graphene.Field(TaxonType)
+    successor = graphene.Field(TaxonType)
+
     class Meta:
         model = tax_models.Crossreference
+        use_connection = True
+
+    def resolve_predecessor(self, info):
+        return load_taxon(info, self.predecessor_id)
+
+    def resolve_successor(self, info):
+        return load_taxon(info, self.successor_id)
 
 
 # ----------------------------------------------------------------------------#
 # Queries
+#
+# The list fields are Relay connections, paginated with first/after and
+# last/before and limited to GRAPHENE["RELAY_CONNECTION_MAX_LIMIT"] nodes.
 # ----------------------------------------------------------------------------#
 class Query(object):
     community = graphene.Field(CommunityType,
@@ -37,12 +181,15 @@ class Query(object):
                                description=graphene.String(),
                                )
 
-    all_communities = graphene.List(CommunityType)
+    all_communities = DjangoConnectionField(CommunityType)
 
-    taxon = graphene.Field(TaxonType)
+    taxon = graphene.Field(TaxonType,
+                           id=graphene.Int(),
+                           name_id=graphene.Int(),
+                           )
 
-    all_taxa = graphene.List(TaxonType)
-    all_crossreferences = graphene.List(CrossreferenceType)
+    all_taxa = DjangoConnectionField(TaxonType)
+    all_crossreferences = DjangoConnectionField(CrossreferenceType)
 
     def resolve_community(self, info, **kwargs):
         id = kwargs.get('id')
@@ -57,11 +204,11 @@ class Query(object):
         return None
 
     def resolve_all_communities(self, info, **kwargs):
-        return tax_models.Community.objects.all()
+        return tax_models.Community.objects.order_by("pk")
 
     def resolve_taxon(self, info, **kwargs):
         id = kwargs.get('id')
-        name_id = kwargs.get('nameId')
+        name_id = kwargs.get('name_id')
 
         if id is not None:
             return tax_models.Taxon.objects.get(pk=id)
@@ -75,5 +222,5 @@ class Query(object):
         return tax_models.Taxon.objects.all()
 
     def resolve_all_crossreferences(self, info, **kwargs):
-        # We can easily optimize query count in the resolve method
-        return tax_models.Crossreference.objects.select_related('predecessor', 'successor').all()
+        # Predecessors and successors are batched by the taxon loader
+        return tax_models.Crossreference.objects.order_by("pk")
@@ -21,7 +21,9 @@ This suite tests the following use cases:
   loads a list of communities through the community API endpoint.
 """
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 
@@ -85,6 +87,22 @@ class HbvAPITests(TestCase):
             resp = self.client.get(url, {'format': 'json'})
             self.assertEqual(resp.status_code, 200)
 
+    def test_crossreference_pagination(self):
+        Crossreference.objects.create(xref_id=1, predecessor=self.taxon)
+        url = reverse('api:crossreference-list')
+        resp = self.client.get(url, {'format': 'json'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('features', resp.data)
+        self.assertEqual(resp.data['count'], 2)
+        self.assertEqual(len(resp.data['results']), 2)
+
+        # Keyset pagination pages through all records by cursor
+        resp = self.client.get(url, {'format': 'json', 'cursor': '', 'limit': 1})
+        self.assertEqual([x['xref_id'] for x in resp.data['results']], [0])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([x['xref_id'] for x in resp.data['results']], [1])
+        self.assertIsNone(resp.data['next'])
+
     def test_get_detail_endpoints(self):
         url = reverse('api:hbvname-detail', kwargs={'pk': self.hbvname.pk})
         resp = self.client.get(url, {'format': 'json'})
@@ -129,6 +147,95 @@ class HbvAPITests(TestCase):
         resp = self.client.get(url, {'format': 'json'})
         self.assertEqual(resp.status_code, 200)
 
+    def test_batch_upsert_hbv_models(self):
+        """A batch updates existing records by uid_fields and creates new ones."""
+        url = reverse('api:hbvname-list') + '?format=json'
+        resp = self.client.post(
+            url,
+            [
+                {'name_id': 0, 'name': 'Updated name'},
+                {'name_id': '1', 'name': 'New name'},
+                {'name_id': 2, 'name': 'Another new name'},
+            ],
+            format='json'
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(HbvName.objects.count(), 3)
+        self.assertEqual(HbvName.objects.get(name_id=0).name, 'Updated name')
+        self.assertEqual(HbvName.objects.get(name_id=1).name, 'New name')
+
+        # Numbers and strings of the same name_id are the same record
+        resp = self.client.post(url, [{'name_id': '2', 'name': 'Updated again'}], format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(HbvName.objects.count(), 3)
+        self.assertEqual(HbvName.objects.get(name_id=2).name, 'Updated again')
+
+        # Records with the same name_id within a batch are created and counted once, the last wins
+        resp = self.client.post(
+            url,
+            [{'name_id': 3, 'name': 'First'}, {'name_id': '3', 'name': 'Last'}],
+            format='json'
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, 'Retained 0, updated 0, created 1 records.')
+        self.assertEqual(HbvName.objects.get(name_id=3).name, 'Last')
+
+    def test_stream_upsert_hbv_models(self):
+        """Streamed NDJSON is upserted in windows and resumes after committed windows."""
+        url = reverse('api:hbvname-stream')
+        body = "\n".join([
+            '{"name_id": 0, "name": "Streamed name 0"}',
+            '{"name_id": 1, "name": "Streamed name 1"}',
+            '',
+            '{"name_id": 2, "name": "Streamed name 2"}',
+        ])
+        resp = self.client.post(
+            url + '?window=2&job=test-job', data=body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['windows'], 2)
+        self.assertEqual(resp.data['records'], 3)
+        self.assertEqual(resp.data['updated'], 1)
+        self.assertEqual(resp.data['created'], 2)
+        self.assertTrue(resp.data['finished'])
+        self.assertEqual(HbvName.objects.get(name_id=2).name, 'Streamed name 2')
+
+        # A broken line interrupts the job after the last committed window
+        body = "\n".join([
+            '{"name_id": 3, "name": "Streamed name 3"}',
+            '{"name_id": 4, "name": "Streamed name 4"}',
+            'not json',
+        ])
+        resp = self.client.post(
+            url + '?window=2&job=broken-job', data=body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['records'], 2)
+        self.assertFalse(resp.data['finished'])
+
+        # Resuming the job skips the two committed records
+        body = "\n".join([
+            '{"name_id": 3, "name": "Not re-imported"}',
+            '{"name_id": 4, "name": "Not re-imported"}',
+            '{"name_id": 5, "name": "Streamed name 5"}',
+        ])
+        resp = self.client.post(
+            url + '?window=2&job=broken-job', data=body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['records'], 3)
+        self.assertTrue(resp.data['finished'])
+        self.assertEqual(HbvName.objects.get(name_id=3).name, 'Streamed name 3')
+        self.assertEqual(HbvName.objects.get(name_id=5).name, 'Streamed name 5')
+
+        # Invalid window sizes are rejected
+        for window in ('abc', '0', '-1'):
+            resp = self.client.post(
+                url + '?window=' + window, data=body, content_type='application/x-ndjson')
+            self.assertEqual(resp.status_code, 400)
+
+        # A job of another endpoint does not resume here
+        resp = self.client.post(
+            reverse('api:hbvsupra-stream') + '?job=broken-job', data=body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, 409)
+
     def create_hbv_models(self):
         """Test the API create views of Hbv* models.
 
@@ -307,3 +414,41 @@ class CommunityAPITests(TestCase):
     def update_communities(self):
         """Test that updating communities overwrites existing ones."""
         pass
+
+
+class TaxonGraphQLTests(TestCase):
+    """GraphQL tests for Taxa."""
+
+    def setUp(self):
+        """Create a small tree of Taxa with vernacular names."""
+        self.url = reverse("gql-api")
+        self.genus = Taxon.objects.create(name_id=100, name="Genus")
+        for i in range(5):
+            t = Taxon.objects.create(name_id=101 + i, name="species{0}".format(i), parent=self.genus)
+            Vernacular.objects.create(ogc_fid=101 + i, taxon=t, name="Vernacular {0}".format(i))
+
+    def query(self, query):
+        return self.client.post(self.url, data={"query": query}, content_type="application/json")
+
+    def test_related_objects_are_batched(self):
+        """Test that nested relations are resolved with one query per relation, not per Taxon."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(
+                "{ allTaxa(first: 10) { edges { node { nameId "
+                "parent { nameId } children { nameId } vernacularSet { name } } } } }")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotIn("errors", data)
+        self.assertEqual(len(data["data"]["allTaxa"]["edges"]), 6)
+        self.assertLessEqual(len(queries), 6)
+
+    def test_expensive_queries_are_rejected(self):
+        """Test that too deeply nested or too expensive queries are rejected."""
+        response = self.query("{ taxon(nameId: 100) { " + "children { " * 20 + "nameId" + " }" * 21 + " }")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Query depth", response.json()["errors"][0]["message"])
+
+        response = self.query(
+            "{ allTaxa { edges { node { children { children { children { nameId } } } } } } }")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Query cost", response.json()["errors"][0]["message"])
@@ -40,7 +40,7 @@ from mommy_spatial_generators import MOMMY_SPATIAL_FIELDS  # noqa
 
 from taxonomy import models as tax_models
 from taxonomy.templatetags import taxonomy_tags as tt
-from taxonomy.utils import update_taxon, create_test_fixtures   # noqa
+from taxonomy.utils import build_taxon_tree, rebuild_mptt_tree, update_taxon, create_test_fixtures   # noqa
 from conservation import models as cons_models
 MOMMY_CUSTOM_FIELDS_GEN = MOMMY_SPATIAL_FIELDS
 
@@ -58,6 +58,22 @@ class TaxonUtilsTests(TestCase):
         update_taxon()
         pass
 
+    def test_build_taxon_tree(self):
+        """Test that the in-memory tree matches a full MPTT rebuild and re-runs write nothing."""
+        TREE = ("name_id", "tree_id", "lft", "rght", "level", "canonical_name", "taxonomic_name")
+        result = build_taxon_tree()
+        self.assertTrue(result["ranks"][tax_models.Taxon.RANK_KINGDOM] > 0)
+        built = list(tax_models.Taxon.objects.order_by("name_id").values_list(*TREE))
+
+        tax_models.Taxon.objects.rebuild()
+        self.assertEqual(built, list(tax_models.Taxon.objects.order_by("name_id").values_list(*TREE)))
+        for t in tax_models.Taxon.objects.all():
+            self.assertEqual(t.canonical_name, t.build_canonical_name)
+
+        result = build_taxon_tree()
+        self.assertEqual(result["created"], 0)
+        self.assertEqual(result["updated"], 0)
+
     def test_create_test_fixtures(self):
         """Test create_test_fixtures.
 
@@ -91,6 +107,50 @@ class TaxonUnitTests(TestCase):
         t = tax_models.Taxon.objects.last()
         self.assertIn(t.name, t.build_taxonomic_name)
 
+    def test_build_names(self):
+        """Test that canonical and taxonomic names are built together."""
+        t = tax_models.Taxon.objects.get(name_id=3095)
+        self.assertEqual(t.build_names, (t.build_canonical_name, t.build_taxonomic_name))
+        self.assertEqual(t.build_canonical_name, "Drosera erythrorhiza")
+
+    def test_rename_genus_updates_descendants(self):
+        """Test that renaming a Genus rebuilds the names of its species."""
+        tax_models.Taxon.objects.rebuild()
+        tax_models.update_taxon_names(tax_models.Taxon.objects.all())
+        self.assertEqual(tax_models.update_taxon_names(tax_models.Taxon.objects.all()), 0)
+
+        genus = tax_models.Taxon.objects.get(name_id=21491)
+        genus.name = "Droserella"
+        genus.save()
+        self.assertEqual(
+            tax_models.Taxon.objects.get(name_id=3095).canonical_name, "Droserella erythrorhiza")
+
+    def test_get_family_pks(self):
+        """Test that cached families are invalidated by changes to the tree."""
+        tax_models.Taxon.objects.rebuild()
+        t = tax_models.Taxon.objects.get(name_id=3095)
+        self.assertEqual(tax_models.get_family_pks(3095), list(t.get_family().values_list("pk", flat=True)))
+        self.assertIsNone(tax_models.get_family_pks(-5000000))
+
+        version = tax_models.taxon_tree_version()
+        rebuild_mptt_tree()
+        self.assertNotEqual(tax_models.taxon_tree_version(), version)
+
+        version = tax_models.taxon_tree_version()
+        child = tax_models.Taxon.objects.create(name_id=900001, name="Child", parent=t)
+        self.assertNotEqual(tax_models.taxon_tree_version(), version)
+        self.assertIn(child.pk, tax_models.get_family_pks(3095))
+
+        # Renames keep the tree, moves change it
+        version = tax_models.taxon_tree_version()
+        child.name = "Renamed child"
+        child.save()
+        self.assertEqual(tax_models.taxon_tree_version(), version)
+        child.parent = t.parent
+        child.save()
+        self.assertNotEqual(tax_models.taxon_tree_version(), version)
+        self.assertNotIn(child.pk, tax_models.get_family_pks(3095))
+
     def test_build_vernacular_name(self):
         """Test the vernacular name."""
         pass
@@ -99,6 +159,29 @@ class TaxonUnitTests(TestCase):
         """Test the vernacular names."""
         pass
 
+    def test_update_vernacular_names(self):
+        """Test that vernacular names prefer preferred English, then English, then any name."""
+        t = tax_models.Taxon.objects.get(name_id=3095)
+        t.vernacular_set.all().delete()
+        tax_models.Vernacular.objects.create(
+            ogc_fid=900001, taxon=t, name="Indigenous", language=tax_models.Vernacular.LANGUAGE_INDIGENOUS)
+        tax_models.update_vernacular_names(tax_models.Taxon.objects.filter(pk=t.pk))
+        t.refresh_from_db()
+        self.assertEqual(t.vernacular_name, "Indigenous")
+
+        tax_models.Vernacular.objects.create(
+            ogc_fid=900002, taxon=t, name="English", language=tax_models.Vernacular.LANGUAGE_ENGLISH)
+        tax_models.Vernacular.objects.create(
+            ogc_fid=900003, taxon=t, name="Preferred", preferred=True,
+            language=tax_models.Vernacular.LANGUAGE_ENGLISH)
+        self.assertEqual(tax_models.update_vernacular_names(tax_models.Taxon.objects.filter(pk=t.pk)), 1)
+        t.refresh_from_db()
+        self.assertEqual(t.vernacular_name, "Preferred")
+        self.assertEqual(t.vernacular_names, "Indigenous, English, Preferred")
+        self.assertEqual(t.vernacular_name, t.build_vernacular_name)
+        tax_models.update_vernacular_names()
+        self.assertEqual(tax_models.update_vernacular_names(), 0)
+
     def test_ConservationListings(self):  # noqa
         """Test ConservationListings."""
         pass
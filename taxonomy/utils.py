@@ -6,7 +6,9 @@ import os
 import sys
 import io
 import logging
+from collections import Counter, OrderedDict, defaultdict
 from contextlib import redirect_stdout
+from itertools import groupby
 
 # from django.utils.timezone import is_aware, make_aware
 # from pdb import set_trace
@@ -623,12 +625,50 @@ def make_all_forms():
     # rebuild_mptt_tree()
     return forms
 
-def make_all_vernaculars():
-    # Vernaculars
+def make_all_vernaculars(batch_size=1000):
+    """Create or update all Vernaculars from HbvVernacular in bulk.
+
+    Vernaculars are upserted by ogc_fid with one lookup of Taxa and existing
+    Vernaculars, then the vernacular names of all Taxa with Vernaculars are
+    rebuilt in bulk, instead of re-saving each Taxon per Vernacular.
+
+    Return A list of all created, updated and unchanged Vernaculars.
+    """
     logger.info("[update_taxon] Updating Vernacular Names...")
     LANG = {"ENGLISH": 0, "INDIGENOUS": 1}
-    vernaculars = [make_vernacular(x, LANG) for x in tax_models.HbvVernacular.objects.all()]
-    logger.info("[update_taxon] Updated {0} Vernacular Names.".format(tax_models.Vernacular.objects.count()))
+    taxa = {x["name_id"]: x["pk"] for x in tax_models.Taxon.objects.values("pk", "name_id")}
+    existing = {x.ogc_fid: x for x in tax_models.Vernacular.objects.all()}
+    vernaculars, created, updated = list(), list(), list()
+
+    for x in tax_models.HbvVernacular.objects.all():
+        if x.name_id not in taxa:
+            logger.warn("[make_all_vernaculars] missing Taxon with name_id {0} "
+                        "for ogc_fid {1}, skipping.".format(x.name_id, x.ogc_fid))
+            continue
+        dd = dict(
+            taxon_id=taxa[x.name_id],
+            name=x.vernacular,
+            language=LANG[x.language] if x.language else None,
+            preferred=True if (x.lang_pref and x.lang_pref == "Y") else False
+        )
+        obj = existing.get(x.ogc_fid)
+        if obj is None:
+            obj = tax_models.Vernacular(ogc_fid=x.ogc_fid, **dd)
+            created.append(obj)
+        elif any(getattr(obj, k) != v for k, v in dd.items()):
+            for k, v in dd.items():
+                setattr(obj, k, v)
+            updated.append(obj)
+        vernaculars.append(obj)
+
+    with transaction.atomic():
+        tax_models.Vernacular.objects.bulk_create(created, batch_size=batch_size)
+        tax_models.Vernacular.objects.bulk_update(
+            updated, ["taxon", "name", "language", "preferred"], batch_size=batch_size)
+        tax_models.update_vernacular_names()
+
+    logger.info("[update_taxon] Created {0}, updated {1}, kept {2} Vernacular Names.".format(
+        len(created), len(updated), len(vernaculars) - len(created) - len(updated)))
     return vernaculars
 
 
@@ -685,27 +725,254 @@ def rebuild_mptt_tree():
     # Rebuild MPTT tree
     logger.info("[update_taxon] Rebuilding taxonomic tree - this could take a while.")
     tax_models.Taxon.objects.rebuild()
+    tax_models.bump_taxon_tree_version()
     logger.info("[update_taxon] Taxonomic tree rebuilt.")
 
 
+# -----------------------------------------------------------------------------
+# In-memory tree builder
+#
+# The make_all_* functions above write one Taxon at a time through
+# update_or_create, fire taxon_pre_save for every node and finish with a full
+# MPTT rebuild. build_taxon_tree reads every Hbv* staging table once, builds the
+# complete tree in memory, and writes back only the rows which changed.
+TAXON_TREE_FIELDS = [
+    "name", "rank", "parent_id", "current", "publication_status", "author",
+    "field_code", "supra_group", "canonical_name", "taxonomic_name",
+    "tree_id", "lft", "rght", "level",
+]
+
+
+def clean_author(author):
+    """Strip brackets and whitespace from a WACensus author string."""
+    return author.replace("(", "").replace(")", "").strip() if author else ""
+
+
+def read_wacensus_taxa():
+    """Read all Hbv* staging tables once and return Taxon field dicts by name_id.
+
+    Each dict only contains the fields WACensus provides for the given rank,
+    plus ``parent_nid``, the name_id of the parent Taxon. Fields missing from a
+    dict are left untouched on existing Taxa, the same as update_or_create.
+
+    Return An OrderedDict of name_id: dict of Taxon fields.
+    """
+    CUR = {'N': False, 'Y': True}
+    PUB = {'PN': 0, 'MS': 1, '-': 2}
+    SPECIES_RANKS = {
+        "Species": tax_models.Taxon.RANK_SPECIES,
+        "Subspecies": tax_models.Taxon.RANK_SUBSPECIES,
+        "Variety": tax_models.Taxon.RANK_VARIETY,
+        "Form": tax_models.Taxon.RANK_FORMA,
+    }
+    taxa = OrderedDict()
+
+    def status(x):
+        return dict(publication_status=PUB[x.informal]) if x.informal is not None else dict()
+
+    # Domain and Kingdoms
+    taxa[0] = dict(name="Eukarya", rank=tax_models.Taxon.RANK_DOMAIN, current=True, parent_nid=None)
+    kingdom_nids = dict()
+    for x in tax_models.HbvName.objects.filter(rank_name='Kingdom'):
+        taxa[x.name_id] = dict(name=x.name, rank=tax_models.Taxon.RANK_KINGDOM, current=True, parent_nid=0)
+        kingdom_nids[x.name] = x.name_id
+
+    # Divisions, Classes, Orders, Families
+    for fam in tax_models.HbvFamily.objects.all():
+        lowest_parent = kingdom_nids.get(fam.kingdom_name)
+        for (nid, name, rank) in [
+            (fam.division_nid, fam.division_name, tax_models.Taxon.RANK_DIVISION),
+            (fam.class_nid, fam.class_name, tax_models.Taxon.RANK_CLASS),
+            (fam.order_nid, fam.order_name, tax_models.Taxon.RANK_ORDER),
+        ]:
+            if nid:
+                taxa[nid] = dict(name=force_text(name), rank=rank, parent_nid=lowest_parent)
+                lowest_parent = nid
+        taxa[fam.name_id] = dict(
+            name=force_text(fam.family_name),
+            rank=tax_models.Taxon.RANK_FAMILY,
+            current=CUR[fam.is_current],
+            parent_nid=lowest_parent,
+            author=clean_author(fam.author),
+            supra_group=fam.supra_code,
+            **status(fam))
+
+    # Genera
+    for x in tax_models.HbvGenus.objects.all():
+        taxa[x.name_id] = dict(
+            name=force_text(x.genus),
+            rank=tax_models.Taxon.RANK_GENUS,
+            current=CUR[x.is_current],
+            parent_nid=x.family_nid,
+            author=clean_author(x.author),
+            **status(x))
+
+    # Species, Subspecies, Varieties, Forms
+    parents = {x["name_id"]: x["parent_nid"] for x in tax_models.HbvParent.objects.values("name_id", "parent_nid")}
+    for x in tax_models.HbvSpecies.objects.filter(rank_name__in=SPECIES_RANKS.keys()):
+        if x.name_id not in parents:
+            logger.warn("[read_wacensus_taxa] missing HbvParent with name_id {0}".format(x.name_id))
+            continue
+        rank = SPECIES_RANKS[x.rank_name]
+        if rank == tax_models.Taxon.RANK_SPECIES:
+            name = x.species
+        elif rank == tax_models.Taxon.RANK_FORMA and force_text(x.infra_rank) != 'forma':
+            name = x.infra_name2
+        else:
+            name = x.infra_name
+        taxa[x.name_id] = dict(
+            name=force_text(name),
+            rank=rank,
+            current=CUR[x.is_current],
+            parent_nid=parents[x.name_id],
+            author=clean_author(x.author),
+            field_code=x.species_code,
+            **status(x))
+
+    return taxa
+
+
+def build_taxon_tree(batch_size=1000):
+    """Create or update all Taxa from the Hbv* staging tables in a single pass.
+
+    * Read all WACensus staging tables and all existing Taxa once.
+    * Merge WACensus data over existing Taxa, resolve parents by name_id.
+    * Walk the tree in memory to assign MPTT tree_id, lft, rght, level
+      (children ordered by name_id, as ``Taxon.objects.rebuild()`` does) and to
+      derive canonical and taxonomic names.
+    * Bulk create new Taxa level by level, so parents exist before their children,
+      and bulk update only existing Taxa with changed values.
+
+    No signals are sent, and no MPTT rebuild is required afterwards.
+    Vernacular names are left to ``make_all_vernaculars``.
+
+    Arguments
+
+    batch_size The number of rows per INSERT or UPDATE statement, default: 1000
+
+    Return A dict of counts: "created", "updated", "unchanged", "skipped",
+      and a Counter "ranks" of WACensus taxa per rank.
+    """
+    logger.info("[build_taxon_tree] Reading WACensus staging tables...")
+    source = read_wacensus_taxa()
+
+    logger.info("[build_taxon_tree] Reading existing Taxa...")
+    existing = {
+        x["name_id"]: x for x in
+        tax_models.Taxon.objects.values("pk", "name_id", *TAXON_TREE_FIELDS)
+    }
+    pk_nid = {x["pk"]: nid for nid, x in existing.items()}
+
+    # Merge: existing values, overwritten by WACensus values where given.
+    nodes = dict()
+    for nid, x in existing.items():
+        node = {k: v for k, v in x.items() if k not in ("pk", "parent_id")}
+        node["parent_nid"] = pk_nid.get(x["parent_id"])
+        nodes[nid] = node
+    for nid, x in source.items():
+        node = nodes.setdefault(nid, dict(current=False, publication_status=2))
+        node.update(x)
+
+    # Existing Taxa with an unknown new parent keep their old parent,
+    # new Taxa with an unknown parent are skipped together with their descendants.
+    skipped = 0
+    pruned = True
+    while pruned:
+        pruned = False
+        for nid in [n for n, x in nodes.items()
+                    if x["parent_nid"] is not None and x["parent_nid"] not in nodes]:
+            logger.warn("[build_taxon_tree] missing parent taxon with name_id {0} "
+                        "for name_id {1}.".format(nodes[nid]["parent_nid"], nid))
+            if nid in existing:
+                old_parent = pk_nid.get(existing[nid]["parent_id"])
+                nodes[nid]["parent_nid"] = old_parent if old_parent in nodes else None
+            else:
+                del nodes[nid]
+                skipped += 1
+            pruned = True
+
+    # Walk the tree depth-first to assign MPTT fields and names.
+    children = defaultdict(list)
+    roots = list()
+    for nid, x in nodes.items():
+        (roots if x["parent_nid"] is None else children[x["parent_nid"]]).append(nid)
+
+    for tree_id, root in enumerate(sorted(roots), start=1):
+        counter = 1
+        # Stack entries: (name_id, level, genus name, species name, visited)
+        stack = [(root, 0, None, None, False)]
+        while stack:
+            nid, level, genus, species, visited = stack.pop()
+            node = nodes[nid]
+            if visited:
+                node["rght"] = counter
+                counter += 1
+                continue
+            node.update(tree_id=tree_id, lft=counter, level=level)
+            counter += 1
+            node["canonical_name"], node["taxonomic_name"] = tax_models.derive_taxon_names(
+                node["rank"], node["name"], node.get("author"), genus, species)
+            if node["rank"] == tax_models.Taxon.RANK_GENUS:
+                genus = node["name"]
+            elif node["rank"] == tax_models.Taxon.RANK_SPECIES:
+                species = node["name"]
+            stack.append((nid, level, genus, species, True))
+            stack.extend((c, level + 1, genus, species, False) for c in sorted(children[nid], reverse=True))
+
+    # Write back: new Taxa level by level, changed Taxa in bulk.
+    nid_pk = {nid: x["pk"] for nid, x in existing.items()}
+    fields = [f for f in TAXON_TREE_FIELDS if f != "parent_id"]
+    created = 0
+    updated = list()
+
+    with transaction.atomic():
+        new = sorted((nid for nid in nodes if nid not in existing), key=lambda n: nodes[n]["level"])
+        for level, nids in groupby(new, key=lambda n: nodes[n]["level"]):
+            objs = [
+                tax_models.Taxon(
+                    name_id=nid,
+                    parent_id=nid_pk.get(nodes[nid]["parent_nid"]),
+                    **{k: v for k, v in nodes[nid].items() if k in fields}
+                ) for nid in nids
+            ]
+            for obj in tax_models.Taxon.objects.bulk_create(objs, batch_size=batch_size):
+                nid_pk[obj.name_id] = obj.pk
+            created += len(objs)
+            logger.info("[build_taxon_tree] Created {0} Taxa on tree level {1}.".format(len(objs), level))
+
+        for nid, x in existing.items():
+            node = nodes[nid]
+            node["parent_id"] = nid_pk.get(node["parent_nid"])
+            if any(x[f] != node.get(f) for f in TAXON_TREE_FIELDS):
+                updated.append(tax_models.Taxon(pk=x["pk"], **{f: node.get(f) for f in TAXON_TREE_FIELDS}))
+
+        tax_models.Taxon.objects.bulk_update(updated, TAXON_TREE_FIELDS, batch_size=batch_size)
+        logger.info("[build_taxon_tree] Updated {0} changed Taxa.".format(len(updated)))
+
+    if created or updated:
+        tax_models.bump_taxon_tree_version()
+
+    return dict(
+        created=created,
+        updated=len(updated),
+        unchanged=len(existing) - len(updated),
+        skipped=skipped,
+        ranks=Counter(x["rank"] for nid, x in source.items() if nid in nodes),
+    )
+
+
 def update_taxon():
     """Update Taxon from local copy of WACensus data.
 
-    See also
-    http://django-mptt.readthedocs.io/en/latest/mptt.managers.html#mptt.managers.TreeManager.disable_mptt_updates
+    Taxa and their MPTT tree are built in one pass by ``build_taxon_tree``,
+    followed by Vernaculars, Crossreferences and Paraphyletic Groups.
     """
     # rebuild_mptt_tree() # repair MPTT tree before bulk update/creates
-    kingdoms = make_all_kingdoms()
-    families = make_all_families()
-    genera = make_all_genera()
-    species = make_all_species()
-    subspecies = make_all_subspecies()
-    varieties = make_all_varieties()
-    forms = make_all_forms()
+    tree = build_taxon_tree()
+    ranks = tree["ranks"]
     vernaculars = make_all_vernaculars()
     crossreferences = make_all_crossreferences()
     make_all_paraphyletic_groups()
-    rebuild_mptt_tree()
 
     # Say bye
     msg = ("[update_taxon] Updated {0} kingdoms, {1} families "
@@ -713,13 +980,13 @@ def update_taxon():
            ", {4} subspecies, {5} varieties, {6} forms,"
            " {7} vernaculars and {8} crossreferences."
            ).format(
-        len(kingdoms),
-        len(families),
-        len(genera),
-        len(species),
-        len(subspecies),
-        len(varieties),
-        len(forms),
+        ranks[tax_models.Taxon.RANK_KINGDOM],
+        ranks[tax_models.Taxon.RANK_FAMILY],
+        ranks[tax_models.Taxon.RANK_GENUS],
+        ranks[tax_models.Taxon.RANK_SPECIES],
+        ranks[tax_models.Taxon.RANK_SUBSPECIES],
+        ranks[tax_models.Taxon.RANK_VARIETY],
+        ranks[tax_models.Taxon.RANK_FORMA],
         len(vernaculars),
         len(crossreferences))
     logger.info(msg)
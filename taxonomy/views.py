@@ -3,7 +3,6 @@
 from __future__ import absolute_import, unicode_literals
 
 from django.contrib import messages
-from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponseRedirect, Http404
 # from django.shortcuts import get_object_or_404, redirect
 from django.utils import timezone
@@ -16,7 +15,7 @@ from django.views.generic.list import ListView
 from export_download.views import ResourceDownloadMixin
 
 from taxonomy.filters import CommunityFilter, TaxonFilter
-from taxonomy.models import Community, Taxon
+from taxonomy.models import Community, Taxon, get_family_pks
 from taxonomy.tables import CommunityAreaEncounterTable, TaxonAreaEncounterTable
 from taxonomy.utils import update_taxon as update_taxon_util
 from taxonomy import resources as tax_resources
@@ -52,12 +51,14 @@ class TaxonListView(ListViewBreadcrumbMixin, ResourceDownloadMixin, ListView):
     paginate_by = 12
 
     def get_context_data(self, **kwargs):
-        """Add extra items to context."""
+        """Add extra items to context.
+
+        The filter and the count reuse the queryset evaluated by ``get_queryset``.
+        """
         context = super(TaxonListView, self).get_context_data(**kwargs)
         context["now"] = timezone.now()
-        context["list_filter"] = TaxonFilter(
-            self.request.GET, queryset=self.get_queryset())
-        context["count"] = self.get_queryset().count()
+        context["list_filter"] = self.list_filter
+        context["count"] = context["paginator"].count if context["paginator"] else len(self.object_list)
         return context
 
     def get_queryset(self):
@@ -67,46 +68,35 @@ class TaxonListView(ListViewBreadcrumbMixin, ResourceDownloadMixin, ListView):
 
         * Taxon card > explore: GET name_id = show this taxon, its parents
           and all children. Do not process the other filter fields.
+          The family is read from the cache, see ``taxonomy.models.get_family_pks``.
         * Search filter: name (icontains), rank, is current, publication status.
 
         DO NOT use taxon_filter.qs in template:
         https://github.com/django-mptt/django-mptt/issues/632
         """
         queryset = Taxon.objects.all()
+        self.list_filter = TaxonFilter(self.request.GET, queryset=queryset)
 
         # name_id is mutually exclusive to other parameters
         if self.request.GET.get("name_id"):
             try:
-                return queryset.filter(
-                    name_id=self.request.GET.get("name_id")
-                ).get(
-                ).get_family(
-                ).prefetch_related(
-                    "paraphyletic_groups",
-                    "conservation_listings",
-                    "conservationthreat_set",
-                    "conservationaction_set",
-                    "document_set",
-                )
-            except ObjectDoesNotExist:
+                family_pks = get_family_pks(int(self.request.GET.get("name_id")))
+            except ValueError:
+                family_pks = None
+            if family_pks is None:
                 messages.warning(self.request, "This Name ID does not exist.")
-                return queryset.prefetch_related(
-                    "paraphyletic_groups",
-                    "conservation_listings",
-                    "conservationthreat_set",
-                    "conservationaction_set",
-                    "document_set",
-                )
-
-        return TaxonFilter(
-            self.request.GET, queryset=queryset
-            ).qs.prefetch_related(
-                "paraphyletic_groups",
-                "conservation_listings",
-                "conservationthreat_set",
-                "conservationaction_set",
-                "document_set",
-            )
+            else:
+                queryset = queryset.filter(pk__in=family_pks)
+        else:
+            queryset = self.list_filter.qs
+
+        return queryset.prefetch_related(
+            "paraphyletic_groups",
+            "conservation_listings",
+            "conservationthreat_set",
+            "conservationaction_set",
+            "document_set",
+        )
 
 
 class CommunityListView(ListViewBreadcrumbMixin, ResourceDownloadMixin, ListView):
@@ -123,18 +113,15 @@ class CommunityListView(ListViewBreadcrumbMixin, ResourceDownloadMixin, ListView
         """Add extra items to context."""
         context = super(CommunityListView, self).get_context_data(**kwargs)
         context["now"] = timezone.now()
-        context["list_filter"] = CommunityFilter(
-            self.request.GET,
-            queryset=self.get_queryset()
-        )
-        context["count"] = self.get_queryset().count()
+        context["list_filter"] = self.list_filter
+        context["count"] = context["paginator"].count if context["paginator"] else len(self.object_list)
         return context
 
     def get_queryset(self):
         """Queryset."""
         queryset = Community.objects.all()
-        filtered = CommunityFilter(self.request.GET, queryset=queryset).qs
-        prefetched = filtered.prefetch_related(
+        self.list_filter = CommunityFilter(self.request.GET, queryset=queryset)
+        prefetched = self.list_filter.qs.prefetch_related(
             "conservation_listings",
             "conservationthreat_set",
             "conservationaction_set",
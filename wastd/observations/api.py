@@ -1,10 +1,14 @@
 from django_filters.rest_framework import DateFilter
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_filters import FilterSet
 
 from shared.api import (
+    CustomCSVRenderer,
+    CustomLimitOffsetPagination,
     MyGeoJsonPagination,
-    BatchUpsertViewSet
+    BatchUpsertViewSet,
+    StreamingExportMixin
 )
 from wastd.observations import models
 from wastd.observations import serializers
@@ -15,6 +19,30 @@ except BaseException:
     pass
 
 
+class EncounterBatchUpsertViewSet(BatchUpsertViewSet):
+    """A BatchUpsert ViewSet for Encounters with deferred cached fields.
+
+    Created and updated Encounters are marked as ``cache_dirty`` with one query,
+    their cached fields are recalculated in batches by the background task
+    ``update_encounter_caches``, of which at most one run waits in the queue.
+
+    Keyset pagination (GET parameter ``cursor``) pages through Encounters in order of ``when``.
+    """
+
+    keyset_fields = ("when", "pk")
+
+    def update_cached_fields(self, pks, created=True):
+        """Mark Encounters as dirty and schedule the recalculation of their cached fields.
+
+        Only one recalculation is queued at a time, however many batches or stream windows are upserted.
+        """
+        if not pks:
+            return
+        from wastd.observations.tasks import schedule_encounter_caches
+        models.Encounter.objects.filter(pk__in=pks).update(cache_dirty=True)
+        schedule_encounter_caches()
+
+
 class AreaFilter(FilterSet):
 
     class Meta:
@@ -122,7 +150,7 @@ class FastEncounterFilter(FilterSet):
         }
 
 
-class EncounterViewSet(BatchUpsertViewSet):
+class EncounterViewSet(EncounterBatchUpsertViewSet):
     """Encounters are a common, minimal, shared set of data about:
 
     * Strandings (turtles, dugong, ceataceans (pre-QA raw import), pinnipeds (coming soon), sea snakes)
@@ -244,6 +272,20 @@ class EncounterViewSet(BatchUpsertViewSet):
 
     * [/api/1/encounters/?observer=100](/api/1/encounters/?observer=100) Observer with ID 100
     * [/api/1/encounters/?reporter=100](/api/1/encounters/?reporter=100) Reporter with ID 100
+
+    # pagination
+    Full harvests should page by keyset instead of offset, which is equally fast for every page.
+    Follow the ``next`` link until it is empty. The count is only included on request.
+
+    * [/api/1/encounters/?cursor=](/api/1/encounters/?cursor=) First page, ordered by ``when``
+    * [/api/1/encounters/?cursor=&limit=1000&count](/api/1/encounters/?cursor=&limit=1000&count)
+      First page of 1000 Encounters with total count
+
+    # export
+    Stream all matching Encounters in one response, e.g. for a full download.
+
+    * [/api/1/encounters/?export](/api/1/encounters/?export) All Encounters as GeoJSON
+    * [/api/1/encounters/?export&format=csv](/api/1/encounters/?export&format=csv) All Encounters as CSV
     """
 
     latex_name = "latex/encounter.tex"
@@ -343,7 +385,7 @@ class AnimalEncounterFilter(FilterSet):
         }
 
 
-class AnimalEncounterViewSet(BatchUpsertViewSet):
+class AnimalEncounterViewSet(EncounterBatchUpsertViewSet):
     """AnimalEncounter view set.
 
     AnimalEncounters come from marine wildlife incidents (strandings and rescues),
@@ -434,7 +476,7 @@ class TurtleNestEncounterFilter(FilterSet):
         }
 
 
-class TurtleNestEncounterViewSet(BatchUpsertViewSet):
+class TurtleNestEncounterViewSet(EncounterBatchUpsertViewSet):
     """TurtleNestEncounter view set.
 
     TNE are turtle tracks with or without nests.
@@ -523,7 +565,7 @@ class TurtleNestEncounterViewSet(BatchUpsertViewSet):
 
 
 
-class LineTransectEncounterViewSet(BatchUpsertViewSet):
+class LineTransectEncounterViewSet(EncounterBatchUpsertViewSet):
     # latex_name = "latex/loggerencounter.tex"
     queryset = models.LineTransectEncounter.objects.all().prefetch_related(
         "observer", "reporter", "survey", "site", "area", "survey__reporter"
@@ -542,7 +584,7 @@ class LineTransectEncounterViewSet(BatchUpsertViewSet):
         symlink_resources(t_dir, data)
 
 
-class LoggerEncounterViewSet(BatchUpsertViewSet):
+class LoggerEncounterViewSet(EncounterBatchUpsertViewSet):
     latex_name = "latex/loggerencounter.tex"
     queryset = models.LoggerEncounter.objects.all().prefetch_related(
         "observer", "reporter", "survey", "site", "area", "survey__reporter"
@@ -561,13 +603,18 @@ class LoggerEncounterViewSet(BatchUpsertViewSet):
         symlink_resources(t_dir, data)
 
 
-class ObservationViewSet(ModelViewSet):
+class ObservationViewSet(StreamingExportMixin, ModelViewSet):
     """Generic list of Observations.
 
     [Admin](/admin/observations/)
+
+    Stream all Observations with [/api/1/observations/?export](/api/1/observations/?export)
+    or [/api/1/observations/?export&format=csv](/api/1/observations/?export&format=csv).
     """
     queryset = models.Observation.objects.all()
     serializer_class = serializers.ObservationSerializer
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (CustomCSVRenderer, )
+    pagination_class = CustomLimitOffsetPagination
     model = models.Observation
 
 
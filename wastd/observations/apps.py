@@ -7,3 +7,7 @@ from django.apps import AppConfig
 class ObservationsConfig(AppConfig):
     name = 'wastd.observations'
     verbose_name = "Observations"
+
+    def ready(self):
+        """Register map layers."""
+        import wastd.observations.tiles  # noqa
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('observations', '0024_auto_20200702_1716'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encounter',
+            name='cache_dirty',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Whether the cached fields (popup, latex, site, area, name, encounter type) await recalculation by the background task update_encounter_caches.', verbose_name='Cached fields outdated'),
+        ),
+    ]
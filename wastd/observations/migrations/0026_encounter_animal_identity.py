@@ -0,0 +1,33 @@
+# Generated by Django 2.2.13 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+from shared.utils import connected_components
+
+
+def build_animal_identities(apps, schema_editor):
+    """Build the animal identities of all tagged Encounters."""
+    Encounter = apps.get_model('observations', 'Encounter')
+    TagObservation = apps.get_model('observations', 'TagObservation')
+    components = connected_components(
+        TagObservation.objects.values_list('encounter_id', 'name').iterator())
+    Encounter.objects.bulk_update(
+        [Encounter(pk=pk, animal_identity=identity) for pk, identity in components.items()],
+        ['animal_identity'],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('observations', '0025_encounter_cache_dirty'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encounter',
+            name='animal_identity',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, help_text='The lowest ID of all Encounters linked to this Encounter through shared tag names. Encounters with the same animal identity concern the same animal.', null=True, verbose_name='Animal identity'),
+        ),
+        migrations.RunPython(build_animal_identities, migrations.RunPython.noop),
+    ]
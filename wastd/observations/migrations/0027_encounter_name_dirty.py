@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('observations', '0026_encounter_animal_identity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encounter',
+            name='name_dirty',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Whether the TagObservations of this animal have changed since the animal name was last allocated.', verbose_name='Animal name outdated'),
+        ),
+    ]
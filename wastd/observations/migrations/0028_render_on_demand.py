@@ -0,0 +1,25 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('observations', '0027_encounter_name_dirty'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='area',
+            name='as_html',
+        ),
+        migrations.RemoveField(
+            model_name='encounter',
+            name='as_html',
+        ),
+        migrations.RemoveField(
+            model_name='encounter',
+            name='as_latex',
+        ),
+    ]
@@ -23,16 +23,20 @@ actions:
 """
 import itertools
 import logging
+import threading
 import urllib
+from contextlib import contextmanager
 from datetime import timedelta
+from functools import partial
 
 import slugify
 from dateutil import tz
 from django.conf import settings
 from django.contrib.gis.db import models as geo_models
 from django.db import models
+from django.db.models import OuterRef, Q, Subquery
 from django.db.models.fields import DurationField
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.template import loader
 from django.urls import reverse
@@ -44,6 +48,7 @@ from django_fsm_log.decorators import fsm_log_by
 from django_fsm_log.models import StateLog
 from polymorphic.models import PolymorphicModel
 from rest_framework.reverse import reverse as rest_reverse
+from shared.cache import cache_receiver, get_lookup, register_lookup
 from shared.models import (
     CodeLabelDescriptionMixin,
     RenderMixin,
@@ -52,7 +57,8 @@ from shared.models import (
     QualityControlMixin,
     UrlsMixin
 )
-from shared.utils import sanitize_tag_label
+from shared.rendering import invalidate_renders, rendered
+from shared.utils import connected_components, sanitize_tag_label
 
 from wastd.users.models import User
 
@@ -696,11 +702,6 @@ class Area(geo_models.Model):
                     "survey of this area."),
     )
 
-    as_html = models.TextField(
-        verbose_name=_("HTML representation"),
-        blank=True, null=True, editable=False,
-        help_text=_("The cached HTML representation for display purposes."),)
-
     geom = geo_models.PolygonField(
         srid=4326,
         verbose_name=_("Location"),
@@ -715,18 +716,69 @@ class Area(geo_models.Model):
         verbose_name_plural = "Areas"
 
     def save(self, *args, **kwargs):
-        """Cache centroid and northern extent."""
-        self.as_html = self.get_popup
-        if not self.northern_extent:
+        """Cache centroid and northern extent, re-assign contents if the geom changed.
+
+        If the polygon of an existing Area is edited, centroid and northern extent
+        are re-calculated, and the Encounters, Surveys and SurveyEnds inside the
+        old or new polygon are re-assigned to their containing Areas.
+        A new Area claims all contained records which have no Area of its type yet.
+        Whether the geom or area type changed is kept for post_save receivers
+        as ``_geom_changed`` and ``_area_type_changed``.
+        """
+        old_geom, old_area_type = None, None
+        if self.pk:
+            old_geom, old_area_type = Area.objects.filter(pk=self.pk).values_list(
+                "geom", "area_type").first() or (None, None)
+        geom_changed = old_geom is None or not old_geom.equals_exact(self.geom)
+        self._geom_changed = geom_changed
+        self._area_type_changed = old_area_type != self.area_type
+
+        if geom_changed or not self.northern_extent:
             self.northern_extent = self.derived_northern_extent
-        if not self.centroid:
+        if geom_changed or not self.centroid:
             self.centroid = self.derived_centroid
         super(Area, self).save(*args, **kwargs)
 
+        if geom_changed:
+            self.reassign_contents(old_geom=old_geom)
+
     def __str__(self):
         """The unicode representation."""
         return "{0} {1}".format(self.area_type, self.name, )
 
+    def reassign_contents(self, old_geom=None):
+        """Re-assign Encounters, Surveys and SurveyEnds to Areas of this Area's type.
+
+        Without an ``old_geom``, only records inside this Area without an Area of
+        this type are assigned.
+        With an ``old_geom``, all records inside the old or the new polygon are
+        re-assigned, which releases records outside of the new polygon.
+
+        Arguments:
+
+        old_geom <Polygon> The previous extent of this Area. Default: None.
+
+        Returns:
+        A dict of "model.field" and the number of updated records.
+        """
+        updated = dict()
+        for model, location_field, area_field, area_type in area_assignments():
+            if area_type != self.area_type:
+                continue
+            within = Q(**{"{0}__within".format(location_field): self.geom})
+            if old_geom is not None:
+                within |= Q(**{"{0}__within".format(location_field): old_geom})
+            updated["{0}.{1}".format(model._meta.model_name, area_field)] = assign_areas(
+                model.objects.filter(within),
+                location_field,
+                area_field,
+                area_type,
+                overwrite=old_geom is not None
+            )
+        logger.info("[wastd.observations.models.Area.reassign_contents] "
+                    "{0} re-assigned {1}".format(self, updated))
+        return updated
+
     @property
     def derived_centroid(self):
         """The centroid, derived from the polygon."""
@@ -737,12 +789,12 @@ class Area(geo_models.Model):
         """The northern extent, derived from the polygon."""
         return self.geom.extent[3] or None
 
+    render_templates = {"as_html": "popup/area.html"}
+
     @property
-    def get_popup(self):
-        """Generate HTML popup content."""
-        t = loader.get_template("popup/{0}.html".format(self._meta.model_name))
-        c = dict(original=self)
-        return mark_safe(t.render(c))
+    def as_html(self):
+        """The HTML popup, rendered on demand and cached, see shared.rendering."""
+        return rendered(self, "as_html")
 
     @property
     def leaflet_title(self):
@@ -790,6 +842,38 @@ class Area(geo_models.Model):
                             kwargs={'pk': self.pk, 'format': format})
 
 
+# Area lookups ---------------------------------------------------------------#
+# Sites and localities are cached, so saving a record finds its Areas without a spatial query.
+def build_areas(area_type):
+    """Return all Areas of a type in the default order."""
+    return list(Area.objects.filter(area_type=area_type))
+
+
+def build_admin_area_choices():
+    """Return choices of DBCA Regions and Districts."""
+    return [(str(a.pk), str(a)) for a in Area.objects.filter(
+        area_type__in=[Area.AREATYPE_DBCA_REGION, Area.AREATYPE_DBCA_DISTRICT]
+    ).order_by("area_type", "name")]
+
+
+for area_type in (Area.AREATYPE_SITE, Area.AREATYPE_LOCALITY):
+    register_lookup("areas:{0}".format(area_type), partial(build_areas, area_type), [Area])
+register_lookup("admin-area-choices", build_admin_area_choices, [Area])
+
+
+def area_containing(point, area_type):
+    """Return the first cached Area of a type containing a point, or None."""
+    if point is None:
+        return None
+    return next((a for a in get_lookup("areas:{0}".format(area_type))
+                 if a.geom and a.geom.contains(point)), None)
+
+
+def admin_area_choices():
+    """Return cached choices of DBCA Regions and Districts for filters."""
+    return get_lookup("admin-area-choices")
+
+
 class SiteVisitStartEnd(geo_models.Model):
     """A start or end point to a site visit."""
 
@@ -1165,18 +1249,59 @@ class Survey(QualityControlMixin, geo_models.Model):
             return None
         else:
             e = Encounter.objects.filter(
-                where__contained=self.site.geom,
+                where__within=self.site.geom,
                 when__gte=self.start_time,
                 when__lte=self.end_time)
             logger.info("[Survey.encounters] {0} found {1} Encounters".format(self, len(e)))
             return e
 
 
+def area_assignments():
+    """Return which Area types are cached on which models.
+
+    Returns:
+    A tuple of (model, location field, Area foreign key field, Area type).
+    """
+    return (
+        (Encounter, "where", "site", Area.AREATYPE_SITE),
+        (Encounter, "where", "area", Area.AREATYPE_LOCALITY),
+        (Survey, "start_location", "site", Area.AREATYPE_SITE),
+        (SurveyEnd, "end_location", "site", Area.AREATYPE_SITE),
+    )
+
+
+def assign_areas(queryset, location_field, area_field, area_type, overwrite=False):
+    """Set an Area foreign key of many records with one spatial UPDATE.
+
+    Each record gets the first Area of the given type containing its location,
+    in the same order as ``Area.objects.filter(...).first()`` would return it.
+    PostGIS resolves the containment for all records in one statement
+    using the spatial index on ``Area.geom``.
+
+    Arguments:
+
+    queryset <QuerySet> The records to update.
+    location_field <str> The name of the point field, e.g. "where".
+    area_field <str> The name of the Area foreign key, e.g. "site".
+    area_type <str> The Area type, e.g. ``Area.AREATYPE_SITE``.
+    overwrite <bool> Whether to re-assign records which already have an Area,
+        default: False (only assign records without Area).
+
+    Returns:
+    The number of updated records.
+    """
+    qs = queryset.order_by().exclude(**{"{0}__isnull".format(location_field): True})
+    if not overwrite:
+        qs = qs.filter(**{"{0}__isnull".format(area_field): True})
+    return qs.update(**{area_field: Subquery(
+        Area.objects.filter(
+            area_type=area_type,
+            geom__contains=OuterRef(location_field)).values("pk")[:1])})
+
+
 def guess_site(survey_instance):
     """Return the first Area containing the start_location or None."""
-    return Area.objects.filter(
-        area_type=Area.AREATYPE_SITE,
-        geom__contains=survey_instance.start_location).first()
+    return area_containing(survey_instance.start_location, Area.AREATYPE_SITE)
 
 
 def claim_end_points(survey_instance):
@@ -1341,13 +1466,62 @@ class SurveyEnd(geo_models.Model):
     @property
     def guess_site(self):
         """Return the first Area containing the start_location or None."""
-        candidates = Area.objects.filter(
-            area_type=Area.AREATYPE_SITE,
-            geom__contains=self.end_location)
-        return None if not candidates else candidates.first()
+        return area_containing(self.end_location, Area.AREATYPE_SITE)
 
 
 # Utilities ------------------------------------------------------------------#
+def update_animal_identities(encounter_ids=None, batch_size=1000):
+    """Update the animal identity of Encounters linked through shared tag names.
+
+    The animal identities are the connected components of Encounters linked by
+    TagObservations with the same tag name. They are calculated with a union-find
+    over (encounter ID, tag name) of TagObservations in one pass.
+
+    Given ``encounter_ids``, only the animals of these Encounters are recalculated:
+    the Encounters are expanded by their shared tag names and their previous animal
+    identities until no new Encounters are found. This covers both merged animals
+    (a new shared tag name) and split animals (a changed or deleted tag name).
+
+    Only Encounters with a changed animal identity are written.
+    Recalculated animals are marked as ``name_dirty`` for the next run of
+    ``wastd.observations.utils.allocate_animal_names``.
+
+    Arguments:
+
+    encounter_ids <list of int> The IDs of Encounters with changed TagObservations.
+        Default: None (rebuild the animal identities of all Encounters).
+    batch_size <int> The number of Encounters per UPDATE. Default: 1000.
+
+    Returns:
+    The number of updated Encounters.
+    """
+    encounters = Encounter.objects.non_polymorphic().order_by()
+    tags = TagObservation.objects.non_polymorphic().order_by()
+    if encounter_ids is not None:
+        ids = set(encounter_ids)
+        new_ids = set(ids)
+        while new_ids:
+            names = tags.filter(encounter_id__in=new_ids).values_list("name", flat=True)
+            identities = encounters.filter(
+                pk__in=new_ids, animal_identity__isnull=False).values_list("animal_identity", flat=True)
+            new_ids = set(tags.filter(name__in=names).values_list("encounter_id", flat=True))
+            new_ids |= set(encounters.filter(animal_identity__in=identities).values_list("pk", flat=True))
+            new_ids -= ids
+            ids |= new_ids
+        encounters = encounters.filter(pk__in=ids)
+        tags = tags.filter(encounter_id__in=ids)
+        encounters.update(name_dirty=True)
+
+    components = connected_components(tags.values_list("encounter_id", "name").iterator())
+    changed = [Encounter(pk=pk, animal_identity=components.get(pk))
+               for pk, identity in encounters.values_list("pk", "animal_identity").iterator()
+               if components.get(pk) != identity]
+    Encounter.objects.bulk_update(changed, ["animal_identity"], batch_size=batch_size)
+    logger.info("[wastd.observations.models.update_animal_identities] "
+                "Updated animal identity of {0} Encounters.".format(len(changed)))
+    return len(changed)
+
+
 @receiver(pre_delete)
 def delete_observations(sender, instance, **kwargs):
     """Delete Observations before deleting an Encounter.
@@ -1519,6 +1693,23 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
         verbose_name=_("Animal Name"),
         help_text=_("The animal's earliest associated flipper tag ID."),)
 
+    animal_identity = models.PositiveIntegerField(
+        editable=False,
+        blank=True, null=True,
+        db_index=True,
+        verbose_name=_("Animal identity"),
+        help_text=_("The lowest ID of all Encounters linked to this Encounter "
+                    "through shared tag names. Encounters with the same animal identity "
+                    "concern the same animal."),)
+
+    name_dirty = models.BooleanField(
+        default=False,
+        db_index=True,
+        editable=False,
+        verbose_name=_("Animal name outdated"),
+        help_text=_("Whether the TagObservations of this animal have changed since "
+                    "the animal name was last allocated."),)
+
     observer = models.ForeignKey(
         User,
         on_delete=models.SET_DEFAULT,
@@ -1539,15 +1730,13 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
             "The person who wrote the initial data sheet in the field. "
             "The reporter is the source of handwriting and spelling errors. "))
 
-    as_html = models.TextField(
-        verbose_name=_("HTML representation"),
-        blank=True, null=True, editable=False,
-        help_text=_("The cached HTML representation for display purposes."),)
-
-    as_latex = models.TextField(
-        verbose_name=_("Latex fragment"),
-        blank=True, null=True, editable=False,
-        help_text=_("The cached Latex fragment for reporting purposes."),)
+    cache_dirty = models.BooleanField(
+        default=False,
+        db_index=True,
+        editable=False,
+        verbose_name=_("Cached fields outdated"),
+        help_text=_("Whether the cached fields (popup, latex, site, area, name, encounter type) "
+                    "await recalculation by the background task update_encounter_caches."),)
 
     encounter_type = models.CharField(
         max_length=300,
@@ -1693,13 +1882,10 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
         return self.when
 
     def save(self, *args, **kwargs):
-        """Cache popup, encounter type and source ID.
+        """Cache name, site, area, encounter type and source ID.
 
-        The popup content changes when fields change, and is expensive to build.
-        As it is required ofen and under performance-critical circumstances -
-        populating the home screen with lots of popups - is is re-calculated
-        whenever the contents change (on save) rather when it is required for
-        display.
+        The HTML popup ``as_html`` and Latex fragment ``as_latex`` are not stored,
+        but rendered on demand and cached by shared.rendering. Saving orphans the cached renders.
 
         The source ID will be auto-generated from ``short_name`` (if not set)
         but is not guaranteed to be unique.
@@ -1709,9 +1895,20 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
 
         The encounter type is inferred from the type of attached Observations.
         This logic is overridden in subclasses.
+
+        Importers can pass ``defer_caches=True`` for a fast save, which only
+        marks the Encounter as ``cache_dirty``. The cached fields are then
+        recalculated in batches by ``wastd.observations.utils.update_encounter_caches``.
         """
+        defer_caches = kwargs.pop("defer_caches", False)
         if not self.source_id:
             self.source_id = self.short_name
+        if defer_caches:
+            self.cache_dirty = True
+            if kwargs.get("update_fields"):
+                kwargs["update_fields"] = list(kwargs["update_fields"]) + ["cache_dirty", "source_id"]
+            super(Encounter, self).save(*args, **kwargs)
+            return
         if (not self.name) and self.inferred_name:
             self.name = self.inferred_name
         if not self.site:
@@ -1719,26 +1916,19 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
         if not self.area:
             self.area = self.guess_area
         self.encounter_type = self.get_encounter_type
-        self.as_html = self.get_popup()
-        self.as_latex = self.get_latex()
+        self.cache_dirty = False
         super(Encounter, self).save(*args, **kwargs)
 
     # Name -------------------------------------------------------------------#
     @property
     def guess_site(self):
         """Return the first Area containing the start_location or None."""
-        candidates = Area.objects.filter(
-            area_type=Area.AREATYPE_SITE,
-            geom__contains=self.where)
-        return None if not candidates else candidates.first()
+        return area_containing(self.where, Area.AREATYPE_SITE)
 
     @property
     def guess_area(self):
         """Return the first Area containing the start_location or None."""
-        candidates = Area.objects.filter(
-            area_type=Area.AREATYPE_LOCALITY,
-            geom__contains=self.where)
-        return None if not candidates else candidates.first()
+        return area_containing(self.where, Area.AREATYPE_LOCALITY)
 
     def set_name(self, name):
         """Set the animal name to a given value."""
@@ -1770,42 +1960,16 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
     def related_encounters(self):
         """Return all Encounters with the same Animal.
 
-        This algorithm collects all Encounters with the same animal by
-        traversing an Encounter's TagObservations and their encounter histories.
-
-        The algorithm starts with the Encounter (``self``) as initial
-        known Encounter (``known_enc``), and ``self.tags`` as both initial known
-        (``known_tags``) and new TagObs (``new_tags``).
-        While there are new TagObs, a "while" loop harvests new encounters:
-
-        * For each tag in ``new_tags``, retrieve the encounter history.
-        * Combine and deduplicate the encounter histories
-        * Remove known encounters and call this set of encounters ``new_enc``.
-        * Add ``new_enc`` to ``known_enc``.
-        * Combine and deduplicate all tags of all encounters in ``new_enc`` and
-          call this set of TabObservations ``new_tags``.
-        * Add ``new_tags`` to ``known_tags``.
-        * Repeat the loop if the list of new tags is not empty.
-
-        Finally, deduplicate and return ``known_enc``. These are all encounters
-        that concern the same animal as this (self) encounter, as proven through
-        the shared presence of TagObservations.
-        """
-        known_enc = [self, ]
-        known_tags = list(self.tags)
-        new_enc = []
-        new_tags = self.tags
-        show_must_go_on = True
-
-        while show_must_go_on:
-            new_enc = TagObservation.encounter_histories(
-                new_tags, without=known_enc)
-            known_enc.extend(new_enc)
-            new_tags = Encounter.tag_lists(new_enc)
-            known_tags += new_tags
-            show_must_go_on = len(new_tags) > 0
+        All Encounters linked to this Encounter through shared tag names,
+        directly or transitively, share the same ``animal_identity``,
+        which is maintained by ``update_animal_identities``.
+        This makes finding all Encounters of one animal a single indexed lookup.
 
-        return list(set(known_enc))
+        Encounters without TagObservations are only related to themselves.
+        """
+        if self.animal_identity is None:
+            return [self, ]
+        return list(Encounter.objects.filter(animal_identity=self.animal_identity))
 
     @property
     def tags(self):
@@ -1847,11 +2011,22 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
         """Return the point coordinates as Well Known Text (WKT)."""
         return self.where.wkt
 
-    def get_popup(self):
-        """Generate HTML popup content."""
-        t = loader.get_template("popup/{0}.html".format(self._meta.model_name))
-        # c = Context({"original": self})
-        return mark_safe(t.render({"original": self}))
+    render_templates = {
+        "as_html": "popup/{model_name}.html",
+        "as_latex": "latex/fragments/{model_name}.tex",
+    }
+    render_prefetch = ("site", "area", "survey", "observer", "reporter")
+    render_depends = ("site", "area", "survey", "observer", "reporter")
+
+    @property
+    def as_html(self):
+        """The HTML popup, rendered on demand and cached, see shared.rendering."""
+        return rendered(self, "as_html")
+
+    @property
+    def as_latex(self):
+        """The Latex fragment, rendered on demand and cached, see shared.rendering."""
+        return rendered(self, "as_latex")
 
     def get_report(self):
         """Generate an HTML report of the Encounter."""
@@ -1859,12 +2034,6 @@ class Encounter(QualityControlMixin, PolymorphicModel, geo_models.Model):
         # c = Context({"original": self})
         return mark_safe(t.render({"original": self}))
 
-    def get_latex(self):
-        """Generate a Latex fragment of the Encounter."""
-        t = loader.get_template("latex/fragments/{0}.tex".format(self._meta.model_name))
-        # c = Context({"original": self})
-        return mark_safe(t.render({"original": self}))
-
     def get_observations(self):
         """Return related observations as a queryset.
         """
@@ -2524,6 +2693,16 @@ class Observation(PolymorphicModel, models.Model):
         return self.encounter.when or ''
 
 
+@receiver(post_save)
+@receiver(post_delete)
+@cache_receiver
+def observation_invalidate_renders(sender, instance, raw=False, **kwargs):
+    """Observation: Orphan the cached popup and Latex fragment of the Encounter, which show all Observations."""
+    if raw or not issubclass(sender, Observation):
+        return
+    invalidate_renders(Encounter, [instance.encounter_id])
+
+
 class MediaAttachment(Observation):
     """A media attachment to an Encounter."""
 
@@ -2713,6 +2892,34 @@ class TagObservation(Observation):
         return "{0}?q={1}".format(cl, urllib.parse.quote_plus(self.name))
 
 
+# Whether TagObservation saves of the current thread defer animal identity updates
+_animal_identities = threading.local()
+
+
+@contextmanager
+def defer_animal_identities():
+    """Skip the animal identity update on each TagObservation save or delete within this block.
+
+    Code writing TagObservations in batches must call ``update_animal_identities``
+    once for the affected Encounters instead.
+    """
+    previous = getattr(_animal_identities, "deferred", False)
+    _animal_identities.deferred = True
+    try:
+        yield
+    finally:
+        _animal_identities.deferred = previous
+
+
+@receiver(post_save, sender=TagObservation)
+@receiver(post_delete, sender=TagObservation)
+def tagobservation_update_animal_identities(sender, instance, raw=False, *args, **kwargs):
+    """TagObservation: Update the animal identity of the affected Encounters."""
+    if raw or getattr(_animal_identities, "deferred", False):
+        return
+    update_animal_identities([instance.encounter_id])
+
+
 class NestTagObservation(Observation):
     """Turtle Nest Tag Observation.
 
@@ -4,6 +4,7 @@ import logging
 import os
 
 from background_task import background
+from background_task.models import Task
 from django.conf import settings
 from django.utils import timezone
 from sentry_sdk import capture_message
@@ -14,12 +15,16 @@ logger = logging.getLogger(__name__)
 
 
 @background(queue="admin-tasks", schedule=timezone.now())
-def update_names():
-    """Update cached names on Encounters and Loggers and reconstructs Surveys."""
-    msg = "[wastd.observations.tasks.update_names] Start updating names..."
+def update_names(full=False):
+    """Update cached names on Encounters and Loggers and reconstructs Surveys.
+
+    Only records touched since the last run are updated, unless ``full`` is given.
+    """
+    msg = "[wastd.observations.tasks.update_names] Start updating names{0}...".format(
+        " (full rebuild)" if full else "")
     logger.info(msg)
     capture_message(msg, level="info")
-    surveys, names, loggers = utils.allocate_animal_names()
+    surveys, names, loggers = utils.allocate_animal_names(full=full)
     msg = ("[wastd.observations.tasks.update_names] {0} surveys reconstructed, "
            "{1} animal names reconstructed, {2} logger names set. "
            "Task successfully finished.".format(
@@ -28,6 +33,32 @@ def update_names():
     capture_message(msg, level="warning")
 
 
+@background(queue="admin-tasks", schedule=timezone.now())
+def update_encounter_caches():
+    """Recalculate cached fields of Encounters marked as dirty."""
+    num = utils.update_encounter_caches()
+    logger.info("[wastd.observations.tasks.update_encounter_caches] "
+                "Updated cached fields of {0} Encounters.".format(num))
+
+
+def schedule_encounter_caches():
+    """Schedule update_encounter_caches unless a run is already waiting to start.
+
+    A waiting run picks up all Encounters marked as dirty until it starts,
+    so batch upserts need not queue one run each.
+    """
+    if not Task.objects.unlocked(timezone.now()).filter(task_name=update_encounter_caches.name).exists():
+        update_encounter_caches()
+
+
+@background(queue="admin-tasks", schedule=timezone.now())
+def seed_tile_cache(layer_names=None, max_zoom=None):
+    """Render and cache the vector tiles of all or the given map layers up to ``max_zoom``."""
+    from shared.tiles import seed_tiles
+    num = seed_tiles(layer_names=layer_names, max_zoom=max_zoom)
+    logger.info("[wastd.observations.tasks.seed_tile_cache] Seeded {0} tiles.".format(num))
+
+
 @background(queue="admin-tasks", schedule=timezone.now())
 def import_odka():
     """Download and import new ODKA submissions."""
@@ -44,9 +75,17 @@ def import_odka():
         level="info"
     )
 
-    utils.import_all_odka(path=path)
+    results = utils.import_all_odka(path=path)
+    capture_message(
+        "[wastd.observations.tasks.import_odka] ODKA submissions imported: "
+        "{0} imported, {1} skipped.".format(
+            sum(x[0] for x in results.values()), sum(x[1] for x in results.values())),
+        level="info"
+    )
+
+    utils.update_encounter_caches()
     capture_message(
-        "[wastd.observations.tasks.import_odka] ODKA submissions imported.",
+        "[wastd.observations.tasks.import_odka] Encounter caches updated.",
         level="info"
     )
 
@@ -1,3 +1,4 @@
+import json
 from datetime import date
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
@@ -78,6 +79,53 @@ class EncounterSerializerTests(TestCase):
         )
         self.assertEqual(resp.status_code, 201)
 
+    def test_keyset_pagination(self):
+        """Test that keyset pages cover all Encounters exactly once, including ties in ``when``."""
+        for i in range(4):
+            Encounter.objects.create(
+                source='odk',
+                source_id='keyset-{0}'.format(i),
+                where=Point((114.0, -21.0)),
+                when=self.encounter.when,
+                reporter=self.user,
+                observer=self.user
+            )
+        url = reverse('api:encounters_full-list') + "?format=json&cursor=&limit=2&count"
+        pks = list()
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.data["count"], 5)
+            self.assertIsNone(resp.data["previous"])
+            pks += [x["id"] for x in resp.data["features"]]
+            url = resp.data["next"]
+        self.assertEqual(sorted(pks), sorted(Encounter.objects.values_list("pk", flat=True)))
+
+        resp = self.client.get(reverse('api:encounters_full-list') + "?format=json&cursor=invalid")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_streaming_export(self):
+        """Test that exports stream all Encounters as GeoJSON and CSV."""
+        url = reverse('api:encounters_full-list')
+        resp = self.client.get(url + "?format=json&export&chunk=1")
+        self.assertTrue(resp.streaming)
+        data = json.loads(b"".join(resp.streaming_content).decode("utf-8"))
+        self.assertEqual(data["type"], "FeatureCollection")
+        self.assertEqual([x["id"] for x in data["features"]], [self.encounter.pk])
+
+        resp = self.client.get(url + "?format=csv&export")
+        self.assertTrue(resp.streaming)
+        lines = b"".join(resp.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("id", lines[0].split(","))
+
+        # Invalid chunk sizes fall back to the default or one record per chunk
+        for chunk in ("abc", "0", "-5"):
+            resp = self.client.get(url + "?format=json&export&chunk=" + chunk)
+            self.assertEqual(resp.status_code, 200)
+            data = json.loads(b"".join(resp.streaming_content).decode("utf-8"))
+            self.assertEqual([x["id"] for x in data["features"]], [self.encounter.pk])
+
 
 class ObservationSerializerTests(EncounterSerializerTests):
 
@@ -0,0 +1,586 @@
+"""Unit tests for WAStD observations."""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point, Polygon
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from wastd.observations.models import (
+    TAG_STATUS_APPLIED_NEW, AnimalEncounter, Area, Encounter, Survey, SurveyEnd, TagObservation,
+    area_containing, defer_animal_identities, update_animal_identities)
+from wastd.observations.utils import (
+    ODKA_IMPORT_PHASES, allocate_animal_names, bulk_writable, create_update_skip, create_update_skip_batch,
+    downloaded_checkpoint_filename, downloaded_data, downloaded_data_filename, guess_user, import_all_odka,
+    import_odka_family, init_import_worker, import_odka_svs02, odka_submission, save_odka, set_sites,
+    update_encounter_caches)
+
+User = get_user_model()
+
+
+class EncounterCacheTests(TestCase):
+    """Tests for deferred and batched Encounter cached fields."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('testuser', 'testuser@test.com', 'pass')
+        self.site = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Test site',
+            geom=Polygon(((113.0, -20.0), (113.0, -22.0), (115.0, -22.0), (115.0, -20.0), (113.0, -20.0)))
+        )
+        self.locality = Area.objects.create(
+            area_type=Area.AREATYPE_LOCALITY,
+            name='Test locality',
+            geom=Polygon(((112.0, -19.0), (112.0, -23.0), (116.0, -23.0), (116.0, -19.0), (112.0, -19.0)))
+        )
+
+    def make_encounter(self, source_id, **kwargs):
+        enc = Encounter(
+            source='odk',
+            source_id=source_id,
+            where=Point((114.0, -21.0)),
+            when=timezone.now(),
+            reporter=self.user,
+            observer=self.user
+        )
+        enc.save(**kwargs)
+        return enc
+
+    def test_save_calculates_caches(self):
+        enc = self.make_encounter('eager')
+        self.assertFalse(enc.cache_dirty)
+        self.assertTrue(enc.as_html)
+        self.assertEqual(enc.site, self.site)
+        self.assertEqual(enc.area, self.locality)
+
+    def test_cached_site_lookup(self):
+        self.assertEqual(area_containing(Point((114.0, -21.0)), Area.AREATYPE_SITE), self.site)
+        with self.assertNumQueries(0):
+            self.assertEqual(area_containing(Point((114.0, -21.0)), Area.AREATYPE_SITE), self.site)
+            self.assertEqual(area_containing(Point((114.0, -21.0)), Area.AREATYPE_LOCALITY), self.locality)
+            self.assertIsNone(area_containing(Point((120.0, -21.0)), Area.AREATYPE_SITE))
+
+        # Saving an Area rebuilds the cached sites
+        other = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Other site',
+            geom=Polygon(((119.0, -20.0), (119.0, -22.0), (121.0, -22.0), (121.0, -20.0), (119.0, -20.0)))
+        )
+        self.assertEqual(area_containing(Point((120.0, -21.0)), Area.AREATYPE_SITE), other)
+
+    def test_deferred_save_and_batch_update(self):
+        encs = [self.make_encounter('deferred-{0}'.format(i), defer_caches=True) for i in range(3)]
+        for enc in encs:
+            enc.refresh_from_db()
+            self.assertTrue(enc.cache_dirty)
+            self.assertIsNone(enc.site)
+
+        self.assertEqual(update_encounter_caches(), 3)
+
+        for enc in encs:
+            enc.refresh_from_db()
+            self.assertFalse(enc.cache_dirty)
+            self.assertTrue(enc.as_html)
+            self.assertTrue(enc.as_latex)
+            self.assertEqual(enc.site, self.site)
+            self.assertEqual(enc.area, self.locality)
+        self.assertEqual(update_encounter_caches(), 0)
+
+    def test_schedule_encounter_caches_once(self):
+        from background_task.models import Task
+        from wastd.observations.tasks import schedule_encounter_caches, update_encounter_caches as task
+        schedule_encounter_caches()
+        schedule_encounter_caches()
+        self.assertEqual(Task.objects.filter(task_name=task.name).count(), 1)
+
+    def test_popup_rendered_on_demand(self):
+        enc = self.make_encounter('lazy')
+        self.assertNotIn('Nemo', enc.as_html)
+
+        # Cached render, no queries
+        enc = Encounter.objects.get(pk=enc.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(enc.as_html)
+
+        # Saving orphans the cached render
+        enc.name = 'Nemo'
+        enc.save()
+        self.assertIn('Nemo', Encounter.objects.get(pk=enc.pk).as_html)
+
+    def test_popup_follows_related_objects(self):
+        enc = self.make_encounter('related')
+        self.assertNotIn('Renamed Observer', enc.as_html)
+
+        # Saving a related object listed in render_depends orphans the cached render
+        self.user.name = 'Renamed Observer'
+        self.user.save()
+        self.assertIn('Renamed Observer', Encounter.objects.get(pk=enc.pk).as_html)
+
+
+class AreaAssignmentTests(TestCase):
+    """Tests for set-based site and locality assignment."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('testuser', 'testuser@test.com', 'pass')
+        self.encounter = Encounter.objects.create(
+            source='odk',
+            source_id='area-assignment',
+            where=Point((114.0, -21.0)),
+            when=timezone.now(),
+            reporter=self.user,
+            observer=self.user
+        )
+        self.survey = Survey.objects.create(
+            source='odk',
+            source_id='area-assignment',
+            start_location=Point((114.0, -21.0)),
+            start_time=timezone.now(),
+            end_time=timezone.now(),
+            reporter=self.user
+        )
+
+    def test_new_area_claims_contents(self):
+        site = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Test site',
+            geom=Polygon(((113.0, -20.0), (113.0, -22.0), (115.0, -22.0), (115.0, -20.0), (113.0, -20.0)))
+        )
+        self.encounter.refresh_from_db()
+        self.survey.refresh_from_db()
+        self.assertEqual(self.encounter.site, site)
+        self.assertEqual(self.survey.site, site)
+        self.assertIsNone(self.encounter.area)
+
+    def test_area_geom_edit_reassigns_contents(self):
+        site = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Test site',
+            geom=Polygon(((113.0, -20.0), (113.0, -22.0), (115.0, -22.0), (115.0, -20.0), (113.0, -20.0)))
+        )
+        site.geom = Polygon(((100.0, -10.0), (100.0, -12.0), (102.0, -12.0), (102.0, -10.0), (100.0, -10.0)))
+        site.save()
+        self.encounter.refresh_from_db()
+        self.survey.refresh_from_db()
+        self.assertIsNone(self.encounter.site)
+        self.assertIsNone(self.survey.site)
+        self.assertEqual(site.centroid.x, 101.0)
+
+    def test_set_sites(self):
+        site = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Test site',
+            geom=Polygon(((113.0, -20.0), (113.0, -22.0), (115.0, -22.0), (115.0, -20.0), (113.0, -20.0)))
+        )
+        Encounter.objects.update(site=None)
+        Survey.objects.update(site=None)
+        updated = set_sites()
+        self.assertEqual(updated['encounter.site'], 1)
+        self.assertEqual(updated['survey.site'], 1)
+        self.encounter.refresh_from_db()
+        self.survey.refresh_from_db()
+        self.assertEqual(self.encounter.site, site)
+        self.assertEqual(self.survey.site, site)
+
+
+class AnimalIdentityTests(TestCase):
+    """Tests for the animal identity of Encounters linked through shared tag names."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('testuser', 'testuser@test.com', 'pass')
+        self.encounters = [Encounter.objects.create(
+            source='odk',
+            source_id='animal-identity-{0}'.format(i),
+            where=Point((114.0, -21.0)),
+            when=timezone.now(),
+            reporter=self.user,
+            observer=self.user
+        ) for i in range(4)]
+
+    def tag(self, encounter, name):
+        return TagObservation.objects.create(
+            encounter=encounter, name=name, handler=self.user, recorder=self.user)
+
+    def identities(self):
+        return [Encounter.objects.get(pk=e.pk).animal_identity for e in self.encounters]
+
+    def test_tag_observations_link_encounters(self):
+        e0, e1, e2, e3 = self.encounters
+        self.tag(e0, 'WA1')
+        self.tag(e1, 'WA2')
+        self.assertEqual(self.identities(), [e0.pk, e1.pk, None, None])
+
+        # A shared tag name merges two animals
+        link = self.tag(e1, 'WA1')
+        self.tag(e2, 'WA2')
+        self.assertEqual(self.identities(), [e0.pk, e0.pk, e0.pk, None])
+        self.assertEqual(
+            set(e.pk for e in Encounter.objects.get(pk=e2.pk).related_encounters),
+            {e0.pk, e1.pk, e2.pk})
+
+        # Removing the shared tag name splits the animal again
+        link.delete()
+        self.assertEqual(self.identities(), [e0.pk, e1.pk, e1.pk, None])
+        self.assertEqual(Encounter.objects.get(pk=e3.pk).related_encounters, [e3])
+
+    def test_full_rebuild(self):
+        e0, e1, e2, e3 = self.encounters
+        self.tag(e0, 'WA1')
+        self.tag(e3, 'WA1')
+        Encounter.objects.update(animal_identity=None)
+        self.assertEqual(update_animal_identities(), 2)
+        self.assertEqual(self.identities(), [e0.pk, None, None, e0.pk])
+        self.assertEqual(update_animal_identities(), 0)
+
+    def test_batch_updates_identities_once(self):
+        e0, e1, e2, e3 = self.encounters
+        tags = [(dict(encounter_id=e.pk, name='WA1'), dict(handler=self.user, recorder=self.user))
+                for e in (e0, e1)]
+        with mock.patch('wastd.observations.utils.update_animal_identities',
+                        wraps=update_animal_identities) as update:
+            create_update_skip_batch(tags, cls=TagObservation, base_cls=TagObservation, retain_qa=False)
+        update.assert_called_once()
+        self.assertEqual(self.identities(), [e0.pk, e0.pk, None, None])
+
+    def test_deferred_identities(self):
+        e0, e1, e2, e3 = self.encounters
+        with defer_animal_identities():
+            self.tag(e0, 'WA1')
+        self.assertEqual(self.identities(), [None, None, None, None])
+
+
+class AllocateAnimalNamesTests(TestCase):
+    """Tests for the incremental allocation of animal names."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('testuser', 'testuser@test.com', 'pass')
+        self.capture = AnimalEncounter.objects.create(
+            source='odk',
+            source_id='new-capture',
+            where=Point((114.0, -21.0)),
+            when=timezone.now(),
+            reporter=self.user,
+            observer=self.user
+        )
+        self.recapture = AnimalEncounter.objects.create(
+            source='odk',
+            source_id='recapture',
+            where=Point((114.0, -21.0)),
+            when=timezone.now(),
+            reporter=self.user,
+            observer=self.user
+        )
+        TagObservation.objects.create(
+            encounter=self.capture, name='WA1', status=TAG_STATUS_APPLIED_NEW,
+            handler=self.user, recorder=self.user)
+        TagObservation.objects.create(
+            encounter=self.recapture, name='WA1', status='resighted',
+            handler=self.user, recorder=self.user)
+
+    def test_allocate_touched_animals_only(self):
+        self.assertEqual(Encounter.objects.filter(name_dirty=True).count(), 2)
+        surveys, names, loggers = allocate_animal_names()
+        self.assertEqual(len(names), 1)
+        self.recapture.refresh_from_db()
+        self.assertEqual(self.recapture.name, 'WA1')
+        self.assertEqual(Encounter.objects.filter(name_dirty=True).count(), 0)
+
+        surveys, names, loggers = allocate_animal_names()
+        self.assertEqual(len(names), 0)
+
+        surveys, names, loggers = allocate_animal_names(full=True)
+        self.assertEqual(len(names), 1)
+
+    def test_orphans_outside_concave_site(self):
+        # An L-shaped site, whose bounding box contains the notch at (111.5, -30.5)
+        site = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Concave site',
+            geom=Polygon(((110.0, -30.0), (110.0, -32.0), (112.0, -32.0), (112.0, -31.0),
+                          (111.0, -31.0), (111.0, -30.0), (110.0, -30.0)))
+        )
+        now = timezone.now()
+        inside, notch = [Encounter.objects.create(
+            source='odk', source_id=source_id, where=Point(xy), when=now,
+            reporter=self.user, observer=self.user
+        ) for source_id, xy in (('inside', (110.5, -31.5)), ('notch', (111.5, -30.5)))]
+        survey = Survey.objects.create(
+            source='odk', source_id='concave', start_location=Point((110.5, -30.5)),
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+            reporter=self.user)
+        self.assertEqual(survey.site, site)
+
+        # The Survey claims only the Encounter within the site, and is not re-saved for the other
+        self.assertEqual(Encounter.objects.get(pk=inside.pk).survey, survey)
+        self.assertIsNone(Encounter.objects.get(pk=notch.pk).survey)
+        surveys, names, loggers = allocate_animal_names()
+        self.assertEqual(surveys, [])
+
+
+class OdkaStandInHandler(BaseHTTPRequestHandler):
+    """A stand-in for the ODK Aggregate Briefcase API serving two submissions with one photo each."""
+
+    form_id = "build_Test-Form-0-1_1"
+    instance_ids = ["uuid:one", "uuid:two"]
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, body, content_type="text/xml"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.requests.append(url.path)
+        if url.path == "/view/submissionList":
+            # Return all IDs with the first request, then an empty chunk with the same cursor
+            ids = "" if "cursor" in query else "".join(
+                "<id>{0}</id>".format(x) for x in self.instance_ids)
+            self.respond((
+                '<idChunk xmlns="http://opendatakit.org/submissions">'
+                '<idList>{0}</idList><resumptionCursor>end</resumptionCursor></idChunk>'
+            ).format(ids).encode())
+        elif url.path == "/view/downloadSubmission":
+            instance_id = re.search(r"@key=([^\]]+)", url.query).group(1)
+            self.respond((
+                '<submission xmlns="http://opendatakit.org/submissions">'
+                '<data><data id="{0}" instanceID="{1}"><photo>{1}.jpg</photo></data></data>'
+                '<mediaFile><filename>{1}.jpg</filename><hash>md5:0</hash>'
+                '<downloadUrl>http://{2}:{3}/view/binaryData?blobKey={1}</downloadUrl></mediaFile>'
+                '</submission>'
+            ).format(self.form_id, instance_id, *self.server.server_address).encode())
+        elif url.path == "/view/binaryData":
+            self.respond(b"photo", content_type="image/jpeg")
+        else:
+            self.send_error(404)
+
+
+class OdkaDownloadTests(SimpleTestCase):
+    """Tests for the concurrent, resumable ODKA downloader against a local stand-in server."""
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), OdkaStandInHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://{0}:{1}".format(*self.server.server_address)
+        self.path = tempfile.mkdtemp()
+        self.form_id = OdkaStandInHandler.form_id
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.path)
+
+    def test_save_odka(self):
+        with override_settings(MEDIA_ROOT=self.path):
+            save_odka(self.form_id, path=self.path, url=self.url, un="un", pw="pw", max_workers=2)
+            data = downloaded_data(self.form_id, self.path)
+            self.assertEqual(
+                sorted(x["submission"]["data"]["data"]["@instanceID"] for x in data),
+                OdkaStandInHandler.instance_ids)
+            self.assertFalse(os.path.exists(downloaded_checkpoint_filename(self.form_id, self.path)))
+            for instance_id in OdkaStandInHandler.instance_ids:
+                self.assertTrue(os.path.exists(
+                    os.path.join(self.path, "photos", instance_id, "{0}.jpg".format(instance_id))))
+
+            # A second run downloads no submissions
+            self.server.requests = []
+            save_odka(self.form_id, path=self.path, url=self.url, un="un", pw="pw")
+            self.assertNotIn("/view/downloadSubmission", self.server.requests)
+            self.assertEqual(len(downloaded_data(self.form_id, self.path)), 2)
+
+    def test_resume_from_checkpoint(self):
+        with override_settings(MEDIA_ROOT=self.path):
+            # An interrupted download left one submission in the checkpoint
+            done = odka_submission(self.form_id, "uuid:one", url=self.url, un="un", pw="pw")
+            with open(downloaded_checkpoint_filename(self.form_id, self.path), "w") as checkpoint:
+                checkpoint.write(json.dumps(done) + "\n" + '{"incomplete')
+            self.server.requests = []
+
+            save_odka(self.form_id, path=self.path, url=self.url, un="un", pw="pw")
+            self.assertEqual(self.server.requests.count("/view/downloadSubmission"), 1)
+            self.assertEqual(len(downloaded_data(self.form_id, self.path)), 2)
+
+
+class CreateUpdateSkipTests(TestCase):
+    """Tests for create_update_skip and its batch variant."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('testuser', 'testuser@test.com', 'pass')
+
+    def record(self, source_id, comments):
+        return (
+            dict(source='odk', source_id=source_id),
+            dict(where=Point((114.0, -21.0)), when=timezone.now(),
+                 reporter=self.user, observer=self.user, comments=comments)
+        )
+
+    def test_create_update_skip_batch(self):
+        results = create_update_skip_batch(
+            [self.record('one', 'first'), self.record('two', 'first')], cls=AnimalEncounter)
+        self.assertEqual([action for enc, action in results], ['create', 'create'])
+        self.assertTrue(all(isinstance(enc, AnimalEncounter) for enc, action in results))
+        self.assertTrue(all(enc.cache_dirty for enc, action in results))
+
+        AnimalEncounter.objects.filter(source_id='two').update(status=Encounter.STATUS_PROOFREAD)
+        results = create_update_skip_batch(
+            [self.record('one', 'second'), self.record('two', 'second'), self.record('three', 'second')],
+            cls=AnimalEncounter)
+        self.assertEqual([action for enc, action in results], ['update', 'skip', 'create'])
+        self.assertEqual(AnimalEncounter.objects.get(source_id='one').comments, 'second')
+        self.assertEqual(AnimalEncounter.objects.get(source_id='two').comments, 'first')
+        self.assertEqual(AnimalEncounter.objects.count(), 3)
+
+    def test_bulk_writable(self):
+        # Cache invalidation receivers do not prevent bulk writes
+        self.assertTrue(bulk_writable(AnimalEncounter))
+        self.assertTrue(bulk_writable(Encounter))
+        # Receivers with other side effects do
+        self.assertFalse(bulk_writable(Survey))
+        self.assertFalse(bulk_writable(TagObservation))
+
+    def test_create_update_skip_observations(self):
+        enc, action = create_update_skip(*self.record('tagged', 'first'), cls=AnimalEncounter)
+        self.assertEqual(action, 'create')
+        tags = [(dict(encounter_id=enc.pk, name=name),
+                 dict(handler=self.user, recorder=self.user, status='resighted')) for name in ['WA1', 'WA2']]
+        results = create_update_skip_batch(tags, cls=TagObservation, base_cls=TagObservation, retain_qa=False)
+        self.assertEqual([action for tag, action in results], ['create', 'create'])
+        results = create_update_skip_batch(tags, cls=TagObservation, base_cls=TagObservation, retain_qa=False)
+        self.assertEqual([action for tag, action in results], ['update', 'update'])
+        self.assertEqual(TagObservation.objects.filter(encounter=enc).count(), 2)
+
+
+class GuessUserTests(TestCase):
+    """Tests for guess_user."""
+
+    def test_username_created_concurrently(self):
+        # Another import worker created the username after the lookup missed it
+        user = User.objects.create(username='jane_doe', name='Someone Else')
+        with mock.patch('wastd.observations.utils.cached_object', return_value=None):
+            match = guess_user('Jane Doe')
+        self.assertEqual(match['user'], user)
+        self.assertEqual(User.objects.filter(username='jane_doe').count(), 1)
+
+
+def odka_record(form_id, instance_id, reporter, **fields):
+    """Return a downloaded ODKA submission without media files."""
+    data = {"@id": form_id, "@instanceID": instance_id, "reporter": reporter}
+    data.update(fields)
+    return {"submission": {"data": {"data": data}}}
+
+
+class InProcessExecutor(object):
+    """A stand-in for ProcessPoolExecutor, running the worker initializer and tasks in this process."""
+
+    instances = []
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None, initargs=()):
+        self.initializer = initializer
+        self.initargs = initargs
+        self.instances.append(self)
+
+    def __enter__(self):
+        if self.initializer:
+            self.initializer(*self.initargs)
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+class OdkaImportTests(TestCase):
+    """Tests for the import of downloaded ODKA submissions."""
+
+    svs_form = "build_Site-Visit-Start-0-2_1510716686"
+    sve_form = "build_Site-Visit-End-0-2_1510716716"
+    fs_form = "build_Fox-Sake-0-3_1490757423"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.site = Area.objects.create(
+            area_type=Area.AREATYPE_SITE,
+            name='Test site',
+            geom=Polygon(((122.0, -17.0), (122.0, -19.0), (123.0, -19.0), (123.0, -17.0), (122.0, -17.0)))
+        )
+        self.write_form(self.svs_form, [odka_record(
+            self.svs_form, "uuid:svs", "Jane Doe", survey_start_time="2017-11-15T01:00:00.000Z",
+            site_visit={"location": "-17.97 122.23 17.4 11.2", "comments": None, "site_conditions": None})])
+        self.write_form(self.sve_form, [odka_record(
+            self.sve_form, "uuid:sve", "Jane Doe", survey_end_time="2017-11-15T03:00:00.000Z",
+            site_visit={"location": "-17.97 122.24 1.2 4.7", "comments": None, "site_conditions": None})])
+        self.write_form(self.fs_form, [odka_record(
+            self.fs_form, "uuid:fs", "Jane Doe", observation_start_time="2017-11-15T02:00:00.000Z",
+            disturbanceobservation={
+                "location": "-17.97 122.235 1.0 5.0", "disturbance_cause": "fox",
+                "disturbance_cause_confidence": "expert-opinion", "photo_disturbance": None, "comments": None})])
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_form(self, form_id, records):
+        with open(downloaded_data_filename(form_id, self.path), "w") as df:
+            json.dump(records, df)
+
+    def test_import_odka_family(self):
+        forms = (("svs02", self.svs_form, import_odka_svs02, Survey), )
+        self.assertEqual(import_odka_family(forms, path=self.path), {"svs02": (1, 0)})
+        self.assertEqual(Survey.objects.get(source_id="uuid:svs").reporter.username, "jane_doe")
+
+        # Curated Surveys are skipped
+        Survey.objects.filter(source_id="uuid:svs").update(status=Survey.STATUS_PROOFREAD)
+        self.assertEqual(import_odka_family(forms, path=self.path), {"svs02": (0, 1)})
+        self.assertEqual(Survey.objects.count(), 1)
+
+    def test_import_phases_in_order(self):
+        # Surveys are imported after the SurveyEnds they claim
+        phases = [[key for forms in phase.values() for key, form_id, importer, base_cls in forms]
+                  for phase in ODKA_IMPORT_PHASES]
+        self.assertIn("sve02", phases[0])
+        self.assertIn("svs02", phases[-1])
+
+        results = import_all_odka(path=self.path, workers=1)
+        self.assertEqual(results["fs03"], (1, 0))
+        self.assertEqual(results["sve02"], (1, 0))
+        self.assertEqual(results["svs02"], (1, 0))
+        self.assertEqual(results["tt55"], (0, 0))
+        self.assertEqual(User.objects.filter(username="jane_doe").count(), 1)
+
+        survey = Survey.objects.get(source_id="uuid:svs")
+        self.assertEqual(survey.site, self.site)
+        self.assertEqual(survey.end_source_id, "uuid:sve")
+        self.assertEqual(survey.end_time, SurveyEnd.objects.get(source_id="uuid:sve").end_time)
+
+        # Encounters are saved with deferred caches, which are updated once after the import
+        enc = Encounter.objects.get(source_id="uuid:fs")
+        self.assertFalse(enc.cache_dirty)
+        self.assertEqual(enc.site, self.site)
+        self.assertEqual(enc.survey, survey)
+
+    def test_import_workers_close_connections(self):
+        # Connections are closed before forking and in each worker, so that no worker shares the parent's
+        InProcessExecutor.instances = []
+        with mock.patch('wastd.observations.utils.ProcessPoolExecutor', InProcessExecutor), \
+                mock.patch('wastd.observations.utils.connections') as connections:
+            results = import_all_odka(path=self.path, workers=2)
+        self.assertEqual(len(InProcessExecutor.instances), len(ODKA_IMPORT_PHASES))
+        self.assertTrue(all(ex.initializer is init_import_worker for ex in InProcessExecutor.instances))
+        self.assertEqual(connections.close_all.call_count, 2 * len(ODKA_IMPORT_PHASES))
+        self.assertEqual(results["svs02"], (1, 0))
+        self.assertEqual(Survey.objects.get(source_id="uuid:svs").end_source_id, "uuid:sve")
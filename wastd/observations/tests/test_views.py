@@ -12,6 +12,7 @@ from model_mommy import mommy  # noqa
 from mommy_spatial_generators import MOMMY_SPATIAL_FIELDS  # noqa
 
 from wastd.observations.models import (  # noqa
+    HEALTH_D1,
     NA,
     TAXON_CHOICES_DEFAULT,
     AnimalEncounter,
@@ -81,3 +82,80 @@ class AnimalEncounterViewTests(TestCase):
         """Test "observations:animalencounter-list" view."""
         response = self.client.get(reverse("observations:animalencounter-list"))
         self.assertEqual(response.status_code, 200)
+
+    def test_vector_tiles(self):
+        """Test that Encounters are served as vector tiles with popups on demand."""
+        response = self.client.get(reverse("encounter-tiles", kwargs=dict(z=4, x=13, y=9)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+        self.assertTrue(len(response.content) > 0)
+
+        response = self.client.get(reverse("encounter-tiles", kwargs=dict(z=4, x=0, y=0)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.content), 0)
+
+        response = self.client.get(reverse("encounter-tiles", kwargs=dict(z=4, x=16, y=0)))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(reverse("encounter-popup", kwargs=dict(pk=self.cl.pk)))
+        self.assertEqual(response.status_code, 200)
+
+    def test_vector_tile_filters(self):
+        """Test that invalid filter values are rejected before they reach the query or the tile cache."""
+        tile = reverse("encounter-tiles", kwargs=dict(z=4, x=13, y=9))
+        response = self.client.get(tile, {"encounter_type": self.cl.encounter_type})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(len(response.content) > 0)
+
+        response = self.client.get(tile, {"encounter_type": "not-a-type"})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            reverse("taxon-area-encounter-tiles", kwargs=dict(z=4, x=13, y=9)), {"taxon": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_vector_tile_cache(self):
+        """Test that cached tiles are evicted when an Encounter moves."""
+        old_tile = reverse("encounter-tiles", kwargs=dict(z=4, x=13, y=9))
+        new_tile = reverse("encounter-tiles", kwargs=dict(z=4, x=8, y=5))
+        self.assertTrue(len(self.client.get(old_tile).content) > 0)
+        self.assertEqual(len(self.client.get(new_tile).content), 0)
+
+        self.cl.where = GEOSGeometry('POINT (10 50)', srid=4326)
+        self.cl.save()
+        self.assertEqual(len(self.client.get(old_tile).content), 0)
+        self.assertTrue(len(self.client.get(new_tile).content) > 0)
+
+        self.cl.delete()
+        self.assertEqual(len(self.client.get(new_tile).content), 0)
+
+    def test_stranding_clusters(self):
+        """Test that strandings are served as clusters up to MAP_CLUSTER_MAX_ZOOM, then as features."""
+        for lon in (115, 115.001):
+            AnimalEncounter.objects.create(
+                where=GEOSGeometry('POINT ({0} -32)'.format(lon), srid=4326),
+                when=timezone.now(),
+                taxon=TAXON_CHOICES_DEFAULT,
+                health=HEALTH_D1,
+                observer=self.user,
+                reporter=self.user
+            )
+
+        response = self.client.get(reverse("stranding-cluster-tiles", kwargs=dict(z=4, x=13, y=9)))
+        self.assertEqual(response.status_code, 200)
+        features = response.json()["features"]
+        self.assertEqual(len(features), 1)
+        self.assertTrue(features[0]["properties"]["cluster"])
+        self.assertEqual(features[0]["properties"]["count"], 2)
+        self.assertEqual(features[0]["properties"]["health"], {HEALTH_D1: 2})
+
+        response = self.client.get(reverse("stranding-cluster-tiles", kwargs=dict(z=4, x=0, y=0)))
+        self.assertEqual(response.json()["features"], [])
+
+        # A filtered tile is cached separately
+        with self.settings(MAP_CLUSTER_MAX_ZOOM=3):
+            response = self.client.get(
+                reverse("stranding-cluster-tiles", kwargs=dict(z=4, x=13, y=9)), {"health": HEALTH_D1})
+        features = response.json()["features"]
+        self.assertEqual(len(features), 2)
+        self.assertFalse("cluster" in features[0]["properties"])
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Map layers of Observations, see shared.tiles."""
+from shared.tiles import ClusterLayer, TileLayer, register_layer
+from wastd.observations.models import AnimalEncounter, Area, Encounter
+
+# Vector tiles
+register_layer(TileLayer(
+    "encounters", Encounter,
+    geometry_fields=("where", ),
+    properties=("id", "encounter_type", "status", "name"),
+    filter_fields=("encounter_type", "status")))
+register_layer(TileLayer(
+    "areas", Area,
+    properties=("id", "area_type", "name"),
+    filter_fields=("area_type", ),
+    simplify=True))
+
+# GeoJSON layers
+register_layer(TileLayer("observations-geojson", Encounter, geometry_fields=("where", ), tiled=False))
+register_layer(TileLayer("areas-geojson", Area, tiled=False))
+register_layer(TileLayer(
+    "sites-geojson", Area, tiled=False,
+    queryset=Area.objects.filter(area_type=Area.AREATYPE_SITE)))
+
+# Tiled GeoJSON layers
+register_layer(TileLayer("encounter-tiled-geojson", AnimalEncounter, geometry_fields=("where", ), vector=False))
+
+# Clustered GeoJSON tiles, counted by species and health, popups from encounter-popup
+register_layer(ClusterLayer(
+    "stranding-clusters", AnimalEncounter,
+    geometry_fields=("where", ),
+    properties=("id", "species", "health", "name", "when"),
+    group_fields=("species", "health"),
+    filter_fields=("species", "health"),
+    queryset=AnimalEncounter.objects.filter(encounter_type="stranding")))
@@ -3,11 +3,17 @@
 import csv
 import io
 import json
+import operator
 # from plogger.debug import plogger.debug
 import logging
 import os
 import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from functools import reduce
+from itertools import groupby, repeat
+from multiprocessing import get_context
 
 import pandas
 import requests
@@ -19,9 +25,17 @@ from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import LineString, Point
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.core.files import File
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Exists, Model, OuterRef, Q
+from django.db.models.signals import post_save, pre_save
 from django.utils.dateparse import parse_datetime
+from polymorphic.models import PolymorphicModel
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
-from shared.utils import sanitize_tag_label
+from shared.cache import cached_object, has_side_effects, invalidate_lookups
+from shared.rendering import invalidate_renders
+from shared.tiles import invalidate_model_tiles
+from shared.utils import bulk_create_inherited, chunks, sanitize_tag_label
 
 from wastd.observations.models import *
 # from wastd.users.models import User
@@ -61,15 +75,80 @@ def set_site(sites, encounter):
     encounter.site = sites.filter(geom__contains=encounter.where).first() or None
     encounter.save(update_fields=["site"])
     logger.info("Found encounter {0} at site {1}".format(encounter, encounter.site))
-    return enc
+    return encounter
+
+
+def set_sites(overwrite=False):
+    """Set site and locality of Encounters, Surveys and SurveyEnds.
+
+    Each combination of model and Area type is assigned with one spatial UPDATE,
+    see ``wastd.observations.models.assign_areas``.
+
+    Arguments:
+
+    overwrite <bool> Whether to re-assign records which already have a site or locality.
+        Default: False (only assign records without site or locality).
+
+    Returns:
+    A dict of "model.field" and the number of updated records.
+    """
+    updated = dict()
+    for model, location_field, area_field, area_type in area_assignments():
+        updated["{0}.{1}".format(model._meta.model_name, area_field)] = assign_areas(
+            model.objects.all(), location_field, area_field, area_type, overwrite=overwrite)
+    logger.info("[wastd.observations.utils.set_sites] Updated {0}".format(updated))
+    return updated
+
+
+def update_encounter_caches(encounters=None, batch_size=500):
+    """Recalculate the cached fields of Encounters in batches.
 
+    Encounters saved with ``defer_caches=True`` are marked as ``cache_dirty``.
+    This function recalculates their cached fields for many Encounters at once:
 
-def set_sites():
-    """Set the site where missing for all NEW Encounters."""
-    sites = Area.objects.filter(area_type=Area.AREATYPE_SITE)
-    enc = Encounter.objects.filter(status=Encounter.STATUS_NEW, site=None)
-    logger.info("[wastd.observations.utils.set_sites] Found {0} encounters without site".format(enc.count()))
-    return [set_site(sites, e) for e in enc]
+    * site and area: one spatial UPDATE each per batch for Encounters without site or area,
+    * name: inferred from related new captures only for Encounters with TagObservations,
+    * encounter type,
+    * written back with one ``bulk_update`` per batch, evicting the map tiles and
+      orphaning the cached popups and Latex fragments of the batch.
+
+    Arguments:
+
+    encounters <QuerySet> The Encounters to update. Default: all Encounters with ``cache_dirty``.
+    batch_size <int> The number of Encounters per batch. Default: 500.
+
+    Returns:
+    The number of updated Encounters.
+    """
+    if encounters is None:
+        encounters = Encounter.objects.filter(cache_dirty=True)
+    pks = list(encounters.order_by().values_list("pk", flat=True))
+    logger.info("[update_encounter_caches] Updating caches of {0} Encounters...".format(len(pks)))
+
+    fields = ["source_id", "name", "encounter_type", "cache_dirty"]
+    for batch in chunks(pks, batch_size):
+        batch_qs = Encounter.objects.non_polymorphic().filter(pk__in=batch)
+        assign_areas(batch_qs, "where", "site", Area.AREATYPE_SITE)
+        assign_areas(batch_qs, "where", "area", Area.AREATYPE_LOCALITY)
+
+        tagged = set(TagObservation.objects.filter(
+            encounter_id__in=batch).values_list("encounter_id", flat=True))
+
+        objs = list(Encounter.objects.filter(pk__in=batch).select_related(
+            "site", "area", "survey", "observer", "reporter"))
+        for obj in objs:
+            if not obj.source_id:
+                obj.source_id = obj.short_name
+            if obj.pk in tagged and not obj.name:
+                obj.name = obj.inferred_name
+            obj.encounter_type = obj.get_encounter_type
+            obj.cache_dirty = False
+        Encounter.objects.bulk_update(objs, fields)
+        invalidate_model_tiles(Encounter, batch)
+        invalidate_renders(Encounter, batch)
+        logger.info("[update_encounter_caches] Updated {0} Encounters.".format(len(objs)))
+
+    return len(pks)
 
 
 def reconstruct_missing_surveys(buffer_mins=30):
@@ -127,7 +206,7 @@ def reconstruct_missing_surveys(buffer_mins=30):
     return None
 
 
-def allocate_animal_names():
+def allocate_animal_names(full=False):
     """Reconstruct names of Animals from their first allocated Flipper Tag.
 
     Names are inferred as the first ever allocated flipper tag ID and written
@@ -141,11 +220,51 @@ def allocate_animal_names():
       allocated FlipperTag and no other existing, resighted tags)
     * For each new capture, get the primary flipper tag name as animal name
     * Set the animal name of this and all related Encounters
+
+    By default, only records touched since the last run are processed:
+
+    * Surveys which can claim orphaned Encounters (Encounters without Survey
+      within the Survey's site and time window),
+    * animals with changed TagObservations (Encounters marked ``name_dirty``),
+    * LoggerEncounters without name.
+
+    Arguments:
+
+    full <bool> Whether to rebuild all Surveys, animal names and logger names.
+        Default: False.
+
+    Returns:
+    A list of the saved Surveys, the named new captures, and the saved LoggerEncounters.
     """
-    ss = [s.save() for s in Survey.objects.all()]
+    if full:
+        surveys = Survey.objects.all()
+        animals = AnimalEncounter.objects.all()
+        loggers = LoggerEncounter.objects.all()
+    else:
+        orphans = Encounter.objects.filter(
+            survey__isnull=True,
+            where__within=OuterRef("site__geom"),
+            when__gte=OuterRef("start_time"),
+            when__lte=OuterRef("end_time"))
+        surveys = Survey.objects.filter(
+            production=True,
+            site__isnull=False,
+            end_time__isnull=False
+        ).annotate(has_orphans=Exists(orphans)).filter(has_orphans=True)
+        dirty = Encounter.objects.filter(name_dirty=True)
+        animals = AnimalEncounter.objects.filter(
+            animal_identity__in=dirty.values("animal_identity"))
+        loggers = LoggerEncounter.objects.filter(name__isnull=True, logger_id__isnull=False)
+    dirty_pks = list(Encounter.objects.filter(name_dirty=True).values_list("pk", flat=True))
+
+    ss = [s.save() for s in surveys]
     ae = [a.set_name_and_propagate(a.primary_flipper_tag.name)
-          for a in AnimalEncounter.objects.all() if a.is_new_capture]
-    le = [a.save() for a in LoggerEncounter.objects.all()]
+          for a in animals if a.is_new_capture]
+    le = [a.save() for a in loggers]
+    Encounter.objects.filter(pk__in=dirty_pks).update(name_dirty=False)
+    logger.info("[wastd.observations.utils.allocate_animal_names] {0} surveys saved, "
+                "{1} animals named, {2} loggers saved{3}.".format(
+                    len(ss), len(ae), len(le), " (full rebuild)" if full else ""))
     return [ss, ae, le]
 
 
@@ -270,6 +389,7 @@ def guess_user(un, default_username="FlorianM"):
     * the best or only trigram match of both username against lowersnake(un)
       and name, nickname, and aliases against un, or
     * if no match: a new user account for username lowersnake(un) and name un.
+      If a parallel import created the username meanwhile, its account is returned.
 
     Arguments
 
@@ -286,12 +406,11 @@ def guess_user(un, default_username="FlorianM"):
     name = default_username if not un else un
     username = default_username if not un else lowersnake(un)
 
-    try:
-        usr = usermodel.objects.get(username=username)
+    usr = cached_object(usermodel, "username", username)
+    if usr is not None:
         msg = "[guess_user][OK] Exact match for username {username} is {user}."
 
-    except ObjectDoesNotExist:
-
+    else:
         try:
             usr = usermodel.objects.get(name=name)
             msg = "[guess_user][OK] Exact match for name {name} is {user}."
@@ -306,8 +425,14 @@ def guess_user(un, default_username="FlorianM"):
                                             nickname__trigram_similar=name,
                                             aliases__trigram_similar=name)
             if usrs.count() == 0:
-                usr = usermodel.objects.create(username=username, name=name)
-                msg = "[guess_user][CREATED] username {username} and name {name} not found. Created {user}."
+                try:
+                    with transaction.atomic():
+                        usr = usermodel.objects.create(username=username, name=name)
+                    msg = "[guess_user][CREATED] username {username} and name {name} not found. Created {user}."
+                except IntegrityError:
+                    # Another import worker created the same username since the lookup
+                    usr = usermodel.objects.get(username=username)
+                    msg = "[guess_user][OK] Exact match for username {username} created concurrently is {user}."
             elif usrs.count() == 1:
                 usr = usrs[0]
                 msg = "[guess_user][OK] Only match for username {username} and name {name} is {user}."
@@ -401,13 +526,19 @@ def make_photo_foldername(photo_id):
     return os.path.join(settings.MEDIA_ROOT, "photos", photo_id)
 
 
-def dl_photo(photo_id, photo_url, photo_filename):
+def dl_photo(photo_id, photo_url, photo_filename, session=None):
     """Download a photo if not already done.
 
+    The photo is written to a temporary file first, and renamed once complete.
+    An existing photo file therefore is a complete download, and an interrupted
+    download will be retried.
+
     Arguments
 
     photo_id The WAStD source_id of the record, to which this photo belongs
     photo_url A URL to download the photo from
+    photo_filename The filename of the photo
+    session An optional requests.Session to reuse pooled connections, see odka_session().
     """
     logger.debug("  Downloading photo...")
     pdir = make_photo_foldername(photo_id)
@@ -420,9 +551,13 @@ def dl_photo(photo_id, photo_url, photo_filename):
 
     if not os.path.exists(pname):
         logger.debug("  Downloading file {0}...".format(pname))
-        response = requests.get(photo_url, stream=True)
-        with open(pname, 'wb') as out_file:
+        response = (session or requests).get(photo_url, stream=True)
+        if response.status_code != 200:
+            logger.info("  [ERROR] {0} downloading file {1}".format(response.status_code, pname))
+            return
+        with open(pname + ".part", 'wb') as out_file:
             shutil.copyfileobj(response.raw, out_file)
+        os.replace(pname + ".part", pname)
         del response
     else:
         logger.debug("  Found file {0}".format(pname))
@@ -2698,9 +2833,36 @@ def import_odk(datafile,
 # ---------------------------------------------------------------------------#
 # ODK Aggregate API helpers
 #
+def odka_session(un=env('ODKA_UN'),
+                 pw=env('ODKA_PW'),
+                 pool_size=8,
+                 retries=3):
+    """Return a requests.Session with pooled, re-used connections to ODK Aggregate.
+
+    One Session can be shared by concurrent downloads, see odka_submissions().
+
+    Arguments
+
+    un A username that exists on the ODK-A instance.
+        Default: the value of environment variable "ODKA_UN".
+    pw The username's password.
+        Default: the value of environment variable "ODKA_PW".
+    pool_size The maximum number of kept-alive connections per host, default: 8.
+        This should be at least the number of concurrent downloads.
+    retries The number of retries of failed connections, default: 3.
+    """
+    session = requests.Session()
+    session.auth = HTTPDigestAuth(un, pw)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def odka_forms(url=env('ODKA_URL'),
                un=env('ODKA_UN'),
-               pw=env('ODKA_PW')):
+               pw=env('ODKA_PW'),
+               session=None):
     """Return an OpenRosa xformsList XML response as list of dicts.
 
     See http://docs.opendatakit.org/openrosa-form-list/
@@ -2713,6 +2875,7 @@ def odka_forms(url=env('ODKA_URL'),
         Default: the value of environment variable "ODKA_UN".
     pw The username's password.
         Default: the value of environment variable "ODKA_PW".
+    session An optional requests.Session, see odka_session().
 
     Returns
     A list of dicts, each dict contains one xform:
@@ -2757,7 +2920,7 @@ def odka_forms(url=env('ODKA_URL'),
     api = "{0}/xformsList".format(url)
     au = HTTPDigestAuth(un, pw)
     logger.info("[odka_forms] Retrieving xformsList from {0}...".format(url))
-    res = requests.get(api, auth=au)
+    res = (session or requests).get(api, auth=au)
     xforms = xmltodict.parse(res.content, xml_attribs=True)
     forms = xforms["xforms"]["xform"]
     logger.info("[odka_forms] Done, retrieved {0} forms.".format(len(forms)))
@@ -2769,7 +2932,8 @@ def odka_submission_ids(form_id,
                         url=env('ODKA_URL'),
                         un=env('ODKA_UN'),
                         pw=env('ODKA_PW'),
-                        verbose=False):
+                        verbose=False,
+                        session=None):
     """Return a list of submission IDs for a given ODKA formID.
 
     See http://docs.opendatakit.org/aggregate-use/#briefcase-aggregate-api
@@ -2787,7 +2951,7 @@ def odka_submission_ids(form_id,
         Default: the value of environment variable "ODKA_UN".
     pw The username's password.
         Default: the value of environment variable "ODKA_PW".
-
+    session An optional requests.Session, see odka_session().
 
     Returns
     A list of submission IDs. Each ID can be used as input for odka_submission().
@@ -2821,7 +2985,7 @@ def odka_submission_ids(form_id,
     while resume:
 
         logger.info("[odka_submission_ids] Retrieving chunk {0}...".format(counter))
-        res = requests.get(api, auth=au, params=pars)
+        res = (session or requests).get(api, auth=au, params=pars)
         parsed = xmltodict.parse(res.content, xml_attribs=True)
 
         if not parsed["idChunk"]["idList"]:
@@ -2850,7 +3014,8 @@ def odka_submission(form_id,
                     url=env('ODKA_URL'),
                     un=env('ODKA_UN'),
                     pw=env('ODKA_PW'),
-                    verbose=False):
+                    verbose=False,
+                    session=None):
     """Download one ODKA submission and return as dict.
 
     See http://docs.opendatakit.org/aggregate-use/#briefcase-aggregate-api
@@ -2869,6 +3034,7 @@ def odka_submission(form_id,
     pw The username's password.
         Default: the value of environment variable "ODKA_PW".
     verbose Whether to logger.debug verbose log messages, default: False.
+    session An optional requests.Session, see odka_session().
 
     Returns
         A dict with key "submission" containing "data" and "mediaFile".
@@ -2918,7 +3084,8 @@ def odka_submission(form_id,
     logger.info("[odka_submission] Retrieving {0}".format(submission_id))
     if verbose:
         logger.info("[odka_submission] URL {0}".format(api))
-    res = requests.get(api, auth=au)
+    res = (session or requests).get(api, auth=au)
+    res.raise_for_status()
     return xmltodict.parse(res.content, xml_attribs=True)
 
 
@@ -2943,16 +3110,83 @@ def downloaded_data(form_id, path):
     return data
 
 
+def downloaded_checkpoint_filename(form_id, path):
+    """Generate a checkpoint filename for a form_id in format path/form_id.ndjson."""
+    return os.path.join(path, form_id) + ".ndjson"
+
+
+def downloaded_checkpoint(form_id, path):
+    """Return the submissions of an interrupted download of form_id at path as list.
+
+    While downloading, odka_submissions() appends each submission as one line of JSON
+    to the checkpoint file. save_odka() removes the checkpoint file once all submissions
+    are saved. An existing checkpoint file therefore contains the submissions downloaded
+    before an interruption.
+    """
+    fn = downloaded_checkpoint_filename(form_id, path)
+    if not os.path.exists(fn):
+        return []
+    logger.info("[downloaded_checkpoint] Resuming from {0}".format(fn))
+    data = []
+    with io.open(fn, mode="r", encoding="utf-8") as cf:
+        for line in cf:
+            try:
+                data.append(json.loads(line))
+            except ValueError:
+                # The last line can be incomplete if the download was interrupted
+                logger.info("[downloaded_checkpoint] Skipping incomplete line in {0}".format(fn))
+    return data
+
+
+def odka_media(data,
+               max_workers=4,
+               session=None):
+    """Download the media files of ODKA submissions concurrently.
+
+    Each file is downloaded to the photo folder of the submission's instanceID
+    unless already done, see dl_photo().
+
+    Arguments:
+
+    data A list of ODKA submissions as returned by odka_submission().
+    max_workers The maximum number of concurrent downloads, default: 4.
+    session An optional requests.Session, see odka_session().
+
+    Returns
+    The number of media files.
+    """
+    media = [(make_data(x)["@instanceID"], filename, url)
+             for x in data
+             for filename, url in make_media(x).items()]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(dl_photo, instance_id, url, filename, session=session)
+                   for instance_id, filename, url in media]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.info("[odka_media] [ERROR] {0}".format(e))
+    logger.info("[odka_media] Done, checked {0} media files.".format(len(media)))
+    return len(media)
+
+
 def odka_submissions(form_id,
                      path=".",
                      url=env('ODKA_URL'),
                      un=env('ODKA_UN'),
                      pw=env('ODKA_PW'),
                      verbose=False,
-                     append=True
+                     append=True,
+                     max_workers=4,
+                     session=None,
+                     download_media=True
                      ):
     """Retrieve a list of all submissions for a given formID.
 
+    New submissions are downloaded concurrently over pooled connections.
+    Each downloaded submission is appended to a checkpoint file, so that an
+    interrupted download resumes with the missing submissions only.
+
     Arguments:
 
     form_id An existing xform formID,
@@ -2966,29 +3200,50 @@ def odka_submissions(form_id,
     verbose Whether to logger.debug verbose log messages, default: False.
     append Whether to retain already downloaded data and append new data, or
         to overwrite all already downloaded data and download all data again.
+    max_workers The maximum number of concurrent downloads, default: 4.
+    session An optional requests.Session, default: a new odka_session().
+    download_media Whether to download the media files of new submissions, default: True.
 
     Example
     forms = odka_forms()
     data = odka_submissions(forms[6]["formID"])
     """
     logger.info("[odka_submissions] Retrieving submissions for formID {0}...".format(form_id))
+    session = session or odka_session(un=un, pw=pw, pool_size=max_workers)
 
     old_data = downloaded_data(form_id, path)
     logger.info("[odka_submissions] Found {0} already downloaded submissions.".format(len(old_data)))
     if append:
-        old_ids = [make_data(x)["@instanceID"] for x in old_data]
         action = "retained"
     else:
-        old_ids = []
+        old_data = []
         action = "overwrote"
-
-    new_data = [odka_submission(form_id, x, url=url, un=un, pw=pw, verbose=verbose)
-                for x in odka_submission_ids(form_id, url=url, un=un, pw=pw, verbose=verbose)
-                if x not in old_ids]
-    logger.info("[odka_submissions] Done, retrieved {0} new submissions, "
-                "{1} {2} already downloaded submissions.".format(
-                    len(new_data), action, len(old_data)))
-    return old_data + new_data
+    resumed_data = downloaded_checkpoint(form_id, path)
+    old_ids = set([make_data(x)["@instanceID"] for x in old_data + resumed_data])
+
+    new_ids = [x for x in odka_submission_ids(form_id, url=url, un=un, pw=pw, verbose=verbose, session=session)
+               if x not in old_ids]
+    new_data = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            io.open(downloaded_checkpoint_filename(form_id, path), mode="w", encoding="utf-8") as checkpoint:
+        # Re-write resumed submissions to drop a line left incomplete by the interruption
+        checkpoint.writelines(json.dumps(x, ensure_ascii=False) + "\n" for x in resumed_data)
+        futures = [executor.submit(
+            odka_submission, form_id, x, url=url, un=un, pw=pw, verbose=verbose, session=session)
+            for x in new_ids]
+        for future in as_completed(futures):
+            submission = future.result()
+            checkpoint.write(json.dumps(submission, ensure_ascii=False) + "\n")
+            checkpoint.flush()
+            new_data.append(submission)
+
+    if download_media:
+        odka_media(resumed_data + new_data, max_workers=max_workers, session=session)
+
+    logger.info("[odka_submissions] Done, retrieved {0} new and {1} resumed submissions, "
+                "{2} {3} already downloaded submissions.".format(
+                    len(new_data), len(resumed_data), action, len(old_data)))
+    return old_data + resumed_data + new_data
 
 
 def save_odka(form_id,
@@ -2997,7 +3252,10 @@ def save_odka(form_id,
               un=env('ODKA_UN'),
               pw=env('ODKA_PW'),
               verbose=False,
-              append=True):
+              append=True,
+              max_workers=4,
+              session=None,
+              download_media=True):
     """Save all submissions for a given form_id as JSON to a given path.
 
     Arguments:
@@ -3013,6 +3271,9 @@ def save_odka(form_id,
     verbose Whether to logger.debug verbose log messages, default: False.
     append Whether to retain already downloaded data and append new data, or
         to overwrite all already downloaded data and download all data again.
+    max_workers The maximum number of concurrent downloads, default: 4.
+    session An optional requests.Session, see odka_session().
+    download_media Whether to download the media files of new submissions, default: True.
     """
     data = odka_submissions(
         form_id,
@@ -3021,10 +3282,16 @@ def save_odka(form_id,
         un=un,
         pw=pw,
         verbose=verbose,
-        append=append)
-    with io.open(downloaded_data_filename(form_id, path), mode="w", encoding="utf-8") as outfile:
+        append=append,
+        max_workers=max_workers,
+        session=session,
+        download_media=download_media)
+    fn = downloaded_data_filename(form_id, path)
+    with io.open(fn + ".part", mode="w", encoding="utf-8") as outfile:
         data = json.dumps(data, indent=2, ensure_ascii=False)
         outfile.write(data)
+    os.replace(fn + ".part", fn)
+    os.remove(downloaded_checkpoint_filename(form_id, path))
 
 
 def save_all_odka(path=".",
@@ -3032,9 +3299,15 @@ def save_all_odka(path=".",
                   un=env('ODKA_UN'),
                   pw=env('ODKA_PW'),
                   verbose=False,
-                  append=True):
+                  append=True,
+                  max_workers=4,
+                  download_media=True):
     """Save all submissions for all forms of an odka instance.
 
+    All forms share one pool of connections. Each form downloads up to
+    max_workers submissions or media files concurrently.
+    An interrupted run resumes with the missing submissions and media files.
+
     Arguments:
 
     path A locally existing path, default: "."
@@ -3047,11 +3320,14 @@ def save_all_odka(path=".",
     verbose Whether to logger.debug verbose log messages, default: False.
     append Whether to retain already downloaded data and append new data, or
         to overwrite all already downloaded data and download all data again.
+    max_workers The maximum number of concurrent downloads, default: 4.
+    download_media Whether to download the media files of new submissions, default: True.
 
     Returns:
     At the specified location (path) for each form, a file will be written
     which contains all submissions (records) for that respective form.
     """
+    session = odka_session(un=un, pw=pw, pool_size=max_workers)
     [save_odka(
         xform['formID'],
         path=path,
@@ -3059,8 +3335,11 @@ def save_all_odka(path=".",
         un=un,
         pw=pw,
         verbose=verbose,
-        append=append)
-     for xform in odka_forms()]
+        append=append,
+        max_workers=max_workers,
+        session=session,
+        download_media=download_media)
+     for xform in odka_forms(url=url, un=un, pw=pw, session=session)]
 
 
 def make_datapackage_json(xform,
@@ -3210,6 +3489,18 @@ def listify(x):
 # ---------------------------------------------------------------------------#
 # Update logic for WAStD's custom QA django-fsm status
 #
+def save_fast(obj):
+    """Save an object, deferring the recalculation of cached fields of Encounters.
+
+    The cached fields of deferred Encounters are updated in batches by
+    ``update_encounter_caches``. Other models are saved as usual.
+    """
+    if isinstance(obj, Encounter):
+        obj.save(defer_caches=True)
+    else:
+        obj.save()
+
+
 def create_update_skip(
         unique_data,
         extra_data=dict(),
@@ -3250,30 +3541,159 @@ def create_update_skip(
     If the Encounter does not exist, it needs to be created.
     Returns newly created Encounter and action verb "create".
     """
-    enc = base_cls.objects.filter(**unique_data)
-    if enc.exists():
-        if (not retain_qa) or (enc.first().status == Encounter.STATUS_NEW):
-            action = "update"
-            instantiated = cls.objects.filter(pk=enc.first().pk)
-            instantiated.update(**extra_data)
-            e = enc.first()
-            msg = "[create_update_skip] Updating unchanged existing record {0}...".format(e.__str__())
-            e.save()
+    return create_update_skip_batch(
+        [(unique_data, extra_data)], cls=cls, base_cls=base_cls, retain_qa=retain_qa)[0]
+
+
+def bulk_writable(cls):
+    """Whether instances of cls can be written in bulk without losing side effects of save().
+
+    Encounters can: their fast save only sets the source ID and marks the cached fields
+    as outdated, see save_fast(). Other models can unless they override save() or have
+    pre_save or post_save signal receivers, such as Survey or TagObservation.
+    Receivers which only invalidate caches are ignored, bulk writes invalidate these caches
+    with invalidate_bulk_writes().
+    """
+    if has_side_effects(pre_save, cls) or has_side_effects(post_save, cls):
+        return False
+    if issubclass(cls, Encounter):
+        return True
+    return cls.save in (Model.save, PolymorphicModel.save)
+
+
+def invalidate_bulk_writes(cls, pks):
+    """Invalidate the caches which signals would have invalidated for records written in bulk.
+
+    Call this before bulk updates to evict map tiles at the previous locations,
+    and after bulk creates and updates.
+    """
+    invalidate_model_tiles(cls, pks)
+    invalidate_renders(cls, pks)
+    invalidate_lookups(cls)
+    if issubclass(cls, Observation):
+        invalidate_renders(Encounter, list(set(
+            cls.objects.filter(pk__in=pks).values_list("encounter_id", flat=True))))
+
+
+def create_update_skip_batch(
+        records,
+        cls=Encounter,
+        base_cls=Encounter,
+        retain_qa=True,
+        batch_size=500):
+    """Create, update or skip many records at once.
+
+    This is the batch variant of create_update_skip with the same semantics:
+    new records are created, existing records with QA status "new" are updated,
+    and curated records (QA status other than "new") are skipped.
+
+    All existing records and their QA status are looked up with one query per batch.
+    Models which can be written in bulk (see bulk_writable) are created with one INSERT
+    per batch and inheritance level, and updated with one UPDATE per batch and set of
+    fields. Other models are saved one by one to keep their signals.
+
+    Arguments:
+
+    records An iterable of (unique_data, extra_data) tuples as in create_update_skip.
+        All unique_data dicts must have the same keys.
+    cls The class to instantiate. Default: Encounter.
+    base_cls The base class to filter for unique_data.
+        This is required for polymorphic classes.
+        Default: Encounter.
+    retain_qa Whether to retain qa'd instances (proofread or higher Encounters).
+        Default: True. Set to false for models without QA status.
+    batch_size The number of records per query, default: 500.
+
+    Returns:
+    A list of (record, action verb) in the order of records.
+    The action verb is "create", "update" or "skip".
+    """
+    records = [(dict(unique_data), dict(extra_data)) for unique_data, extra_data in records]
+    if not records:
+        return []
+    keys = sorted(records[0][0].keys())
+
+    def key_of(values):
+        """The string tuple of unique values, using the PK of model instances."""
+        return tuple(str(values[k].pk if isinstance(values[k], Model) else values[k]) for k in keys)
+
+    # Existing records and their QA status
+    existing = dict()
+    value_fields = ["pk"] + [k for k in keys if k != "pk"] + (["status"] if retain_qa else [])
+    for batch in chunks(records, batch_size):
+        q = reduce(operator.or_, [Q(**unique_data) for unique_data, extra_data in batch])
+        for row in base_cls.objects.filter(q).values(*value_fields):
+            existing.setdefault(key_of(row), row)
+
+    # Verdicts
+    to_create = OrderedDict()
+    to_update = []
+    verdicts = []
+    for unique_data, extra_data in records:
+        key = key_of(unique_data)
+        row = existing.get(key)
+        if key in to_create:
+            # A repeated record updates the pending new record
+            to_create[key].update(extra_data)
+            verdicts.append((key, "update"))
+        elif row is None:
+            data = dict(unique_data)
+            data.update(extra_data)
+            to_create[key] = data
+            verdicts.append((key, "create"))
+        elif (not retain_qa) or (row["status"] == Encounter.STATUS_NEW):
+            to_update.append((row["pk"], extra_data))
+            verdicts.append((key, "update"))
         else:
-            action = "skip"
-            e = enc.first()
-            msg = "[create_update_skip] Skipping existing curated record {0}...".format(e.__str__())
-    else:
-        action = "create"
-        data = unique_data
-        data.update(extra_data)
-        e = cls.objects.create(**data)
-        e.save()
-        msg = "[create_update_skip] Created new record {0}".format(e.__str__())
+            verdicts.append((key, "skip"))
+
+    def update_fields(update):
+        return sorted(update[1].keys())
+
+    # Writes, updating the animal identities of TagObservations once per batch
+    fast = bulk_writable(cls)
+    with defer_animal_identities():
+        new_objs = [cls(**data) for data in to_create.values()]
+        if fast:
+            for obj in new_objs:
+                if isinstance(obj, Encounter):
+                    obj.source_id = obj.source_id or obj.short_name
+                    obj.cache_dirty = True
+            bulk_create_inherited(cls, new_objs, batch_size=batch_size)
+            invalidate_bulk_writes(cls, [obj.pk for obj in new_objs])
+        else:
+            [save_fast(obj) for obj in new_objs]
+        pks = {key: obj.pk for key, obj in zip(to_create.keys(), new_objs)}
+
+        for fields, updates in groupby(sorted(to_update, key=update_fields), key=update_fields):
+            updates = list(updates)
+            if fast:
+                objs = [cls(pk=pk, **extra_data) for pk, extra_data in updates]
+                if issubclass(cls, Encounter):
+                    [setattr(obj, "cache_dirty", True) for obj in objs]
+                    fields = fields + ["cache_dirty"]
+                if fields:
+                    invalidate_bulk_writes(cls, [obj.pk for obj in objs])
+                    cls.objects.bulk_update(objs, fields, batch_size=batch_size)
+                    invalidate_bulk_writes(cls, [obj.pk for obj in objs])
+            else:
+                for pk, extra_data in updates:
+                    cls.objects.filter(pk=pk).update(**extra_data)
+                    save_fast(base_cls.objects.get(pk=pk))
 
-    logger.info(msg)
-    logger.info("[create_update_skip] Done, returning record.")
-    return (e, action)
+    if issubclass(cls, TagObservation):
+        update_animal_identities(list(set(cls.objects.filter(
+            pk__in=list(pks.values()) + [pk for pk, extra_data in to_update]
+        ).values_list("encounter_id", flat=True))))
+
+    pks.update({key_of(row): row["pk"] for row in existing.values()})
+    objs = base_cls.objects.in_bulk(list(set(pks.values())))
+    for action in ["create", "update", "skip"]:
+        num = len([v for v in verdicts if v[1] == action])
+        if num:
+            logger.info("[create_update_skip_batch] {0} {1} {2} records.".format(
+                action.capitalize(), num, cls._meta.verbose_name))
+    return [(objs[pks[key]], action) for key, action in verdicts]
 
 
 def int_or_none(value):
@@ -3453,7 +3873,9 @@ def handle_odka_tagsobs(enc, media, data):
         tag_location_dict = map_and_keep(TURTLE_BODY_PART_CHOICES)
         tag_status_dict = map_and_keep(TAG_STATUS_CHOICES)
 
-        for obs in listify(data["tag_observation"]):
+        tagobs = listify(data["tag_observation"])
+        records = []
+        for obs in tagobs:
             # 0. Lookups
             tag_name = sanitize_tag_name(obs["name"])
             tag_type = tag_type_dict[obs["tag_type"]]
@@ -3469,17 +3891,14 @@ def handle_odka_tagsobs(enc, media, data):
                 status=tag_status_dict[obs["tag_status"]],
                 comments=obs["tag_comments"]
             )
+            records.append((dict(encounter_id=enc.id, tag_type=tag_type, name=tag_name), new_data))
 
-            criteria = dict(encounter=enc, tag_type=tag_type, name=tag_name)
-            target = TagObservation.objects.filter(**criteria)
-            if target.exists():
-                logger.debug("  [handle_odka_tagsobs] Updating existing tag obs {0}...".format(tag_name))
-                e = target.update(**new_data)
-                e = TagObservation.objects.get(**criteria)
+        # Look up all existing tag obs of this encounter at once
+        results = create_update_skip_batch(
+            records, cls=TagObservation, base_cls=TagObservation, retain_qa=False)
 
-            else:
-                logger.debug("  [handle_odka_tagsobs] Creating new tag obs {0}...".format(tag_name))
-                e = TagObservation.objects.create(**new_data)
+        for obs, (e, action) in zip(tagobs, results):
+            logger.debug("  [handle_odka_tagsobs] {0} tag obs {1}".format(action, e.name))
 
             # 2. Photo of tag
             if obs["photo_tag"]:
@@ -4634,7 +5053,7 @@ def import_odka_fs03(r):
 
     if action in ["update", "create"]:
         handle_odka_disturbanceobservation(enc, media, data)
-        enc.save()
+        save_fast(enc)
 
     logger.info("Done: {0}\n".format(enc))
     return enc
@@ -4955,7 +5374,7 @@ def import_odka_tt044(r):
         enc.nest_type = data["details"]["nest_type"]
         enc.habitat = data["nest"]["habitat"] or "na"
         enc.disturbance = data["nest"]["disturbance"] or "na"
-        enc.save()
+        save_fast(enc)
         handle_media_attachment_odka(enc, media, data["track_photos"]["photo_track_1"], title="Uptrack")
         handle_media_attachment_odka(enc, media, data["track_photos"]["photo_track_2"], title="Downtrack")
         handle_media_attachment_odka(enc, media, data["nest_photos"]["photo_nest_1"], title="Nest 1")
@@ -4966,7 +5385,7 @@ def import_odka_tt044(r):
         handle_odka_turtlenestobservation(enc, media, data)
         handle_odka_hatchlingmorphometricobservation(enc, media, data)
         handle_odka_fanangles(enc, media, data)
-        enc.save()
+        save_fast(enc)
 
     # # bonus round for fan angles imported post QA (proofread records won't update)
     # # ran once and disabled again, kept as reminder to circumvent QA-skip logic for new supplementary data
@@ -5183,7 +5602,7 @@ def import_odka_tal05(r):
 
         [make_tallyobs(enc, x[0], x[1], x[2], x[3]) for x in tally_mapping]
 
-        enc.save()
+        save_fast(enc)
 
     logger.info("Done: {0}\n".format(enc))
     return enc
@@ -5367,7 +5786,7 @@ def import_odka_mwi05(r):
         #  "checks": {
         #   "samples_taken": "present",
 
-        enc.save()
+        save_fast(enc)
 
         # Photos
         handle_media_attachment_odka(enc, media, data["incident"]["photo_habitat"], title="Initial photo of habitat")
@@ -5384,7 +5803,7 @@ def import_odka_mwi05(r):
         handle_odka_turtlemorph(enc, media, data)
         handle_odka_turtledamageobs(enc, media, data)
 
-        enc.save()
+        save_fast(enc)
 
     logger.info("Done: {0}\n".format(enc))
     return enc
@@ -5395,54 +5814,169 @@ def import_odka_mwi05(r):
 # Turtle Encounter
 # TODO
 
-def import_all_odka(path="."):
+# ---------------------------------------------------------------------------#
+# Import all ODKA forms
+#
+# Form families are imported in parallel, the forms of one family in the given order.
+# Each form is given as (result key, formID, importer, base class with QA status or None).
+# Phases run one after the other: Surveys claim the SurveyEnds and Encounters
+# imported in the first phase.
+ODKA_IMPORT_PHASES = (
+    OrderedDict([
+        ("mwi", (
+            ("mwi01", "build_Marine-Wildlife-Incident-0-1_1502342347", import_odka_mwi05, Encounter),
+            ("mwi04", "build_Marine-Wildlife-Incident-0-4_1509605702", import_odka_mwi05, Encounter),
+            ("mwi05", "build_Marine-Wildlife-Incident-0-5_1510547403", import_odka_mwi05, Encounter),
+            ("mwi06", "build_Marine-Wildlife-Incident-0-6_1535597111", import_odka_mwi05, Encounter),
+            ("tsi01", "build_Turtle-Sighting-0-1_1535090015", import_odka_tsi01, Encounter),
+        )),
+        ("tal", (
+            ("tal05", "build_Track-Tally-0-5_1502342159", import_odka_tal05, Encounter),
+        )),
+        ("fs", (
+            ("fs03", "build_Fox-Sake-0-3_1490757423", import_odka_fs03, Encounter),
+            ("fs04", "build_Fox-Sake-0-4_1534140913", import_odka_fs03, Encounter),
+            ("fs04a", "build_Predator-or-Disturbance-1-0_1539932798", import_odka_fs03, Encounter),
+        )),
+        ("tt", (
+            ("tt35", "build_Track-or-Treat-0-35_1507882361", import_odka_tt044, Encounter),
+            ("tt36", "build_Track-or-Treat-0-36_1508561995", import_odka_tt044, Encounter),
+            ("tt44", "build_Track-or-Treat-0-44_1509422138", import_odka_tt044, Encounter),
+            ("tt45", "build_Track-or-Treat-0-45_1511079712", import_odka_tt044, Encounter),
+            ("tt46", "build_Track-or-Treat-0-46_1512095567", import_odka_tt044, Encounter),
+            ("tt47", "build_Track-or-Treat-0-47_1512461621", import_odka_tt044, Encounter),
+            ("tt50", "build_Track-or-Treat-0-50_1516929392", import_odka_tt044, Encounter),
+            ("tt51", "build_Track-or-Treat-0-51_1517196378", import_odka_tt044, Encounter),
+            ("tt52", "build_Track-or-Treat-0-52_1518683842", import_odka_tt044, Encounter),
+            ("tt53", "build_Track-or-Treat-0-53_1535702040", import_odka_tt044, Encounter),
+            ("tt54", "build_Turtle-Track-or-Nest-0-54_1539933206", import_odka_tt044, Encounter),
+            ("tt55", "build_Turtle-Track-or-Nest-0-55_1548318718", import_odka_tt044, Encounter),
+        )),
+        ("sve", (
+            ("sve01", "build_Site-Visit-End-0-1_1490756971", import_odka_sve02, None),
+            ("sve02", "build_Site-Visit-End-0-2_1510716716", import_odka_sve02, None),
+        )),
+    ]),
+    OrderedDict([
+        ("svs", (
+            ("svs01", "build_Site-Visit-Start-0-1_1490753483", import_odka_svs02, Survey),
+            ("svs02", "build_Site-Visit-Start-0-2_1510716686", import_odka_svs02, Survey),
+            ("svs03", "build_Site-Visit-Start-0-3_1535694081", import_odka_svs02, Survey),
+        )),
+        # turtle tagging 0.3
+        # turtle encounter 0.4
+    ]),
+)
+
+
+def import_odka_form(form_id, importer, base_cls=None, path=".", chunk_size=100):
+    """Import all downloaded submissions of one ODKA form.
+
+    The source IDs of curated records (QA status other than new) are fetched
+    once for the whole form. Their submissions are skipped without running the importer.
+    The remaining submissions are imported in chunks of one transaction each.
+    Imported Encounters are saved with deferred caches, run update_encounter_caches()
+    after importing single forms.
+
+    Arguments:
+
+    form_id An xform formID, e.g. 'build_Track-Tally-0-5_1502342159'.
+    importer The import function for one submission, e.g. import_odka_tal05.
+    base_cls The base class of the imported records if it has a QA status,
+        e.g. Encounter. Default: None (import all submissions).
+    path The local path to the downloaded submission JSON as produced by save_odka().
+    chunk_size The number of submissions per transaction, default: 100.
+
+    Returns:
+    The number of imported and skipped submissions.
+    """
+    records = downloaded_data(form_id, path)
+    curated = set()
+    if base_cls is not None:
+        for ids in chunks([make_data(x)["@instanceID"] for x in records], 1000):
+            curated.update(base_cls.objects.filter(
+                source="odk", source_id__in=ids
+            ).exclude(status=base_cls.STATUS_NEW).values_list("source_id", flat=True))
+    new_records = [x for x in records if make_data(x)["@instanceID"] not in curated]
+
+    for chunk in chunks(new_records, chunk_size):
+        with transaction.atomic():
+            [importer(x) for x in chunk]
+    logger.info("[import_odka_form] Imported {0} and skipped {1} curated submissions of {2}.".format(
+        len(new_records), len(records) - len(new_records), form_id))
+    return len(new_records), len(records) - len(new_records)
+
+
+def import_odka_family(forms, path=".", chunk_size=100):
+    """Import a family of ODKA forms in the given order.
+
+    Arguments:
+
+    forms A list of (result key, formID, importer, base class) as in ODKA_IMPORT_PHASES.
+    path The local path to the downloaded submission JSON as produced by save_odka().
+    chunk_size The number of submissions per transaction, default: 100.
+
+    Returns:
+    A dict of result key and the number of imported and skipped submissions.
+    """
+    return {key: import_odka_form(form_id, importer, base_cls=base_cls, path=path, chunk_size=chunk_size)
+            for key, form_id, importer, base_cls in forms}
+
+
+def init_import_worker():
+    """Close the database connections a forked import worker inherited from its parent.
+
+    The worker opens its own connections on first use.
+    """
+    connections.close_all()
+
+
+def import_all_odka(path=".", workers=4, chunk_size=100):
     """Import all known ODKA data.
 
+    The form families of each phase in ODKA_IMPORT_PHASES are imported in parallel
+    by up to ``workers`` processes. Each worker process opens its own database connection,
+    see init_import_worker.
+
     Example usage on shell_plus:
 
-    import sys; reload(sys); sys.setdefaultencoding('UTF8');
     import os; path = os.path.join(settings.MEDIA_ROOT, "odka")
     from wastd.observations.utils import *
     save_all_odka(path=path)
-    enc = import_all_odka(path="data/odka")
+    results = import_all_odka(path="data/odka")
+
+    Arguments:
+
+    path The local path to the downloaded submission JSON as produced by save_odka().
+    workers The maximum number of parallel worker processes, default: 4.
+        With 1 worker, all forms are imported in the current process.
+    chunk_size The number of submissions per transaction, default: 100.
+
+    The importers save Encounters with deferred caches, which are recalculated
+    once for all imported Encounters by update_encounter_caches().
+
+    Returns:
+    A dict of result key (e.g. "tt55") and a tuple of the number of imported and skipped submissions.
+    The imported records are not returned, as they are saved in worker processes.
 
     TODO: disable deprecated forms after adding fan angles etc to import
     """
     logger.info("[import_all_odka] Starting import of all downloaded ODKA data...")
-    results = dict(
-        mwi01=[import_odka_mwi05(x) for x in downloaded_data("build_Marine-Wildlife-Incident-0-1_1502342347", path)],
-        mwi04=[import_odka_mwi05(x) for x in downloaded_data("build_Marine-Wildlife-Incident-0-4_1509605702", path)],
-        mwi05=[import_odka_mwi05(x) for x in downloaded_data("build_Marine-Wildlife-Incident-0-5_1510547403", path)],
-        mwi06=[import_odka_mwi05(x) for x in downloaded_data("build_Marine-Wildlife-Incident-0-6_1535597111", path)],
-
-        tsi01=[import_odka_tsi01(x) for x in downloaded_data("build_Turtle-Sighting-0-1_1535090015", path)],
-        tal05=[import_odka_tal05(x) for x in downloaded_data("build_Track-Tally-0-5_1502342159", path)],
-        fs03=[import_odka_fs03(x) for x in downloaded_data("build_Fox-Sake-0-3_1490757423", path)],
-        fs04=[import_odka_fs03(x) for x in downloaded_data("build_Fox-Sake-0-4_1534140913", path)],
-        fs04a=[import_odka_fs03(x) for x in downloaded_data("build_Predator-or-Disturbance-1-0_1539932798", path)],
-
-        tt35=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-35_1507882361", path)],
-        tt36=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-36_1508561995", path)],
-        tt44=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-44_1509422138", path)],
-        tt45=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-45_1511079712", path)],
-        tt46=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-46_1512095567", path)],
-        tt47=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-47_1512461621", path)],
-        tt50=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-50_1516929392", path)],
-        tt51=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-51_1517196378", path)],
-        tt52=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-52_1518683842", path)],
-        tt53=[import_odka_tt044(x) for x in downloaded_data("build_Track-or-Treat-0-53_1535702040", path)],
-        tt54=[import_odka_tt044(x) for x in downloaded_data("build_Turtle-Track-or-Nest-0-54_1539933206", path)],
-        tt55=[import_odka_tt044(x) for x in downloaded_data("build_Turtle-Track-or-Nest-0-55_1548318718", path)],
-
-        sve01=[import_odka_sve02(x) for x in downloaded_data("build_Site-Visit-End-0-1_1490756971", path)],
-        sve02=[import_odka_sve02(x) for x in downloaded_data("build_Site-Visit-End-0-2_1510716716", path)],
-        svs01=[import_odka_svs02(x) for x in downloaded_data("build_Site-Visit-Start-0-1_1490753483", path)],
-        svs02=[import_odka_svs02(x) for x in downloaded_data("build_Site-Visit-Start-0-2_1510716686", path)],
-        svs03=[import_odka_svs02(x) for x in downloaded_data("build_Site-Visit-Start-0-3_1535694081", path)],
-
-        # turtle tagging 0.3
-        # turtle encounter 0.4
-    )
+    results = dict()
+    for phase in ODKA_IMPORT_PHASES:
+        if workers > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=min(workers, len(phase)), mp_context=get_context("fork"),
+                                     initializer=init_import_worker) as ex:
+                for family_results in ex.map(import_odka_family, phase.values(), repeat(path), repeat(chunk_size)):
+                    results.update(family_results)
+        else:
+            for forms in phase.values():
+                results.update(import_odka_family(forms, path=path, chunk_size=chunk_size))
+    # Encounters were saved with deferred caches
+    update_encounter_caches()
     logger.info("[import_all_odka] Finished import. Stats:")
-    logger.info("\n".join(["[import_all_odka]  Imported {0} {1}".format(len(results[x]), x.upper()) for x in results]))
+    logger.info("\n".join(["[import_all_odka]  Imported {0} and skipped {1} {2}".format(
+        results[x][0], results[x][1], x.upper()) for x in results]))
     return results
@@ -15,6 +15,7 @@ from rest_framework.schemas import get_schema_view
 from rest_framework_swagger.renderers import OpenAPIRenderer, SwaggerUIRenderer
 from sentry_sdk import capture_message
 
+from shared.tiles import TILE_LAYERS
 from shared.views import ListViewBreadcrumbMixin, DetailViewBreadcrumbMixin
 
 from wastd.observations.filters import AnimalEncounterFilter, AnimalEncounterFilter2, EncounterFilter
@@ -36,16 +37,21 @@ def import_odka_view(request):
 
 @csrf_exempt
 def update_names_view(request):
-    """Import all available ODK-Aggregate forms."""
+    """Update names of touched records, or of all records with ``?full=true``."""
+    full = request.GET.get("full", "").lower() == "true"
     capture_message("[wastd.observations.views.update_names] Rebuilding names.", level="error")
-    msg = update_names.now()
+    msg = update_names.now(full=full)
     messages.success(request, msg)
     capture_message(msg, level="error")
     return HttpResponseRedirect("/")
 
 
 class HomeView(ListView):
-    """HomeView."""
+    """HomeView.
+
+    The map loads strandings as clustered GeoJSON tiles of the current view,
+    see the "stranding-clusters" layer in wastd.observations.tiles.
+    """
 
     model = AnimalEncounter
     template_name = "pages/map.html"
@@ -54,11 +60,13 @@ class HomeView(ListView):
         """Context data."""
         context = super(HomeView, self).get_context_data(**kwargs)
         context['now'] = timezone.now()
+        context['stranding_icon'] = Encounter.LEAFLET_ICON[Encounter.ENCOUNTER_STRANDING]
+        context['stranding_colour'] = Encounter.LEAFLET_COLOUR[Encounter.ENCOUNTER_STRANDING]
         return context
 
     def get_queryset(self, **kwargs):
         """Queryset."""
-        return AnimalEncounter.objects.filter(encounter_type="stranding")
+        return TILE_LAYERS["stranding-clusters"].get_queryset()
 
 
 # Encounters -----------------------------------------------------------------#
@@ -71,7 +79,7 @@ class EncounterTable(tables.Table):
         """Model opts."""
 
         model = Encounter
-        exclude = ["as_html", "as_latex", "polymorphic_ctype", "encounter_ptr"]
+        exclude = ["polymorphic_ctype", "encounter_ptr"]
         attrs = {'class': 'table table-hover table-inverse table-sm'}
 
 
@@ -82,7 +90,7 @@ class AnimalEncounterTable(tables.Table):
         """Model opts."""
 
         model = AnimalEncounter
-        exclude = ["as_html", "as_latex", "polymorphic_ctype", "encounter_ptr"]
+        exclude = ["polymorphic_ctype", "encounter_ptr"]
         attrs = {'class': 'table table-hover table-inverse table-sm'}
 
 
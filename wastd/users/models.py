@@ -12,6 +12,8 @@ from django.utils.translation import ugettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 from rest_framework.authtoken.models import Token
 
+from shared.cache import cache_objects_by
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
@@ -96,3 +98,7 @@ class User(AbstractUser):
     def apitoken(self):
         """The API token."""
         return Token.objects.get_or_create(user=self)[0].key
+
+
+# Users are looked up by username for each imported record and user page
+cache_objects_by(User, "username")
@@ -3,9 +3,12 @@
 from __future__ import absolute_import, unicode_literals
 
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404
 from django.urls import reverse
 from django.views.generic import DetailView, ListView, RedirectView, UpdateView
 
+from shared.cache import cached_object
+
 from .models import User
 
 
@@ -17,6 +20,13 @@ class UserDetailView(LoginRequiredMixin, DetailView):
     slug_field = "username"
     slug_url_kwarg = "username"
 
+    def get_object(self, queryset=None):
+        """Return the User with the username from the URL, from the lookup cache."""
+        obj = cached_object(User, "username", self.kwargs[self.slug_url_kwarg])
+        if obj is None:
+            raise Http404("No user found matching the query")
+        return obj
+
 
 class UserRedirectView(LoginRequiredMixin, RedirectView):
     """User redirect view."""